@@ -0,0 +1,101 @@
+"""
+Checkpoint journal
+
+Records finished repositories of one section and one stage as they finish
+With resume, a later run skips them and reuses their results
+"""
+
+import os
+import pickle
+
+
+class Checkpoint(object):
+    """
+    Append only journal of (repo name, result) pairs in a pickle file
+    """
+
+    def __init__(self, journal_path, b_resume=False):
+        """
+        :param str journal_path: journal file
+        :param bool b_resume: if False, start a new journal
+        """
+        self.journal_path = journal_path
+        # repo name : result
+        self.done_dict = {}
+
+        if b_resume:
+            self.load()
+        elif os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+
+    def load(self):
+        """
+        Read all complete records; an incomplete last record is discarded
+        """
+        self.done_dict = {}
+
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'r+b') as f:
+                good_end = 0
+
+                while True:
+                    try:
+                        name, result = pickle.load(f)
+                    except EOFError:
+                        break
+                    except (pickle.UnpicklingError, ValueError, TypeError):
+                        # interrupted while writing
+                        print(f'Checkpoint.load() : discarding incomplete record of {self.journal_path}')
+                        break
+
+                    self.done_dict[name] = result
+                    good_end = f.tell()
+
+                # later records would follow the last complete record
+                f.truncate(good_end)
+
+        return self.done_dict
+
+    def is_done(self, name):
+        return name in self.done_dict
+
+    def get(self, name):
+        return self.done_dict[name]
+
+    def record(self, name, result):
+        """
+        Append one finished repository
+        Written & flushed to the disk before returning
+        """
+        self.done_dict[name] = result
+
+        with open(self.journal_path, 'ab') as f:
+            pickle.dump((name, result), f)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def __len__(self):
+        return len(self.done_dict)
+
+
+def get_journal_path(folder, section, stage):
+    return os.path.join(folder, f'{section}_{stage}.checkpoint')
+
+
+def get_checkpoint(config, section, stage):
+    """
+    Checkpoint of the section & stage
+
+    [operation]
+    checkpoint_folder : journal files go here ('checkpoint' by default)
+    resume : 'True' to continue the last run (progress.py --resume)
+    """
+    folder = config['operation'].get('checkpoint_folder', 'checkpoint')
+
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+
+    return Checkpoint(
+        get_journal_path(folder, section, stage),
+        b_resume=('True' == config['operation'].get('resume', 'False').strip()),
+    )
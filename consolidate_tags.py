@@ -5,19 +5,27 @@ If one commit of repository contains too many tags, consolidate.
 Compare with remote tags using `git ls-remote --tags origin` and keep if in the remote.
 
 ref : https://stackoverflow.com/questions/1841341/remove-local-git-tags-that-are-no-longer-on-the-remote-repository
+
+usage : python consolidate_tags.py [--config detect_conflict.cfg] [--dry-run]
 """
 
+import argparse
 import configparser
+import multiprocessing as mp
 import os
+import sys
 import time
+import traceback
 
 import git
 
 
-def main():
+def main(argv):
+
+    args = get_arg_parser().parse_args(argv)
 
     config = configparser.ConfigParser()
-    filename = 'detect_conflict.cfg'
+    filename = args.config
 
     if os.path.exists(filename):
         # if file exists
@@ -25,43 +33,100 @@ def main():
     else:
         raise IOError('unable to find {filename}'.format(filename=filename))
 
+    # repositories of all sections in one pool
+    repo_arg_list = []
     for section_name in config['folders']:
-        process_section(section_name, config)
+        repo_arg_list += get_repo_arg_list(section_name, config, args.dry_run)
+
+    p = mp.Pool()
+
+    result_list = p.starmap(process_repo, repo_arg_list)
+
+    p.close()
+    p.join()
+
+    report(result_list, args.dry_run)
 
 
-def process_section(section_name, config):
+def get_arg_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--config', help='config file', default='detect_conflict.cfg')
+    parser.add_argument('--dry-run', help='only report how many tags would be deleted',
+                        action='store_true')
+    return parser
+
+
+def get_repo_arg_list(section_name, config, b_dry_run=False):
     print('section_name = ', section_name)
     section_path = config['folders'][section_name]
 
-    for repo_name in os.listdir(os.path.abspath(section_path)):
-        process_repo(section_path, repo_name)
+    return [(section_path, repo_name, b_dry_run)
+            for repo_name in os.listdir(os.path.abspath(section_path))]
+
 
+def process_section(section_name, config, b_dry_run=False):
+    return [process_repo(*repo_arg)
+            for repo_arg in get_repo_arg_list(section_name, config, b_dry_run)]
 
-def process_repo(section_path, repo_name):
+
+def process_repo(section_path, repo_name, b_dry_run=False):
+    """
+    :return: (repo_path, number of tags to delete) or None if not a repository folder
+        (repo_path, 0) if failed; not to stop the other repositories in the pool
+    """
     repo_path = os.path.join(section_path, repo_name)
+    result = None
 
     if os.path.isdir(repo_path):
         print('\trepo_path = ', repo_path)
         cwd_backup = os.getcwd()
         os.chdir(repo_path)
 
-        process_tags()
+        try:
+            result = (repo_path, process_tags(b_dry_run))
+        except Exception:
+            # not a git repository or unable to read the tags
+            print(f'process_repo() : failed {repo_name} in {section_path}')
+            traceback.print_exc()
+            result = (repo_path, 0)
+        finally:
+            os.chdir(cwd_backup)
+
+    return result
 
-        os.chdir(cwd_backup)
 
+def process_tags(b_dry_run=False):
+    """
+    Keep the oldest tag of each commit and delete the rest in one transaction
 
-def process_tags():
+    :return: number of tags deleted (or to be deleted if b_dry_run); 0 if the deletion failed
+    """
     print('\t\tproces_tags(): cwd =', os.getcwd())
-    result = git.get_refs_tag_deref()
-    print('\t\tproces_tags(): len(result) =', len(result))
+    # one snapshot of all refs for this repository
+    tag_sha_list = git.get_ref_snapshot(b_refresh=True).get_tag_sha_list()
+    print('\t\tproces_tags(): len(result) =', len(tag_sha_list))
 
-    git.clean_xdf()
+    delete_tag_list = get_delete_tag_list(tag_sha_list)
 
+    if not b_dry_run:
+        git.clean_xdf()
+
+        if not git.delete_tags(delete_tag_list):
+            print('Unable to delete {n} tags in {cwd}?'.format(n=len(delete_tag_list), cwd=os.getcwd()))
+            # one transaction : none of them deleted
+            delete_tag_list = []
+
+    return len(delete_tag_list)
+
+
+def get_delete_tag_list(tag_sha_list):
+    """
+    From (tag, sha) list, list all tags except the oldest of each commit
+    """
     tags_dict = {}
     # sha : [tag1, tag2, ...]
 
     # tag loop
-    tag_sha_list = git.get_refs_tag_deref()
     for tag__sha in tag_sha_list:
         tag, sha = tag__sha
         tags_dict[sha] = tags_dict.get(sha, [])
@@ -90,6 +155,8 @@ def process_tags():
 
         tags_dict[sha].append((datetime_struct, tag))
 
+    delete_tag_list = []
+
     # sha loop
     s = 0  # to see if processed all tags
     for k, sha in enumerate(tags_dict):
@@ -99,12 +166,25 @@ def process_tags():
 
         for time__tag in tags_dict[sha][1:]:
             _, tag = time__tag
-            if not git.delete_tag(tag):
-                print('Unable to delete tag {tag}?'.format(tag=tag))
+            delete_tag_list.append(tag)
 
         s += n
     assert len(tag_sha_list) == s
 
+    return delete_tag_list
+
+
+def report(result_list, b_dry_run=False):
+    verb = 'would drop' if b_dry_run else 'dropped'
+    total = 0
+
+    for repo_path__n in sorted(filter(None, result_list)):
+        repo_path, n = repo_path__n
+        print(f'{repo_path} : {verb} {n} tags')
+        total += n
+
+    print(f'total : {verb} {total} tags')
+
 
 if "__main__" == __name__:
-    main()
+    main(sys.argv[1:])
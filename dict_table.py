@@ -75,6 +75,20 @@ class RepoTable(object):
         else:
             print(msg)
 
+    def set_row(self, row, row_dict):
+        """
+        Set all columns of a row at once
+        For example, a row evaluated in another process
+
+        :param row: row index
+        :param dict row_dict: {column: value}
+        :return:
+        """
+        for column in row_dict:
+            self.column.add(column)
+
+        self.index[row] = row_dict
+
     def update(self, other):
         """
         Integrate other RepoTable
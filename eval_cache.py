@@ -0,0 +1,160 @@
+"""
+Evaluation cache
+
+Results of evaluating a file, keyed by the git blob sha of the file
+A file not changed since the last run does not need the evaluation again
+One sqlite3 file shared by the workers of multiprocessing.Pool
+"""
+
+import hashlib
+import os
+import pickle
+import sqlite3
+import time
+
+
+eval_cache_filename = 'eval_cache.sqlite3'
+
+
+class EvalCache(object):
+    """
+    {key: result} in a sqlite3 database
+    Least recently used results go first if more than max_entries
+    """
+
+    # check the size after this many new results
+    evict_interval = 256
+
+    def __init__(self, db_path=eval_cache_filename, max_entries=200000, timeout_sec=60.0):
+        """
+        :param str db_path: sqlite3 database file
+        :param int max_entries: keep at most this many results
+        :param float timeout_sec: wait this long while another worker is writing
+        """
+        self.db_path = os.path.abspath(db_path)
+        self.max_entries = max_entries
+        self.timeout_sec = timeout_sec
+
+        self.connection = None
+        # process of the connection
+        self.pid = None
+        self.n_put = 0
+
+        # create the table before workers start
+        self.connect()
+
+    def __getstate__(self):
+        # a connection cannot go to another process; each worker opens its own
+        state = self.__dict__.copy()
+        state['connection'] = None
+        state['pid'] = None
+        return state
+
+    def connect(self):
+        if (self.connection is None) or (os.getpid() != self.pid):
+            self.connection = sqlite3.connect(self.db_path, timeout=self.timeout_sec)
+            self.pid = os.getpid()
+
+            # readers do not wait for writers
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            # a lost result would be evaluated again; no need to wait for the disk
+            self.connection.execute('PRAGMA synchronous=NORMAL')
+
+            with self.connection:
+                self.connection.execute(
+                    'CREATE TABLE IF NOT EXISTS eval_cache '
+                    '(key TEXT PRIMARY KEY, result BLOB, last_used REAL)'
+                )
+                self.connection.execute(
+                    'CREATE INDEX IF NOT EXISTS eval_cache_last_used ON eval_cache (last_used)'
+                )
+
+        return self.connection
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+            self.pid = None
+
+    def get(self, key):
+        """
+        Cached result or None
+        """
+        connection = self.connect()
+
+        row = connection.execute(
+            'SELECT result FROM eval_cache WHERE key = ?', (key,)).fetchone()
+
+        result = None
+
+        if row is not None:
+            result = pickle.loads(row[0])
+
+            # recently used
+            with connection:
+                connection.execute(
+                    'UPDATE eval_cache SET last_used = ? WHERE key = ?', (time.time(), key))
+
+        return result
+
+    def put(self, key, result):
+        connection = self.connect()
+
+        with connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO eval_cache (key, result, last_used) VALUES (?, ?, ?)',
+                (key, pickle.dumps(result), time.time())
+            )
+
+        self.n_put += 1
+
+        if 0 == (self.n_put % self.evict_interval):
+            self.evict()
+
+    def evict(self):
+        """
+        Delete least recently used results exceeding max_entries
+        """
+        connection = self.connect()
+
+        with connection:
+            connection.execute(
+                'DELETE FROM eval_cache WHERE key IN '
+                '(SELECT key FROM eval_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            )
+
+    def __len__(self):
+        return self.connect().execute('SELECT COUNT(*) FROM eval_cache').fetchone()[0]
+
+
+def get_key(blob_sha, evaluation_name, config_tuple):
+    """
+    :param str blob_sha: git blob sha of the file
+    :param str evaluation_name: ex) 'RepoEvalPoundLineCounter.eval_python_file'
+    :param tuple config_tuple: version & settings changing the result
+    """
+    config_hash = hashlib.sha1(repr(config_tuple).encode('utf-8')).hexdigest()
+    return f'{blob_sha}:{evaluation_name}:{config_hash}'
+
+
+def get_eval_cache(config):
+    """
+    Evaluation cache of the config or None if disabled
+
+    [operation]
+    eval_cache_file : sqlite3 file ('eval_cache.sqlite3' by default; empty to disable)
+    eval_cache_max_entries : 200000 by default
+    """
+    db_path = config['operation'].get('eval_cache_file', eval_cache_filename).strip()
+
+    result = None
+
+    if db_path:
+        result = EvalCache(
+            db_path,
+            max_entries=int(config['operation'].get('eval_cache_max_entries', '200000')),
+        )
+
+    return result
@@ -1,18 +1,30 @@
-import ast
 import configparser
+import contextlib
 import fractions
+import hashlib
+import io
+import math
 import multiprocessing
 import os
+import pickle
+import posixpath
 import re
+import shutil
+import sys
+import tempfile
 import time
 import tokenize
+import traceback
+import warnings
 
 import dict_table
+import eval_cache
 import git
 import iter_repo
-import repo_path
+import script_runner
 import unique_list
 import read_python
+import reference_index
 
 
 class RepoEval(object):
@@ -20,45 +32,128 @@ class RepoEval(object):
     To evaluate one repository
     """
 
+    # change if results of cached evaluations change
+    eval_cache_version = 1
+
     def __init__(self, ):
         # table of repository names in rows and relative path/file names in columns
         self.table = dict_table.RepoTable()
         self.repo_name = None
         self.repo_path = None
-
-    def eval_repo_list(self, repo_list,  b_multiprocessing=True):
+        # eval_cache.EvalCache of unchanged files or None
+        self.eval_cache = None
+        # {path in repository: blob sha} of the current repository
+        self.blob_sha_dict = {}
+        # commit, branch, tag, ... to evaluate instead of the work tree; None for the work tree
+        self.revision = None
+        # RevisionSnapshot of the current repository if evaluating a revision
+        self.snapshot = None
+        # True if this evaluator made the snapshot, not shared by a composite evaluator
+        self.b_snapshot_owner = False
+        # {get_memo_key(): evaluation} of earlier revisions or None not to reuse
+        self.blob_evaluation_dict = None
+        # snapshot of the previous revision with the memo; the next one updates its files
+        self.kept_snapshot = None
+
+    def eval_repo_list(self, repo_list,  b_multiprocessing=True, checkpoint=None):
         """
 
         :param list(dict) repo_list:
         :param bool b_multiprocessing:
+        :param checkpoint.Checkpoint checkpoint: skip & reuse rows of finished repositories; record new ones
         :return:
         """
         # integrate evaluation results
         # multiprocessing args are different from student_dict here
         # initialize student dictionary
 
-        student_dict = dict_table.RepoTable()
+        student_dict = self.new_result()
+
+        # rows from the last run
+        if checkpoint is not None:
+            for repo in repo_list:
+                if checkpoint.is_done(repo['name']):
+                    self.add_row_to_result(student_dict, repo['name'], checkpoint.get(repo['name']))
+
+            repo_list = [repo for repo in repo_list if not checkpoint.is_done(repo['name'])]
 
         if b_multiprocessing:
-            p = multiprocessing.Pool()
+            # each worker receives this evaluator only once
+            p = multiprocessing.Pool(initializer=init_worker, initargs=(self,))
 
             # visit all folders
             # p.map() or map() requires all members' instance on the memory at the same time
             # "p.imap() returns an iterator"
             # https://stackoverflow.com/questions/25429799/memory-error-with-multiprocessing-in-python
-            for result_dict in p.imap_unordered(self.eval_repo, enumerate(repo_list)):
-                student_dict.update(result_dict)
+            # tasks & results : (k, repo) & (name, row) of one repository
+            for repo_name, row_dict in p.imap_unordered(eval_repo_row_in_worker, enumerate(repo_list)):
+                self.add_row_to_result(student_dict, repo_name, row_dict, checkpoint)
 
             p.close()
             p.join()
         else:
             # for debugging, single processing could be easier
             for k_repo in enumerate(repo_list):
-                result_dict = self.eval_repo(k_repo)
-                student_dict.update(result_dict)
+                repo_name, row_dict = self.eval_repo_row(k_repo)
+                self.add_row_to_result(student_dict, repo_name, row_dict, checkpoint)
 
         return student_dict
 
+    @staticmethod
+    def new_result():
+        return dict_table.RepoTable()
+
+    def add_row_to_result(self, student_dict, repo_name, row_dict, checkpoint=None):
+        # a repository without any evaluation does not have a row
+        if row_dict:
+            student_dict.set_row(repo_name, row_dict)
+
+        # retry failed ones in the next run
+        if checkpoint is not None and not self.is_error_row(row_dict):
+            checkpoint.record(repo_name, row_dict)
+
+    @staticmethod
+    def is_error_row(row_dict):
+        return ' error' in row_dict
+
+    def eval_repo_row(self, k_repo):
+        """
+        eval_repo() and return (repository name, row of the repository)
+        If failed, the row has ' error' column instead of stopping all evaluations
+        """
+        _, repo = k_repo
+        cwd = os.getcwd()
+
+        try:
+            self.eval_repo(k_repo)
+            row_dict = self.pop_row(repo['name'])
+        except Exception as e:
+            print(f'{self.get_class_name()}.eval_repo_row() : failed {repo["name"]}')
+            traceback.print_exc()
+            row_dict = self.get_error_row(e)
+            # not to leave the failed row in the table
+            self.pop_row(repo['name'])
+        finally:
+            os.chdir(cwd)
+
+        return repo['name'], row_dict
+
+    def pop_row(self, repo_name):
+        """
+        Row of the repository
+        Empty the table not to accumulate all repositories in a worker
+        """
+        row_dict = self.table.index.get(repo_name, {})
+        self.table = dict_table.RepoTable()
+        return row_dict
+
+    @staticmethod
+    def get_error_row(e):
+        return {
+            ' total': 0,
+            ' error': ' '.join(f'{type(e).__name__}: {e}'.split()),
+        }
+
     def eval_repo(self, k_repo):
         """
         Evaluate one repository
@@ -70,15 +165,18 @@ class RepoEval(object):
         k, repo = k_repo
         # to explicitly pass repository name
         # update repo information
-        self.repo_name = repo['name']
-        self.repo_path = repo['path']
+        self.start_repo(repo)
         # to obtain the name of the class:
         # https://stackoverflow.com/questions/510972/getting-the-class-name-of-an-instance-in-python
         print('{repoEval}.eval_repo({k:2d}) start: name={name}'.format(
             repoEval=self.get_class_name(), k=k, name=repo['name']))
 
-        for path_dirs_files in os.walk(self.repo_path):
-            self.eval_folder_in_repo(path_dirs_files[0], path_dirs_files[2])
+        try:
+            self.eval_repo_body()
+
+            self.finish_repo(repo['name'])
+        finally:
+            self.end_repo()
 
         print('{repoEval:s}.eval_repo({k:2d}) end: name={name} ({time:g} sec)'.format(
             k=k, name=repo['name'], time=(time.time() - start_time_sec),
@@ -86,43 +184,225 @@ class RepoEval(object):
         ))
         return self.table
 
+    # True if eval_repo_body() visits all files of the repository
+    b_walk = True
+
+    def start_repo(self, repo, snapshot=None):
+        """
+        :param dict repo: {'name': repository name, 'path': repository folder}
+        :param RevisionSnapshot snapshot: shared by a composite evaluator (optional)
+        """
+        self.repo_name = repo['name']
+        self.repo_path = repo['path']
+
+        if self.revision is None:
+            self.snapshot = None
+
+            if self.eval_cache is not None:
+                self.blob_sha_dict = git.get_clean_blob_sha_dict(self.repo_path)
+        else:
+            self.b_snapshot_owner = snapshot is None
+
+            if self.b_snapshot_owner:
+                snapshot = RevisionSnapshot(self.repo_path, self.revision, previous=self.kept_snapshot)
+                self.kept_snapshot = None
+
+            self.snapshot = snapshot
+            # every file of the commit is as committed
+            self.blob_sha_dict = snapshot.blob_sha_dict
+
+    def end_repo(self):
+        """
+        Remove files of the revision, if any
+        Keep them with the memo for the next revision of the repository
+        """
+        if self.b_snapshot_owner and (self.snapshot is not None):
+            if self.blob_evaluation_dict is None:
+                self.snapshot.close()
+            else:
+                self.kept_snapshot = self.snapshot
+
+        self.snapshot = None
+        self.b_snapshot_owner = False
+
+    def get_work_path(self):
+        """
+        Folder with the files to evaluate : the repository or the files of the revision
+        """
+        if self.snapshot is None:
+            result = self.repo_path
+        else:
+            result = self.snapshot.get_path()
+
+        return result
+
+    def set_blob_memo(self, b_memo):
+        """
+        Reuse evaluations of files unchanged since an earlier revision of the same repository
+        and write only the files changed since
+        Start a new memo for each repository
+        """
+        self.blob_evaluation_dict = {} if b_memo else None
+
+        if self.kept_snapshot is not None:
+            self.kept_snapshot.close()
+            self.kept_snapshot = None
+
+    def get_memo_key(self, filename):
+        """
+        Key of the evaluation of the file in the memo of earlier revisions; None to evaluate again
+        Override this if the evaluation depends only on the file or on its folder; not on the history
+        """
+        return None
+
+    def get_blob_memo_key(self, filename):
+        """
+        (path in repository, blob sha) of a committed file; None otherwise
+        """
+        blob_sha = self.get_blob_sha(filename)
+
+        return None if blob_sha is None else (self.get_path_in_repo(filename), blob_sha)
+
+    def get_log_revision_list(self):
+        """
+        Where `git log` of the current repository would start; [] for HEAD
+        """
+        if self.snapshot is None:
+            result = []
+        else:
+            result = [self.snapshot.commit_sha]
+
+        return result
+
+    def get_path_in_repo(self, filename):
+        """
+        Path of the file in the current folder from the repository folder as git shows
+        """
+        rel_path = os.path.relpath(os.path.abspath(filename), os.path.abspath(self.get_work_path()))
+        return rel_path.replace(os.sep, '/')
+
+    def get_blob_sha(self, filename):
+        """
+        git blob sha of the file in the current folder or None if not committed as is
+        """
+        return self.blob_sha_dict.get(self.get_path_in_repo(filename), None)
+
+    def get_eval_cache_config(self):
+        """
+        Override this to add settings changing the results
+        """
+        return (self.eval_cache_version, )
+
+    def eval_cached(self, function, filename, *args):
+        """
+        function(filename, *args) or its result of the same file content from the evaluation cache
+        """
+        blob_sha = self.get_blob_sha(filename) if (self.eval_cache is not None) else None
+
+        if blob_sha is None:
+            result = function(filename, *args)
+        else:
+            key = eval_cache.get_key(
+                blob_sha, f'{self.get_class_name()}.{function.__name__}', self.get_eval_cache_config())
+
+            result = self.eval_cache.get(key)
+
+            if result is None:
+                result = function(filename, *args)
+                self.eval_cache.put(key, result)
+
+        return result
+
+    def eval_repo_body(self):
+        """
+        Override this if not visiting each file
+        """
+        for path, filename_list in self.iter_folders():
+            self.eval_folder_in_repo(path, filename_list)
+
+    def iter_folders(self):
+        """
+        (folder path, [file name, ...]) of the repository
+        Files of the commit if evaluating a revision
+        Files in the git index if a git repository; otherwise, os.walk()
+        Ignored folders are skipped before being read
+        """
+        work_path = self.get_work_path()
+
+        if (self.snapshot is not None) or os.path.exists(os.path.join(self.repo_path, '.git')):
+            if self.snapshot is None:
+                folder_dict = git.get_index_folder_dict(self.repo_path)
+            else:
+                folder_dict = git.get_folder_dict(self.snapshot.blob_sha_dict)
+
+            for folder, filename_list in folder_dict.items():
+                path = os.path.normpath(os.path.join(work_path, folder))
+
+                if not self.is_ignore_walk_path(path):
+                    yield path, filename_list
+        else:
+            for path, dir_list, filename_list in os.walk(work_path):
+                # not to visit ignored folders at all
+                dir_list[:] = [dir_name for dir_name in dir_list
+                               if not self.is_ignore_walk_path(os.path.join(path, dir_name))]
+
+                yield path, filename_list
+
+    def is_ignore_walk_path(self, path):
+        """
+        Override this if several evaluators share one visit to each file
+        """
+        return self.is_ignore_path(path)
+
+    def finish_repo(self, repo_name):
+        """
+        Override this to add representative numbers to the row of the repository
+        """
+        pass
+
     def eval_folder_in_repo(self, path, filename_list):
         """
-        call back function for os.path.walk()
         filter if path interesting (.git, xcode, ...)
-        go to the path
         run through namelist loop
-        return to the original path
+        without changing the current folder
         """
 
         if self.is_ignore_path(path):
             pass
         else:
-
-            # cd. return is original path
-            org_path = repo_path.cd(os.path.abspath(path))
-
-            # print('-'*80)
-            # print(os.path.abspath(os.curdir))
-            # print('-'*80)
-
             for filename in filename_list:
                 self.eval_file(path, filename, self.repo_name)
 
-            os.chdir(org_path)
-
     def eval_file(self, path, filename, repo_name):
-        isfile = os.path.isfile(filename)
+        # file path instead of changing folders
+        file_path = os.path.join(path, filename)
+        isfile = os.path.isfile(file_path)
 
         if isfile and (not self.is_ignore_filename(filename)):
-            evaluation = self.eval_file_base(filename)
+            evaluation = self.eval_file_memo(file_path)
 
             # path in repository for column key
-            rel_path = os.path.relpath(path, self.repo_path)
+            rel_path = os.path.relpath(path, self.get_work_path())
             column_key = '/'.join((rel_path, filename)).lower()
 
             self.table.set_row_column(repo_name, column_key, evaluation)
 
+    def eval_file_memo(self, filename):
+        """
+        eval_file_base() or the evaluation of the same get_memo_key() from the memo
+        """
+        key = self.get_memo_key(filename) if (self.blob_evaluation_dict is not None) else None
+
+        if key is None:
+            result = self.eval_file_base(filename)
+        else:
+            if key not in self.blob_evaluation_dict:
+                self.blob_evaluation_dict[key] = self.eval_file_base(filename)
+
+            result = self.blob_evaluation_dict[key]
+
+        return result
+
     @staticmethod
     def is_ignore_path(path):
         # check if ignore
@@ -169,7 +449,7 @@ class RepoEval(object):
             result = iter_repo.read_b_decode(filename)
         except UnicodeDecodeError:
             print('%s : unable to read %s' %
-                  (self.get_class_name(), os.path.join(os.getcwd(), filename)))
+                  (self.get_class_name(), os.path.abspath(filename)))
             result = ''
 
         return result
@@ -180,6 +460,245 @@ class RepoEval(object):
         return type(self).__name__
 
 
+# evaluator of this worker process of RepoEval.eval_repo_list()
+worker_evaluator = None
+
+
+def init_worker(evaluator):
+    """
+    multiprocessing.Pool initializer : keep the evaluator once per worker
+    instead of pickling it with every task
+    """
+    global worker_evaluator
+    worker_evaluator = evaluator
+
+
+def eval_repo_row_in_worker(k_repo):
+    _, repo = k_repo
+
+    try:
+        result = worker_evaluator.eval_repo_row(k_repo)
+    except Exception as e:
+        # an exception here would stop imap_unordered() of all the other repositories
+        print(f'eval_repo_row_in_worker() : failed {repo["name"]}')
+        traceback.print_exc()
+        result = repo['name'], worker_evaluator.get_error_row(e)
+
+    return result
+
+
+class RevisionSnapshot(object):
+    """
+    Files of one commit read from the git object store
+    Neither the work tree nor the index of the repository changes;
+    files are written to a temporary folder only if an evaluator visits them
+    """
+
+    def __init__(self, repo_path, revision, previous=None):
+        """
+        :param RevisionSnapshot previous: of the same repository; its files are updated instead of written again
+        """
+        self.repo_path = repo_path
+        self.revision = revision
+
+        self.commit_sha = git.get_object_reader(repo_path).resolve(f'{revision}^{{commit}}')
+
+        if self.commit_sha is None:
+            raise ValueError(f'no commit {revision!r} in {repo_path}')
+
+        # {path in repository: blob sha}
+        self.blob_sha_dict = git.get_tree_blob_sha_dict(self.commit_sha, repo_path)
+
+        self.temp_folder = None
+        # {path in repository: (size, modified time) when written} to find files changed by evaluations
+        self.stat_dict = {}
+        # {folder in repository: tree sha}
+        self.tree_sha_dict = {}
+
+        self.previous = previous
+
+    def get_path(self):
+        """
+        Temporary folder with the files of the commit
+        """
+        if self.temp_folder is None:
+            if (self.previous is not None) and (self.previous.temp_folder is not None):
+                # take over the folder of the previous revision
+                self.temp_folder, self.stat_dict = self.previous.temp_folder, self.previous.stat_dict
+                self.previous.temp_folder = None
+                write_dict = self.remove_changed_files(self.previous.blob_sha_dict)
+            else:
+                self.temp_folder = tempfile.TemporaryDirectory(prefix='reposetman_')
+                write_dict = self.blob_sha_dict
+
+            git.write_blobs(write_dict, self.temp_folder.name, self.repo_path)
+
+            for path in write_dict:
+                self.stat_dict[path] = get_stat(os.path.join(self.temp_folder.name, *path.split('/')))
+
+        if self.previous is not None:
+            self.previous.close()
+            self.previous = None
+
+        return self.temp_folder.name
+
+    def remove_changed_files(self, old_blob_sha_dict):
+        """
+        Remove files not as this commit from the folder of an earlier commit
+        including files & folders the evaluations made
+
+        :param dict old_blob_sha_dict: of the commit whose files are in the folder
+        :return: {path in repository: blob sha} to write
+        """
+        write_dict = dict(self.blob_sha_dict)
+
+        # folders of the commit including those with folders only
+        folder_set = set()
+        for path in self.blob_sha_dict:
+            folder = posixpath.dirname(path)
+            while folder and (folder not in folder_set):
+                folder_set.add(folder)
+                folder = posixpath.dirname(folder)
+
+        for folder, dir_list, filename_list in os.walk(self.temp_folder.name):
+            rel_folder = os.path.relpath(folder, self.temp_folder.name).replace(os.sep, '/')
+
+            for dir_name in list(dir_list):
+                dir_path = os.path.join(folder, dir_name)
+
+                if posixpath.normpath(posixpath.join(rel_folder, dir_name)) not in folder_set:
+                    dir_list.remove(dir_name)
+
+                    if os.path.islink(dir_path):
+                        os.remove(dir_path)
+                    else:
+                        shutil.rmtree(dir_path)
+
+            for filename in filename_list:
+                file_path = os.path.join(folder, filename)
+                path = posixpath.normpath(posixpath.join(rel_folder, filename))
+
+                if all((
+                    path in write_dict,
+                    write_dict.get(path, None) == old_blob_sha_dict.get(path, None),
+                    self.stat_dict.get(path, None) == get_stat(file_path),
+                )):
+                    # as written for the earlier commit
+                    del write_dict[path]
+                else:
+                    os.remove(file_path)
+                    self.stat_dict.pop(path, None)
+
+        return write_dict
+
+    def get_tree_sha(self, folder):
+        """
+        Tree sha of a folder of the commit; '.' for the top folder
+        """
+        if folder not in self.tree_sha_dict:
+            self.tree_sha_dict[folder] = git.get_object_reader(self.repo_path).resolve(
+                f'{self.commit_sha}:{"" if os.curdir == folder else folder}')
+
+        return self.tree_sha_dict[folder]
+
+    def close(self):
+        if self.temp_folder is not None:
+            self.temp_folder.cleanup()
+            self.temp_folder = None
+
+        if self.previous is not None:
+            self.previous.close()
+            self.previous = None
+
+
+def get_stat(file_path):
+    stat = os.lstat(file_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class RepoEvalComposite(RepoEval):
+    """
+    Several evaluations with one visit to each repository
+    Each file goes to all evaluators; one row for each evaluator
+    """
+
+    def __init__(self, evaluator_list):
+        super(RepoEvalComposite, self).__init__()
+        self.evaluator_list = list(evaluator_list)
+
+    def start_repo(self, repo, snapshot=None):
+        super(RepoEvalComposite, self).start_repo(repo, snapshot)
+
+        # files of the revision written once for all evaluators
+        for evaluator in self.evaluator_list:
+            evaluator.revision = self.revision
+            evaluator.start_repo(repo, self.snapshot)
+
+    def end_repo(self):
+        for evaluator in self.evaluator_list:
+            evaluator.end_repo()
+
+        super(RepoEvalComposite, self).end_repo()
+
+    def set_blob_memo(self, b_memo):
+        # files of the revision kept by this one
+        super(RepoEvalComposite, self).set_blob_memo(b_memo)
+
+        # one memo for each evaluator
+        for evaluator in self.evaluator_list:
+            evaluator.set_blob_memo(b_memo)
+
+    def eval_repo_body(self):
+        # evaluators not visiting files, such as one git log
+        for evaluator in self.evaluator_list:
+            if not evaluator.b_walk:
+                evaluator.eval_repo_body()
+
+        # one os.walk() for the rest
+        if any(evaluator.b_walk for evaluator in self.evaluator_list):
+            super(RepoEvalComposite, self).eval_repo_body()
+
+    def is_ignore_walk_path(self, path):
+        # visit if any evaluator needs the folder
+        return all(evaluator.is_ignore_path(path)
+                   for evaluator in self.evaluator_list if evaluator.b_walk)
+
+    def eval_folder_in_repo(self, path, filename_list):
+        walk_list = [evaluator for evaluator in self.evaluator_list
+                     if evaluator.b_walk and not evaluator.is_ignore_path(path)]
+
+        for filename in filename_list:
+            for evaluator in walk_list:
+                evaluator.eval_file(path, filename, self.repo_name)
+
+    def finish_repo(self, repo_name):
+        for evaluator in self.evaluator_list:
+            evaluator.finish_repo(repo_name)
+
+    def pop_row(self, repo_name):
+        return [evaluator.pop_row(repo_name) for evaluator in self.evaluator_list]
+
+    def get_error_row(self, e):
+        return [evaluator.get_error_row(e) for evaluator in self.evaluator_list]
+
+    def new_result(self):
+        """
+        One RepoTable for each evaluator
+        """
+        return [evaluator.new_result() for evaluator in self.evaluator_list]
+
+    def add_row_to_result(self, student_dict_list, repo_name, row_dict_list, checkpoint=None):
+        for evaluator, student_dict, row_dict in zip(self.evaluator_list, student_dict_list, row_dict_list):
+            evaluator.add_row_to_result(student_dict, repo_name, row_dict)
+
+        if checkpoint is not None and not self.is_error_row(row_dict_list):
+            checkpoint.record(repo_name, row_dict_list)
+
+    def is_error_row(self, row_dict_list):
+        return any(evaluator.is_error_row(row_dict)
+                   for evaluator, row_dict in zip(self.evaluator_list, row_dict_list))
+
+
 class RepoEvalCountCommit(RepoEval):
     """
     To count number of commits per each file
@@ -220,7 +739,8 @@ class RepoEvalCountCommit(RepoEval):
     @staticmethod
     def get_git_cmd(filename):
         # this part became a method to apply various git log commands more easily
-        return '''log --follow "{filename}"'''.format(filename=filename)
+        # a list; git.git() would split a str into characters
+        return ['log', '--follow', '--', filename]
 
     def get_dict_list_from_git_log(self, git_log_msg):
         # extracts information fom the git log text
@@ -239,19 +759,139 @@ class RepoEvalCountCommit(RepoEval):
         # TODO : pair git command & regex pattern ?
 
         # some file name may contain space
-        git_cmd_string = self.get_git_cmd(filename)
+        if self.snapshot is None:
+            # git log in the folder of the file
+            folder, filename = os.path.split(os.path.abspath(filename))
+            git_cmd_string = self.get_git_cmd(filename)
+        else:
+            # files of the revision are not in the repository; git log of the path from the commit
+            folder = self.repo_path
+            git_cmd_string = list(self.get_git_cmd(self.get_path_in_repo(filename)))
+            git_cmd_string[1:1] = self.get_log_revision_list()
 
         # other candidates
         # ref : git log help
         # git log --format="%h, %ai, %an %ae '%s'" --numstat --after=<date> --before=<date>
 
         # run git command
-        git_log_msg = git.git(git_cmd_string, bVerbose=False)
+        msgo, msge = git.run_command([git.git_exe_path] + git_cmd_string, b_verbose=False, cwd=folder)
+        # as git.git()
+        git_log_msg = '\n'.join(msg for msg in (msgo, msge) if msg)
 
         # extract information from git log message and return its list
         return self.get_dict_list_from_git_log(git_log_msg)
 
 
+class RepoEvalCountCommitNameStatus(RepoEvalCountCommit):
+    """
+    Same counts as RepoEvalCountCommit from one `git log --name-status -M` per repository
+    instead of one `git log --follow` per file
+    """
+
+    # commit separator in the git log
+    commit_start = '\x01'
+
+    def __init__(self, re_git_log=None):
+        super(RepoEvalCountCommitNameStatus, self).__init__(re_git_log)
+        # path in the repository : number of commits
+        self.commit_count_dict = {}
+
+    def get_git_cmd(self):
+        return ['log', '-z', '--name-status', '-M', '--format=%x01%H']
+
+    def start_repo(self, repo, snapshot=None):
+        super(RepoEvalCountCommitNameStatus, self).start_repo(repo, snapshot)
+
+        git_log, _ = git.run_command(
+            [git.git_exe_path] + self.get_git_cmd() + self.get_log_revision_list(),
+            b_verbose=False, cwd=self.repo_path)
+
+        self.commit_count_dict = self.count_name_status(git_log)
+
+    def count_name_status(self, git_log):
+        """
+        Number of commits of each file following renames from the newest commit
+
+        :param str git_log: output of `git log -z --name-status -M --format=%x01%H`
+        :return: {path at the newest commit: number of commits}
+        """
+        count_dict = {}
+        # path in older commits : path at the newest commit
+        # None if the path was a different file
+        alias_dict = {}
+
+        token_iter = iter(git_log.split('\0'))
+
+        def count(path):
+            key = alias_dict.get(path, path)
+            if key is not None:
+                count_dict[key] = count_dict.get(key, 0) + 1
+            return key
+
+        for token in token_iter:
+            # after the commit line
+            status = token.lstrip('\n')
+
+            if (not status) or status.startswith(self.commit_start):
+                continue
+
+            if status[0] in 'RC':
+                old_path, new_path = next(token_iter), next(token_iter)
+                key = count(new_path)
+
+                if 'R' == status[0]:
+                    # older commits of the old name are of this file
+                    alias_dict[old_path] = key
+                    # older commits of the new name are of another file
+                    if new_path != old_path:
+                        alias_dict[new_path] = None
+            else:
+                count(next(token_iter))
+
+        return count_dict
+
+    def count_file_commits(self, filename):
+        # path in repository to find the number of commits
+        key = posixpath.normpath(self.get_path_in_repo(filename))
+
+        return self.commit_count_dict.get(key, 0)
+
+
+class CommitCreditAccumulator(object):
+    """
+    If n files in one commit, each file gets 1/n
+    Counts commits of each n for each file and converts to fractions.Fraction once per file
+    instead of adding Fraction's commit by commit
+    """
+
+    def __init__(self):
+        # file : {n files in commit : number of commits}
+        self.count_dict = {}
+
+    def add_commit(self, file_list):
+        n = len(file_list)
+
+        for filename in file_list:
+            n_count_dict = self.count_dict.setdefault(filename, {})
+            n_count_dict[n] = n_count_dict.get(n, 0) + 1
+
+    def get_credit(self, filename):
+        n_count_dict = self.count_dict[filename]
+
+        # least common multiple of the denominators of the file
+        lcm = 1
+        for n in n_count_dict:
+            lcm = lcm * n // math.gcd(lcm, n)
+
+        # exact sum of count / n with integers
+        numerator = sum(count * (lcm // n) for n, count in n_count_dict.items())
+
+        return fractions.Fraction(numerator, lcm)
+
+    def get_credit_dict(self):
+        return {filename: self.get_credit(filename) for filename in self.count_dict}
+
+
 class RepoEvalCountOneCommitLog(RepoEval):
     """
     Obtain information on all files from one git log
@@ -275,6 +915,8 @@ class RepoEvalCountOneCommitLog(RepoEval):
         self.exclude_email_tuple = exclude_email_tuple
         self.commit_split_token = commit_split_token
         self.field_split_token = field_split_token
+        # folder of the commit count caches or None not to keep them; not within the repositories
+        self.commit_count_cache_folder = None
 
     def get_git_cmd(self, after=None, before=None):
         # To let git generate string compatible with python ast as much as possible
@@ -291,82 +933,243 @@ class RepoEvalCountOneCommitLog(RepoEval):
             f"""--pretty=format:{self.commit_split_token}%H{self.field_split_token}%an{self.field_split_token}%ae{self.field_split_token}%ad{self.field_split_token}%s""",
         ]
 
+        cmd_list += self.get_date_option_list(after, before)
+
+        return cmd_list
+
+    def get_git_cmd_z(self, after=None, before=None, rev_option='--all'):
+        """
+        git log with NUL separated fields & file names, without any quotation
+        <sha>\0<author>\0<email>\0<date>\0<subject>\0[\n]<add>\t<del>\t<path>\0...
+        """
+        cmd_list = [
+            'log',  # must be the first
+            '-z',
+            '--encoding=utf-8',
+            '--numstat',
+            rev_option,
+            '--format=%H%x00%an%x00%ae%x00%ad%x00%s',
+        ]
+
+        cmd_list += self.get_date_option_list(after, before)
+
+        return cmd_list
+
+    def get_date_option_list(self, after=None, before=None):
+        date_option_list = []
+
         if after:
-            cmd_list.append('--after="{after}"'.format(after=after))
+            date_option_list.append('--after="{after}"'.format(after=after))
         elif self.after:
-            cmd_list.append('--after="{after}"'.format(after=self.after))
+            date_option_list.append('--after="{after}"'.format(after=self.after))
 
         if before:
-            cmd_list.append('--before="{before}"'.format(before=before))
+            date_option_list.append('--before="{before}"'.format(before=before))
         elif self.before:
-            cmd_list.append('--before="{before}"'.format(before=self.before))
+            date_option_list.append('--before="{before}"'.format(before=self.before))
 
-        return cmd_list
+        return date_option_list
 
-    def eval_repo(self, k_repo):
+    # one git log instead of visiting each file
+    b_walk = False
+
+    # change if the meaning of the cached credits changes
+    cache_version = 2
+
+    def eval_repo_body(self):
         """
-        Evaluate one repository
+        Only commits new since the last run, if the commit count cache of the repository is usable
         """
-        start_time_sec = time.time()
+        credit = CommitCreditAccumulator()
+        n_commits = 0
 
-        k, repo = k_repo
-        # to explicitly pass repository name
-        # update repo information
-        self.repo_name = repo['name']
-        self.repo_path = repo['path']
-        # to obtain the name of the class:
-        # https://stackoverflow.com/questions/510972/getting-the-class-name-of-an-instance-in-python
-        print('{repoEval}.eval_repo({k:2d}) start: name={name}'.format(
-            repoEval=self.get_class_name(), k=k, name=repo['name']))
+        if self.snapshot is None:
+            # what `--all` would start from
+            tip_list = git.get_tip_list(self.repo_path)
+        else:
+            # commits of the revision only
+            tip_list = self.get_log_revision_list()
+        rev_list = list(tip_list)
 
-        path_org = os.getcwd()
-        os.chdir(self.repo_path)
+        cache = self.load_commit_count_cache()
 
-        git_log__err_msg = git.git_common_list(
-            self.get_git_cmd(), b_verbose=False)
+        if self.is_cache_usable(cache, tip_list):
+            credit.count_dict = cache['count_dict']
+            n_commits = cache['n_commits']
+            # old_tips..new_tips
+            rev_list += ['^' + tip for tip in cache['tip_list']]
 
-        os.chdir(path_org)
+            # nobody committed since the last run
+            b_new_commits = (set(tip_list) != set(cache['tip_list']))
+        else:
+            # without revisions, git log would start from HEAD
+            b_new_commits = bool(tip_list)
+
+        if b_new_commits:
+            # read git log as git writes; not the whole log at once
+            git_log_tokens = git.iter_git_tokens(
+                self.get_git_cmd_z(rev_option='--stdin'), cwd=self.repo_path,
+                in_bytes=''.join(rev + '\n' for rev in rev_list).encode())
 
-        git_log = git_log__err_msg[0]
+            # CalledProcessError if git log failed; the cache keeps the old tips then
+            n_commits += self.accumulate_commits(self.gen_commits_z(git_log_tokens), credit)
 
-        column_set, eval_dict = self.convert_git_log_to_table(git_log)
+        # only after reading all new commits; otherwise they would be missing in later runs
+        self.save_commit_count_cache(tip_list, credit, n_commits)
+
+        column_set, eval_dict = self.get_credit_table(credit, n_commits)
 
         # update evaluation result
         for column in column_set:
             self.table.set_row_column(
                 self.repo_name, column, eval_dict[column])
 
-        # to obtain the name of the class:
-        # https://stackoverflow.com/questions/510972/getting-the-class-name-of-an-instance-in-python
-        print('{repoEval:s}.eval_repo({k:2d}) end: name={name} ({time:g} sec)'.format(
-            k=k, name=repo['name'], time=(time.time() - start_time_sec),
-            repoEval=self.get_class_name()
-        ))
-        return self.table
+    def get_cache_key(self):
+        # cached credits are valid only for the same repository, revision, and evaluation settings
+        return (self.get_class_name(), self.cache_version, os.path.abspath(self.repo_path), self.revision,
+                self.after, self.before, tuple(self.exclude_email_tuple))
+
+    def get_cache_path(self):
+        """
+        One cache file of each repository & revision in commit_count_cache_folder or None
+        """
+        result = None
+
+        if self.commit_count_cache_folder:
+            digest = hashlib.sha1(
+                repr((os.path.abspath(self.repo_path), self.revision)).encode('utf-8')).hexdigest()[:16]
+            result = os.path.join(self.commit_count_cache_folder, f'{self.repo_name}_{digest}.pickle')
+
+        return result
+
+    def load_commit_count_cache(self):
+        cache_path = self.get_cache_path()
+        cache = None
+
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path, 'rb') as f:
+                    cache = pickle.load(f)
+            except (pickle.UnpicklingError, EOFError, ValueError, TypeError, AttributeError):
+                print(f'{self.get_class_name()}.load_commit_count_cache() : ignoring {cache_path}')
+
+        return cache
+
+    def save_commit_count_cache(self, tip_list, credit, n_commits):
+        cache_path = self.get_cache_path()
+
+        if cache_path:
+            os.makedirs(self.commit_count_cache_folder, exist_ok=True)
+
+            # write to a temporary file first not to leave a broken cache
+            temp_path = cache_path + '.tmp'
+
+            with open(temp_path, 'wb') as f:
+                pickle.dump(
+                    {
+                        'key': self.get_cache_key(),
+                        'tip_list': list(tip_list),
+                        'count_dict': credit.count_dict,
+                        'n_commits': n_commits,
+                    },
+                    f
+                )
+
+            os.replace(temp_path, cache_path)
+
+    def is_cache_usable(self, cache, tip_list):
+        """
+        Same settings and all commits of the last run still reachable from the tips
+        Otherwise, count all commits again
+        """
+        result = False
+
+        if cache and (cache.get('key', None) == self.get_cache_key()):
+            # commits reachable from old tips but not from new tips; should be none
+            msgo, msge = git.run_command(
+                (git.git_exe_path, 'rev-list', '--count', '--stdin'),
+                b_verbose=False,
+                in_txt=''.join(tip + '\n' for tip in cache['tip_list'])
+                + ''.join('^' + tip + '\n' for tip in tip_list),
+                cwd=self.repo_path,
+            )
+
+            result = (not msge.strip()) and ('0' == msgo.strip())
+
+        return result
 
     def convert_git_log_to_table(self, git_log):
-        # column titles == unique file names in the git log
-        column_set = unique_list.unique_list()
+        return self.convert_git_log_lines_to_table(git_log.splitlines())
+
+    def gen_commit_blocks(self, git_log_lines):
+        """
+        Lines of each commit from lines of git log
+        Only one commit at a time in the memory
 
-        commits_list = []
-        eval_dict = {}
+        :param iter git_log_lines: lines of git log
+        :return: generates [commit information line, file line, file line, ...]
+        """
+        git_log_block_lines = []
 
-        # one big git log -> list of commits
-        git_log_split_blocks = git_log.split(self.commit_split_token)
+        for line in git_log_lines:
+            line = line.rstrip('\n')
+
+            if line.startswith(self.commit_split_token):
+                if git_log_block_lines:
+                    yield git_log_block_lines
+                git_log_block_lines = [line[len(self.commit_split_token):]]
+            elif git_log_block_lines:
+                git_log_block_lines.append(line)
+
+        if git_log_block_lines:
+            yield git_log_block_lines
+
+    def convert_git_log_lines_to_table(self, git_log_lines):
+        return self.convert_commits_to_table(self.gen_commits_from_lines(git_log_lines))
+
+    def gen_commits_z(self, git_log_tokens):
+        """
+        (commit dict, [path, ...]) of each commit from tokens of get_git_cmd_z()
+        Fields are at fixed positions; no quotation or escape to handle
+
+        :param iter git_log_tokens: bytes between NUL's
+        """
+        token_iter = iter(git_log_tokens)
 
-        # remove empty string
-        # TODO : consider git_log.strip(self.commit_split_token).split(self.commit_split_token)
-        #        to avoid a special case
-        if not git_log_split_blocks[0]:
-            del git_log_split_blocks[0]
+        commit_dict = None
+        path_list = []
 
-        temporary_file_list = unique_list.unique_list(['no commit yet'])
+        for token in token_iter:
+            if b'\t' in token:
+                # <add>\t<del>\t<path> or <add>\t<del>\t then <old path> <new path> if renamed
+                path = token.split(b'\t', 2)[2]
+                if not path:
+                    next(token_iter)
+                    path = next(token_iter)
 
-        last_commit_dict = {'subject': 'no commit yet'}
+                path_list.append(path.decode('utf-8', errors='replace'))
 
+            elif token:
+                # start of a new commit
+                if commit_dict is not None:
+                    yield commit_dict, path_list
+
+                field_list = [token] + [next(token_iter) for _ in range(4)]
+                commit_dict = dict(zip(
+                    ('sha', 'author', 'email', 'date', 'subject'),
+                    (field.decode('utf-8', errors='replace') for field in field_list)
+                ))
+                path_list = []
+
+        if commit_dict is not None:
+            yield commit_dict, path_list
+
+    def gen_commits_from_lines(self, git_log_lines):
+        """
+        (commit dict, [path, ...]) of each commit from lines of get_git_cmd()
+        """
         # commit loop
-        for git_log_block in git_log_split_blocks:
-            # TODO : refactor into a method?
+        for git_log_lines in self.gen_commit_blocks(git_log_lines):
 
             # one commit example:
             # < commit information >
@@ -376,8 +1179,6 @@ class RepoEvalCountOneCommitLog(RepoEval):
             # <int add>    <int del>    <filename 3>
             # <blank line>
 
-            git_log_lines = git_log_block.splitlines()
-
             # using git log output as input to python
             last_commit_dict = self.get_commit_dict(git_log_lines[0])
 
@@ -395,19 +1196,7 @@ class RepoEvalCountOneCommitLog(RepoEval):
                 f"convert_git_log_to_table(): isinstance(last_commit_dict, dict) = {isinstance(last_commit_dict, dict)}" \
                 f"convert_git_log_to_table(): type(last_commit_dict) = {type(last_commit_dict)}"
 
-            # filer using email address
-            # TODO : consider refactoring into a function
-            if last_commit_dict['email'] in self.exclude_email_tuple:
-                last_commit_dict = {}
-                continue
-
-            # keep note of commits
-            commits_list.append(last_commit_dict)
-
-            # reset storage for 'files in commit'
-            temporary_file_list = unique_list.unique_list()
-
-            line = 'could be a merge commit'
+            path_list = []
 
             # process file list
             for line in git_log_lines[1:]:
@@ -419,51 +1208,84 @@ class RepoEvalCountOneCommitLog(RepoEval):
 
                     # get path/filename
                     add__delete__key = line_strip.split()
-                    column_key = add__delete__key[2]
+                    path_list.append(add__delete__key[2])
+
+            yield last_commit_dict, path_list
+
+    def convert_commits_to_table(self, commit_iter):
+        """
+        Credit table from (commit dict, [path, ...]) of each commit
+        If n files in one commit, each file gets 1/n
+        """
+        credit = CommitCreditAccumulator()
+
+        n_commits = self.accumulate_commits(commit_iter, credit)
+
+        return self.get_credit_table(credit, n_commits)
+
+    def accumulate_commits(self, commit_iter, credit):
+        """
+        Add credits of each commit to credit
+
+        :param CommitCreditAccumulator credit:
+        :return: number of commits
+        """
+        # number of commits
+        n_commits = 0
+
+        for last_commit_dict, path_list in commit_iter:
+
+            # filer using email address
+            # TODO : consider refactoring into a function
+            if last_commit_dict['email'] in self.exclude_email_tuple:
+                continue
+
+            # keep note of commits
+            n_commits += 1
 
-                    path, filename = os.path.split(column_key)
-                    # check ignore list
-                    if not (self.is_ignore_path(path) or self.is_ignore_filename(filename)):
-                        # if n files in one commit, evaluation would be 1/n
+            # reset storage for 'files in commit'
+            temporary_file_list = unique_list.unique_list()
 
-                        # TODO : simplify data structures
-                        # for header of the table
-                        column_set.add(column_key)
+            # process file list
+            for column_key in path_list:
+                path, filename = os.path.split(column_key)
+                # check ignore list
+                if not (self.is_ignore_path(path) or self.is_ignore_filename(filename)):
+                    # if n files in one commit, evaluation would be 1/n
 
-                        # to count the number of
-                        temporary_file_list.add(column_key)
+                    # to count the number of
+                    temporary_file_list.add(column_key)
 
             # end of files list
             if temporary_file_list:
-                point = fractions.Fraction(1, len(temporary_file_list))
-
                 # build commit count table
-                # loop over files in commit
-                for files_in_commit in temporary_file_list:
-                    eval_dict[files_in_commit] = eval_dict.get(
-                        files_in_commit, 0) + point
-
-                # if it is still not a dict
-                if isinstance(last_commit_dict, str):
-                    # try to convert it again
-                    print(f'last_commit_dict = {repr(last_commit_dict)}')
-                    last_commit_dict = ast.literal_eval(last_commit_dict)
-                    if not isinstance(last_commit_dict, dict):
-                        raise ValueError(
-                            f'last_commit_dict = {repr(last_commit_dict)}')
+                credit.add_commit(temporary_file_list)
+
                 last_commit_dict['files'] = temporary_file_list
             else:
                 print(
-                    f'\n{self.get_class_name()}.convert_git_log_to_table() : end of file list but temporary_file_list empty')
-                print(f'line = {line}')
+                    f'\n{self.get_class_name()}.accumulate_commits() : end of file list but temporary_file_list empty')
                 print('last_commit_dict =', repr(last_commit_dict))
 
+        return n_commits
+
+    @staticmethod
+    def get_credit_table(credit, n_commits):
+        """
+        :return: column titles & {column title: value}
+        """
+        # column titles == unique file names in the git log
+        column_set = unique_list.unique_list(credit.count_dict)
+
+        # exact credits of all commits at once
+        eval_dict = credit.get_credit_dict()
+
         # total number of commits
         # to make it the first element
         # Sorting feature may use this feature
         column_key = ' total'
         column_set.add(column_key)
-        eval_dict[column_key] = len(commits_list)
+        eval_dict[column_key] = n_commits
 
         return column_set, eval_dict
 
@@ -532,15 +1354,23 @@ class RepoEvalPoundLineCounter(RepoEval):
         if not self.is_python(filename):
             result = 'N/A'
         else:
-            txt = self.is_readable(filename)
+            result = self.eval_cached(self.eval_python_file, filename)
+        return result
 
-            if not txt:
-                result = {'readable': False}
-            else:
-                with open(filename, encoding='utf-8') as file_object:
-                    comments_list = self.get_comments_list_from_readline(
-                        file_object.readline, filename=filename)
-                result = self.get_points_from_comments_list(comments_list)
+    def get_memo_key(self, filename):
+        # comments of the file only
+        return self.get_blob_memo_key(filename)
+
+    def eval_python_file(self, filename):
+        txt = self.is_readable(filename)
+
+        if not txt:
+            result = {'readable': False}
+        else:
+            with open(filename, encoding='utf-8') as file_object:
+                comments_list = self.get_comments_list_from_readline(
+                    file_object.readline, filename=filename)
+            result = self.get_points_from_comments_list(comments_list)
         return result
 
     @staticmethod
@@ -550,20 +1380,14 @@ class RepoEvalPoundLineCounter(RepoEval):
     def get_comments_list_from_readline(self, readline, filename=None):
         return read_python.get_comments_list_from_readline(readline, filename=filename)
 
-    def eval_repo(self, k_repo):
+    def finish_repo(self, repo_name):
         """
         Find total number of comment lines
         """
-        super(RepoEvalPoundLineCounter, self).eval_repo(k_repo)
-
-        repo_name = k_repo[1]['name']
-
         # add a representative number
         self.table.set_row_column(
             repo_name, ' total', self.get_total(repo_name))
 
-        return self.table
-
     def get_total(self, repo_name):
         """
         count total number of comment lines in one repository
@@ -611,15 +1435,13 @@ class RepoEvalPoundByteCounterExcludingRef(RepoEvalPoundByteCounter):
         super(RepoEvalPoundByteCounterExcludingRef, self).__init__()
 
         if os.path.exists(self.reference_cfg_filename):
-            self.comments_ref = unique_list.unique_list()
             self.config_ref = configparser.ConfigParser()
             self.config_ref.read(self.reference_cfg_filename)
 
             reference_comment_filename = self.config_ref['operation']['comment_output_file']
 
-            with open(reference_comment_filename, 'r', encoding='utf-8') as f_in:
-                for line in f_in:
-                    self.comments_ref.add(line.strip())
+            # hashed & memory-mapped; workers open the same file
+            self.comments_ref = reference_index.open_reference_index(reference_comment_filename)
 
         else:
             self.init_reference_cfg_file()
@@ -668,6 +1490,10 @@ class RepoEvalPoundByteCounterExcludingRef(RepoEvalPoundByteCounter):
         raise FileNotFoundError(
             f'please configure {self.reference_cfg_filename}, run reference.py, and restart')
 
+    def get_eval_cache_config(self):
+        # results depend on the reference comments too
+        return super(RepoEvalPoundByteCounterExcludingRef, self).get_eval_cache_config() + (self.comments_ref.digest, )
+
     def get_line_point(self, comment, b_verbose=False):
         if comment.strip() not in self.comments_ref:
             if b_verbose:
@@ -680,9 +1506,30 @@ class RepoEvalPoundByteCounterExcludingRef(RepoEvalPoundByteCounter):
 
 
 class RepoEvalRunEach(RepoEval):
-    def __init__(self, python_path):
+    def __init__(self, python_path, timeout_sec=None, max_output_bytes=None,
+                 limit_dict=None, max_concurrent_scripts=None):
+        """
+        Run each .py file
+
+        :param str python_path: python interpreter to run scripts
+        :param float timeout_sec: kill a script and its child processes after this
+        :param int max_output_bytes: keep at most this many bytes of stdout and of stderr
+        :param dict limit_dict: resource limits of each script; see fork_server.set_rlimits()
+        :param int max_concurrent_scripts: at most this many scripts at once in all workers (None : no limit)
+        """
         super(RepoEvalRunEach, self).__init__()
         self.python_path = python_path
+        self.timeout_sec = timeout_sec
+        self.max_output_bytes = max_output_bytes
+        self.limit_dict = limit_dict
+        # goes to the workers with this evaluator through the pool initializer
+        self.script_semaphore = None
+        if max_concurrent_scripts:
+            self.script_semaphore = multiprocessing.BoundedSemaphore(max_concurrent_scripts)
+        # True if python_path is this python; None until asked
+        self.b_same_interpreter = None
+        # script_runner.ForkServerRunner or script_runner.SubprocessRunner
+        self.script_runner = None
 
     def eval_file_base(self, filename):
         if not self.is_python(filename):
@@ -691,7 +1538,48 @@ class RepoEvalRunEach(RepoEval):
             result = self.run_script(filename)
         return result
 
-    def check_grammar(self, filename):
+    def get_eval_cache_config(self):
+        # grammar depends on the interpreter
+        return super(RepoEvalRunEach, self).get_eval_cache_config() + (self.python_path, )
+
+    def get_memo_key(self, filename):
+        """
+        The script may import, list, or read other files of its folder
+        (path in repository, tree sha of the folder) of a revision; None otherwise
+        """
+        key = None
+
+        if (self.snapshot is not None) and (self.get_blob_sha(filename) is not None):
+            path = self.get_path_in_repo(filename)
+            key = (path, self.snapshot.get_tree_sha(posixpath.dirname(path) or os.curdir))
+
+        return key
+
+    def check_grammar(self, filename, source=None):
+        return self.eval_cached(self.compile_file, filename, source)
+
+    # False to always check grammar with python_path -m py_compile
+    b_compile_in_process = True
+    # False to start python_path for each script
+    b_fork_server = True
+
+    def compile_file(self, filename, source=None):
+        """
+        Check grammar within this process if python_path is this python
+        Otherwise, start python_path; another version may accept another grammar
+        source : bytes of the file if already read
+        """
+        if self.b_same_interpreter is None:
+            self.b_same_interpreter = script_runner.is_same_interpreter(self.python_path)
+
+        if self.b_compile_in_process and self.b_same_interpreter:
+            result = compile_in_process(filename, source)
+        else:
+            result = self.compile_file_subprocess(filename)
+
+        return result
+
+    def compile_file_subprocess(self, filename):
         # https://stackoverflow.com/questions/4284313/how-can-i-check-the-syntax-of-python-script-without-executing-it
         # some file names may contain space
 
@@ -712,37 +1600,34 @@ class RepoEvalRunEach(RepoEval):
 
         return result
 
-    def eval_repo(self, k_repo, b_verbose=False):
+    def finish_repo(self, repo_name, b_verbose=False):
         """
-        Find total number of comment lines
+        Representative number of the repository
         """
-        super(RepoEvalRunEach, self).eval_repo(k_repo)
-
-        repo_name = k_repo[1]['name']
-
         total = self.get_total(repo_name)
 
         self.table.set_row_column(repo_name, ' total', total)
 
         if b_verbose:
-            print("{class_name}.eval_repo(): d[{repo_name}][' total']={value}".format(
+            print("{class_name}.finish_repo(): d[{repo_name}][' total']={value}".format(
                 class_name=self.get_class_name(),
                 repo_name=repo_name,
                 value=self.table[repo_name][' total']
             ))
 
-        return self.table
+    def run_script(self, filename, arguments='a b c', file_facts=None):
 
-    def run_script(self, filename, arguments='a b c'):
+        # run in the folder of the script
+        folder, script_name = os.path.split(os.path.abspath(filename))
 
         # some file names may contain space
-        python_cmd_list = [self.python_path, filename]
+        python_cmd_list = [self.python_path, script_name]
 
         if isinstance(arguments, str):
             arguments = arguments.split()
 
         # more adaptive arguments
-        arguments = self.get_arguments(filename)
+        arguments = self.get_arguments(filename, file_facts, folder)
 
         if isinstance(arguments, list):
             python_cmd_list += arguments
@@ -754,12 +1639,13 @@ class RepoEvalRunEach(RepoEval):
         # print('RepoEvalRunEach.run_script() : python_cmd = ', python_cmd)
 
         # subprocess.Popen() needs bytes as input
-        msgo, msge = self.run_script_input(python_cmd_list)
+        run_result = self.run_script_input(python_cmd_list, cwd=folder)
+        msgo, msge = run_result
         if 'Error' in msge:
             # to help debugging
             # present info only if exception happens
             print('{type:s}.run_script() : cwd = {cwd}'.format(
-                type=self.get_class_name(), cwd=os.getcwd()))
+                type=self.get_class_name(), cwd=folder))
             print('{type:s}.run_script() : python_cmd = {cmd!s}'.format(
                 type=self.get_class_name(), cmd=python_cmd_list))
             try:
@@ -774,7 +1660,7 @@ class RepoEvalRunEach(RepoEval):
             if 'FileNotFoundError:' in msge:
                 print('{type:s}.run_script() : available files = {files}\n'.format(type=self.get_class_name(),
                                                                                    files=str(
-                                                                                       os.listdir())
+                                                                                       os.listdir(folder))
                                                                                    ))
 
         # else:
@@ -782,29 +1668,47 @@ class RepoEvalRunEach(RepoEval):
 
         result = {'stdout': len(msgo.strip()), 'stderr': len(msge.strip())}
 
+        # to tell a stuck or too talkative script
+        if getattr(run_result, 'b_timeout', False):
+            result['timeout'] = True
+        if getattr(run_result, 'b_truncated', False):
+            result['truncated'] = True
+
+        # to tell a script ended by a limit
+        kill_reason = script_runner.get_kill_reason(run_result, self.limit_dict)
+        if kill_reason:
+            result['killed'] = kill_reason
+
         # explicitly delete temporary variables to save memory
         del python_cmd_list[:]
-        del msgo, msge, python_cmd_list
+        del msgo, msge, python_cmd_list, run_result
 
         return result
 
-    def get_arguments(self, filename):
+    def get_arguments(self, filename, file_facts=None, folder=None):
+        """
+        :param str folder: where the script would run (current folder by default)
+        """
+        if folder is None:
+            folder = os.getcwd()
+
         # more adaptive arguments
-        if os.path.basename(os.getcwd()).startswith('ex23'):
+        if os.path.basename(folder).startswith('ex23'):
             arguments = ['utf-8', 'replace']
         else:
             arguments = []
 
-            n_argv = get_argn(filename)
+            # already tokenized if file_facts given
+            n_argv = file_facts.get_argn() if (file_facts is not None) else get_argn(filename)
 
             if 1 < n_argv:
                 arguments = list(str(i) for i in range(1, n_argv))
 
                 other_file_list = list(
                     filter(
-                        lambda fname: os.path.isfile(fname) and (
+                        lambda fname: os.path.isfile(os.path.join(folder, fname)) and (
                             not fname.endswith('.py')),
-                        os.listdir()
+                        os.listdir(folder)
                     )
                 )
 
@@ -879,27 +1783,71 @@ class RepoEvalRunEach(RepoEval):
 
         return total
 
-    def run_script_input(self, python_cmd):
+    def run_script_input(self, python_cmd, cwd=None):
+        """
+        :param str cwd: folder to run the script (current folder by default)
+        """
 
         # adaptive input string based on list of available files
         # to prevent excessive file not found error
         input_list = list(str(i) for i in range(10))
 
+        file_list = os.listdir(cwd)
+
         # frequent filename
-        if 'test.txt' in os.listdir():
+        if 'test.txt' in file_list:
             input_list.insert(0, 'test.txt')
-        elif 'ex15_sample.txt' in os.listdir():
+        elif 'ex15_sample.txt' in file_list:
             input_list.insert(0, 'ex15_sample.txt')
 
         input_txt = '\n'.join(input_list)
 
-        # subprocess.Popen() needs bytes as input
-        msgo, msge = git.run_command(
-            python_cmd,
-            in_txt=input_txt,
-            b_verbose=False,
-        )
-        return msgo, msge
+        # wait while too many scripts running in all workers
+        with (self.script_semaphore or contextlib.nullcontext()):
+            if isinstance(python_cmd, (list, tuple)) and (self.python_path == python_cmd[0]):
+                # [python_path, script, arg, ...]
+                result = self.run_script_runner(python_cmd[1:], input_txt, cwd)
+            else:
+                # subprocess.Popen() needs bytes as input
+                result = git.run_command(
+                    python_cmd,
+                    in_txt=input_txt,
+                    b_verbose=False,
+                    timeout_sec=self.timeout_sec,
+                    max_output_bytes=self.max_output_bytes,
+                    cwd=cwd,
+                )
+
+        return result
+
+    def get_script_runner(self):
+        """
+        Fork server if python_path is this python; otherwise start python_path for each script
+        """
+        if self.script_runner is None:
+            self.script_runner = script_runner.get_script_runner(self.python_path, self.b_fork_server)
+
+        return self.script_runner
+
+    def run_script_runner(self, argv, input_txt, cwd=None):
+        run_kwargs = {
+            'in_txt': input_txt,
+            'cwd': cwd,
+            'timeout_sec': self.timeout_sec,
+            'max_output_bytes': self.max_output_bytes,
+            'limit_dict': self.limit_dict,
+        }
+
+        try:
+            result = self.get_script_runner().run(argv, **run_kwargs)
+        except (ConnectionError, OSError) as e:
+            # fork server not available any more
+            print(f'{self.get_class_name()}.run_script_runner() : {type(e).__name__}: {e}; starting {self.python_path} instead')
+            self.script_runner.close()
+            self.script_runner = script_runner.SubprocessRunner(self.python_path)
+            result = self.script_runner.run(argv, **run_kwargs)
+
+        return result
 
 
 class RepoEvalRunEachSkipSome(RepoEvalRunEach):
@@ -915,47 +1863,42 @@ class RepoEvalRunEachSkipSome(RepoEvalRunEach):
         if not self.is_python(filename):
             result = 'N/A'
         else:
-            # some files may have unreadable character
-            txt = self.is_readable(filename)
+            # read, decode, and tokenize only once
+            file_facts = FileFacts(filename, self.get_class_name())
+            txt = file_facts.txt
 
             if not txt:
                 result = {'readable': False}
             else:
                 # if it was readable, first check grammar
-                result = self.check_grammar(filename)
+                # skipped files keep this result
+                result = self.check_grammar(filename, file_facts.source)
 
                 if result['grammar pass']:
 
                     if self.is_pylab(txt):
                         # to save time and click
-                        result = self.check_grammar(filename)
                         result['type'] = 'pylab'
                     elif self.is_while_true(txt):
                         # to save time
-                        result = self.check_grammar(filename)
                         result['type'] = 'while true'
-                    elif self.has_while(filename):
+                    elif file_facts.has_token('while'):
                         # to save time
-                        result = self.check_grammar(filename)
                         result['type'] = 'while'
                     elif self.is_tkinter(txt):
-                        result = self.check_grammar(filename)
                         result['type'] = 'tkinter'
                     elif self.has_exit_on_click(txt):
                         # to save time and click
-                        result = self.check_grammar(filename)
                         result['type'] = 'exit on click'
                     elif self.has_hanoi(txt):
                         # to save time
-                        result = self.check_grammar(filename)
                         result['type'] = 'hanoi'
                     elif self.is_recursion_filename(filename):
                         # to save time
-                        result = self.check_grammar(filename)
                         result['type'] = 'recursion filename'
                     elif is_argv(txt):
                         # adaptive number of arguments
-                        argn = get_argn(filename)
+                        argn = file_facts.get_argn()
 
                         # generate adaptive arguments
                         arguments_txt = ''
@@ -966,7 +1909,7 @@ class RepoEvalRunEachSkipSome(RepoEvalRunEach):
                                 c=chr(ord('a') + i))
 
                         # handle one special case
-                        if filename.startswith('ex15'):
+                        if os.path.basename(filename).startswith('ex15'):
                             default_filename = 'ex15_sample.txt'
                         else:
                             default_filename = 'test.txt'
@@ -982,14 +1925,14 @@ class RepoEvalRunEachSkipSome(RepoEvalRunEach):
                                 argn=argn,
                             ))
 
-                        result = self.run_script(filename, arguments_txt)
+                        result = self.run_script(filename, arguments_txt, file_facts)
                         result.update({'type': 'argv'})
 
                     else:
-                        result = self.run_script(filename)
+                        result = self.run_script(filename, file_facts=file_facts)
 
             # explicitly delete temporary variable to save memory
-            del txt
+            del txt, file_facts
 
         return result
 
@@ -997,32 +1940,6 @@ class RepoEvalRunEachSkipSome(RepoEvalRunEach):
     def is_pylab(txt):
         return ('pylab' in txt) or ('matplotlib' in txt)
 
-    def has_token(self, filename, token):
-        result = False
-        with open(filename, encoding='utf-8') as f:
-            try:
-                # https://docs.python.org/3/library/tokenize.html#tokenize.tokenize
-                for toktype, tok, start, end, line in tokenize.generate_tokens(f.readline):
-                    if (tokenize.COMMENT != toktype) and (token in tok):
-                        result = toktype, tok, start, end, line
-                        break
-            except tokenize.TokenError:
-                print('*** tokenize.TokenError ***')
-                if filename is not None:
-                    print('cwd=', os.getcwd())
-                    print('filename =', filename)
-            except IndentationError:
-                print('{type} : {filename} : IndentationError'.format(
-                    type=type(self).__name__, filename=filename))
-
-        return result
-
-    def is_input(self, filename):
-        return self.has_token(filename, 'input')
-
-    def has_while(self, filename):
-        return self.has_token(filename, 'while')
-
     @staticmethod
     def is_while_true(txt):
         return ('while True' in txt) or ('while (True)' in txt)
@@ -1047,10 +1964,21 @@ class RepoEvalRunEachSkipSome(RepoEvalRunEach):
         See if a filename starts with recursion
         """
         # TODO : detect recursion
-        return filename.startswith('recursion')
+        return os.path.basename(filename).startswith('recursion')
 
 
 class RepoEvalRunEachSkipSomeLastCommit(RepoEvalRunEachSkipSome):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # {path in repository: last commit sha} of the current repository
+        self.last_sha_dict = None
+
+    def start_repo(self, repo, snapshot=None):
+        super().start_repo(repo, snapshot)
+        # one git log for all files of the repository
+        self.last_sha_dict = git.get_last_sha_dict(
+            repo_path=self.repo_path, revision=(self.get_log_revision_list() or ['HEAD'])[0])
+
     def eval_file_base(self, filename, b_verbose=False):
         """
         Evaluate file and attach last commit info
@@ -1061,7 +1989,22 @@ class RepoEvalRunEachSkipSomeLastCommit(RepoEvalRunEachSkipSome):
         #        Rename RepoEval to RepoEvalBase and add this to RepoEval?
 
         if isinstance(result, dict):
-            result['sha'] = git.get_last_sha(path=filename)
+            result['sha'] = self.get_last_sha(filename)
+
+        return result
+
+    def get_memo_key(self, filename):
+        # the last commit may change without changing the folder
+        key = super().get_memo_key(filename)
+        return None if key is None else (key + (self.get_last_sha(filename), ))
+
+    def get_last_sha(self, filename):
+        if self.last_sha_dict is None:
+            # outside eval_repo()
+            folder, name = os.path.split(os.path.abspath(filename))
+            result = git.get_last_sha(path=name, repo_path=folder)
+        else:
+            result = self.last_sha_dict.get(self.get_path_in_repo(filename), 'N/A')
 
         return result
 
@@ -1096,50 +2039,116 @@ def is_sys_argv(txt):
     return is_sys_argv
 
 
-def get_argn(filename):
-    # find maximum number of arguments
-    # initial value
-    result = 0
+def compile_in_process(filename, source=None):
+    """
+    `python -m py_compile` of this python without starting one
+    Only for this python; compile() follows the grammar of the running interpreter
+    A SyntaxWarning would have appeared in the output of py_compile
+    source : bytes of the file if already read; bytes keep the encoding rules of py_compile
+    """
+    if source is None:
+        try:
+            with open(filename, 'rb') as f:
+                source = f.read()
+        except OSError:
+            print('compile_in_process() : unable to read file =', os.path.abspath(filename))
+            return {'grammar pass': False}
 
-    token_list = []
+    with warnings.catch_warnings(record=True) as warning_list:
+        warnings.simplefilter('always', SyntaxWarning)
 
-    last_new_line = 0
-    equals_of_this_line = []
-    # initial -> equal ->
+        try:
+            compile(source, filename, 'exec', dont_inherit=True)
+            b_pass = True
+        except (SyntaxError, ValueError, UnicodeDecodeError, RecursionError):
+            # ValueError : null bytes, RecursionError : too deeply nested
+            b_pass = False
+
+    b_pass = b_pass and not any(issubclass(w.category, SyntaxWarning) for w in warning_list)
+
+    return {'grammar pass': b_pass}
+
+
+class FileFacts(object):
+    """
+    What the skip rules and the argument guessing need from one .py file
+    The file is read, decoded, and tokenized only once
+    """
+
+    def __init__(self, filename, class_name='FileFacts'):
+        self.filename = filename
+
+        # bytes for the grammar check
+        with open(filename, 'rb') as f:
+            self.source = f.read()
+
+        try:
+            # utf-8 or cp949
+            self.txt = iter_repo.b_decode(self.source)
+        except UnicodeDecodeError:
+            print('%s : unable to read %s' % (class_name, os.path.abspath(filename)))
+            self.txt = ''
+
+        # tokens until the end or until an error
+        self.token_list = []
+        self.b_token_error = False
+
+        if self.txt:
+            self.tokenize()
+
+    def tokenize(self):
+        # universal new lines as open() in text mode
+        readline = io.StringIO(self.txt, newline=None).readline
 
-    with open(filename, 'r', encoding='utf-8') as f:
         try:
-            # token loop
             # https://docs.python.org/3/library/tokenize.html#tokenize.tokenize
+            for token_info in tokenize.generate_tokens(readline):
+                self.token_list.append(token_info)
+        except tokenize.TokenError:
+            print('*** tokenize.TokenError ***')
+            print('cwd=', os.getcwd())
+            print('filename =', self.filename)
+            self.b_token_error = True
+        except IndentationError:
+            print('{filename} : IndentationError'.format(filename=self.filename))
+            self.b_token_error = True
 
-            token_list = list(tokenize.generate_tokens(f.readline))
+    def has_token(self, token):
+        """
+        First token including the string except comments or False
+        """
+        result = False
 
-            # https://docs.python.org/3.6/library/tokenize.html#examples
-            for k, toktype__tok__start__end__line in enumerate(token_list):
-                toktype, tok, start, end, line = toktype__tok__start__end__line
+        for toktype, tok, start, end, line in self.token_list:
+            if (tokenize.COMMENT != toktype) and (token in tok):
+                result = toktype, tok, start, end, line
+                break
 
-                if (toktype == tokenize.NEWLINE):
-                    last_new_line = k
-                    equals_of_this_line = []
+        return result
+
+    def get_argn(self):
+        # same as get_argn() : no argument if not tokenized to the end
+        result = 0
 
-                elif (toktype == tokenize.OP) and ('=' == tok):
-                    equals_of_this_line.append(k)
+        if not self.b_token_error:
+            result = get_argn_from_token_list(self.token_list)
+
+        return result
 
-                elif (toktype == tokenize.NAME) and ('argv' == tok):
 
-                    if 1 == len(equals_of_this_line):
-                        left_list = token_list[(
-                            last_new_line + 1):equals_of_this_line[-1]]
+def get_argn(filename):
+    # find maximum number of arguments
+    # initial value
+    result = 0
+
+    with open(filename, 'r', encoding='utf-8') as f:
+        try:
+            # token loop
+            # https://docs.python.org/3/library/tokenize.html#tokenize.tokenize
+
+            token_list = list(tokenize.generate_tokens(f.readline))
 
-                        # count the number of names
-                        result = 0
-                        for item in left_list:
-                            if (tokenize.NAME == item[0]):
-                                result += 1
-                        break
-                    # if two or more '='s
-                    elif 2 <= len(equals_of_this_line):
-                        raise NotImplementedError
+            result = get_argn_from_token_list(token_list)
 
         except tokenize.TokenError:
             print('*** tokenize.TokenError ***')
@@ -1153,6 +2162,44 @@ def get_argn(filename):
     return result
 
 
+def get_argn_from_token_list(token_list):
+    # number of names left to `= argv` or `= sys.argv`
+    result = 0
+
+    last_new_line = 0
+    equals_of_this_line = []
+    # initial -> equal ->
+
+    # https://docs.python.org/3.6/library/tokenize.html#examples
+    for k, toktype__tok__start__end__line in enumerate(token_list):
+        toktype, tok, start, end, line = toktype__tok__start__end__line
+
+        if (toktype == tokenize.NEWLINE):
+            last_new_line = k
+            equals_of_this_line = []
+
+        elif (toktype == tokenize.OP) and ('=' == tok):
+            equals_of_this_line.append(k)
+
+        elif (toktype == tokenize.NAME) and ('argv' == tok):
+
+            if 1 == len(equals_of_this_line):
+                left_list = token_list[(
+                    last_new_line + 1):equals_of_this_line[-1]]
+
+                # count the number of names
+                result = 0
+                for item in left_list:
+                    if (tokenize.NAME == item[0]):
+                        result += 1
+                break
+            # if two or more '='s
+            elif 2 <= len(equals_of_this_line):
+                raise NotImplementedError
+
+    return result
+
+
 def get_date_string_tuple_from_git_log_msg(msg):
     """
     identify date within each commit record from 'git log'
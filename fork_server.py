@@ -0,0 +1,236 @@
+"""
+Fork server of script_runner.ForkServerRunner
+
+A warm python with common modules imported forks a child for each script
+Uses only the standard library not to leave modules of this repository to the scripts
+
+usage : python fork_server.py <file descriptor of a unix socket>
+
+Request : one json message {'argv': [script, arg, ...], 'cwd': folder, 'limits': {name: value}}
+    with stdin, stdout, and stderr descriptors
+Replies : '<pid>\n' when the child started, '<return code> <cpu seconds>\n' when finished
+"""
+
+import sys
+
+# modules of a fresh `python <script>`; the rest imported by this server
+startup_module_set = frozenset(sys.modules)
+
+import atexit
+import io
+import json
+import os
+import random
+import runpy
+import signal
+import socket
+import traceback
+
+try:
+    import resource
+except ImportError:
+    # not on windows
+    resource = None
+
+
+# modules student scripts frequently import
+preload_module_list = [
+    'collections', 'copy', 'datetime', 'decimal', 'fractions', 'functools', 'itertools',
+    'json', 'math', 'pickle', 're', 'statistics', 'string', 'time',
+]
+
+
+def main(argv):
+    for module_name in preload_module_list:
+        try:
+            __import__(module_name)
+        except ImportError:
+            pass
+
+    serve(socket.socket(fileno=int(argv[0])))
+
+
+def serve(sock):
+    while True:
+        try:
+            message, fd_list, _, _ = socket.recv_fds(sock, 65536, 3)
+        except (ConnectionError, OSError):
+            break
+
+        # the runner closed the socket
+        if not message:
+            break
+
+        request = json.loads(message.decode('utf-8'))
+
+        pid = os.fork()
+
+        if 0 == pid:
+            sock.close()
+            run_child(request, fd_list)
+
+        for fd in fd_list:
+            os.close(fd)
+
+        sock.sendall(f'{pid}\n'.encode())
+
+        # resource usage of the script to tell why it was killed
+        _, status, rusage = os.wait4(pid, 0)
+
+        sock.sendall(f'{os.waitstatus_to_exitcode(status)} {rusage.ru_utime + rusage.ru_stime!r}\n'.encode())
+
+    sock.close()
+
+
+def run_child(request, fd_list):
+    """
+    Run the script as `python <script> <arg> ...` would; never returns
+    """
+    # a timeout of the runner can end the script and its child processes together
+    os.setsid()
+
+    set_rlimits(request.get('limits', None))
+
+    for std_fd, fd in enumerate(fd_list):
+        os.dup2(fd, std_fd)
+        os.close(fd)
+
+    # after dup2()
+    sys.stdin = io.TextIOWrapper(io.open(0, 'rb', closefd=False), encoding='utf-8')
+    sys.stdout = io.TextIOWrapper(io.open(1, 'wb', closefd=False), encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(io.open(2, 'wb', closefd=False), encoding='utf-8',
+                                  errors='backslashreplace', line_buffering=True)
+
+    # not to share random numbers of the server
+    random.seed()
+
+    return_code = 0
+
+    try:
+        os.chdir(request['cwd'])
+
+        script = request['argv'][0]
+        sys.argv = list(request['argv'])
+        # folder of the script first as `python <script>`
+        sys.path[0] = os.path.dirname(os.path.abspath(script))
+        # such as math.py of the script
+        drop_shadowed_modules(sys.path[0])
+
+        # absolute __file__ as python 3.9 or later
+        runpy.run_path(os.path.abspath(script), run_name='__main__')
+    except SystemExit as e:
+        return_code = get_exit_code(e)
+    except BaseException as e:
+        print_script_exception(e)
+        return_code = 1
+
+    try:
+        atexit._run_exitfuncs()
+        sys.stdout.flush()
+        sys.stderr.flush()
+    except BaseException:
+        pass
+
+    os._exit(return_code)
+
+
+def drop_shadowed_modules(folder):
+    """
+    Forget modules imported after the start that a module in the folder would shadow
+    `python <script>` would import the one in the folder of the script instead
+    """
+    try:
+        entry_list = os.listdir(folder)
+    except OSError:
+        entry_list = []
+
+    name_set = set()
+
+    for entry in entry_list:
+        name, ext = os.path.splitext(entry)
+
+        if '.py' == ext:
+            name_set.add(name)
+        elif os.path.isfile(os.path.join(folder, entry, '__init__.py')):
+            # a folder without __init__.py does not shadow a module
+            name_set.add(entry)
+
+    for module_name in list(sys.modules):
+        if (module_name not in startup_module_set) and (module_name.split('.')[0] in name_set):
+            del sys.modules[module_name]
+
+
+# limit name : resource name
+rlimit_name_dict = {
+    'cpu_sec': 'RLIMIT_CPU',
+    'memory_bytes': 'RLIMIT_AS',
+    'open_files': 'RLIMIT_NOFILE',
+    'file_bytes': 'RLIMIT_FSIZE',
+}
+
+
+def set_rlimits(limit_dict):
+    """
+    Resource limits of this process and its child processes
+    Call in the process of the script before it starts
+
+    :param dict limit_dict: {'cpu_sec': 60, 'memory_bytes': 2 ** 30, 'open_files': 256, 'file_bytes': 2 ** 24}
+        None or missing means no limit
+    """
+    if limit_dict and (resource is not None):
+        for name, value in limit_dict.items():
+            if value is None:
+                continue
+
+            limit = getattr(resource, rlimit_name_dict[name])
+            _, hard = resource.getrlimit(limit)
+
+            soft = int(value)
+
+            if 'cpu_sec' == name:
+                # SIGXCPU at the soft limit; SIGKILL a second later if ignored
+                new_hard = soft + 1
+            else:
+                new_hard = soft
+
+            if resource.RLIM_INFINITY != hard:
+                soft, new_hard = min(soft, hard), min(new_hard, hard)
+
+            resource.setrlimit(limit, (soft, new_hard))
+
+        # python ignores SIGXFSZ; writes over the limit fail with OSError instead
+        if limit_dict.get('file_bytes', None) is not None:
+            signal.signal(signal.SIGXFSZ, signal.SIG_IGN)
+
+
+def print_script_exception(e):
+    """
+    Traceback from the frame of the script as the interpreter would
+    """
+    runner_file_set = {os.path.abspath(__file__), runpy.__file__, '<frozen runpy>'}
+
+    tb = e.__traceback__
+
+    while (tb is not None) and (tb.tb_frame.f_code.co_filename in runner_file_set):
+        tb = tb.tb_next
+
+    traceback.print_exception(type(e), e, tb)
+
+
+def get_exit_code(e):
+    """
+    Exit code of SystemExit as the interpreter would
+    """
+    if e.code is None:
+        result = 0
+    elif isinstance(e.code, int):
+        result = e.code
+    else:
+        print(e.code, file=sys.stderr)
+        result = 1
+
+    return result
+
+
+if "__main__" == __name__:
+    main(sys.argv[1:])
@@ -1,7 +1,17 @@
+import asyncio
+import atexit
+import collections
+import hashlib
+import io
 import os
+import posixpath
 import shutil
+import signal
+import struct
 import subprocess
 import sys
+import threading
+import time
 import urllib.parse as up
 
 
@@ -75,14 +85,51 @@ git_exe_path = which_git()
 # end set git path
 
 
-def run_command(cmd, b_verbose=True, in_txt=None, b_show_cmd=False):
+class CommandResult(tuple):
+    """
+    (stdout, stderr) of a command with how it ended
+
+    Unpacks like the (msgo, msge) pair run_command() has always returned
+    returncode : exit code; negative signal number if killed on POSIX
+    b_timeout : killed after the time limit
+    b_truncated : stdout or stderr longer than the byte limit
+    cpu_sec : user + system cpu time of the command; None if unknown
+    """
+
+    def __new__(cls, stdout, stderr, returncode=None, b_timeout=False, b_truncated=False, cpu_sec=None):
+        self = super(CommandResult, cls).__new__(cls, (stdout, stderr))
+        self.returncode = returncode
+        self.b_timeout = b_timeout
+        self.b_truncated = b_truncated
+        self.cpu_sec = cpu_sec
+        return self
+
+    def __getnewargs__(self):
+        # for pickle between processes
+        return tuple(self) + (self.returncode, self.b_timeout, self.b_truncated, self.cpu_sec)
+
+    @property
+    def stdout(self):
+        return self[0]
+
+    @property
+    def stderr(self):
+        return self[1]
+
+
+def run_command(cmd, b_verbose=True, in_txt=None, b_show_cmd=False,
+                timeout_sec=None, max_output_bytes=None, cwd=None, preexec_fn=None):
     """
     execute git command & print
 
     :param str cmd: git command
     :param bool b_verbose:
-    :param bytes in_txt: standard input (None by default)
-    :return: messages through stdout and stderr
+    :param str in_txt: standard input (None by default)
+    :param float timeout_sec: kill the command and its child processes after this (None : wait forever)
+    :param int max_output_bytes: keep at most this many bytes of stdout and of stderr (None : all)
+    :param str cwd: folder to run the command (current folder by default)
+    :param preexec_fn: called in the child process before the command such as setting resource limits (not on windows)
+    :return: CommandResult, messages through stdout and stderr
 
     >>> run_command("git status") # == git status
     """
@@ -90,9 +137,6 @@ def run_command(cmd, b_verbose=True, in_txt=None, b_show_cmd=False):
     # https://docs.python.org/3/library/subprocess.html#replacing-os-popen-os-popen2-os-popen3
     # On windows FileNotFoundError may occur: https://stackoverflow.com/questions/25794941/python-subprocess-not-working-on-windows-7
 
-    # TODO : Consider adding timeout feature
-    # https://docs.python.org/3/library/subprocess.html#using-the-subprocess-module
-
     if b_show_cmd:
         print(f'run_command({repr(cmd)})')
 
@@ -105,17 +149,220 @@ def run_command(cmd, b_verbose=True, in_txt=None, b_show_cmd=False):
         for cmd_element in cmd:
             assert isinstance(cmd_element, str), cmd
 
-    p = subprocess.Popen(
-        cmd,
+    if (timeout_sec is None) and (max_output_bytes is None):
+        p = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            encoding='utf-8',
+            env=env,
+            cwd=cwd,
+            preexec_fn=preexec_fn,
+        )
+
+        # https://stackoverflow.com/questions/163542/python-how-do-i-pass-a-string-into-subprocess-popen-using-the-stdin-argument
+        msgo, msge = p.communicate(input=in_txt)
+        result = CommandResult(msgo, msge, p.returncode)
+    else:
+        p = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=env,
+            cwd=cwd,
+            preexec_fn=preexec_fn,
+            **get_process_group_kwargs()
+        )
+
+        if in_txt is not None:
+            in_txt = in_txt.encode('utf-8')
+
+        result = communicate_bounded(p, in_txt, timeout_sec, max_output_bytes)
+
+    if b_verbose:
+        if result.stdout:
+            print(result.stdout)
+        if result.stderr:
+            print(result.stderr)
+
+    # to save memory
+    del p
+
+    return result
+
+
+def get_process_group_kwargs():
+    """
+    Popen() arguments to start a new process group
+    so that a timeout can end the child processes of the command too
+    """
+    if 'nt' == os.name:
+        result = {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+    else:
+        result = {'start_new_session': True}
+
+    return result
+
+
+def kill_process_group(p):
+    """
+    Kill a process started with get_process_group_kwargs() and its children
+    """
+    if 'nt' == os.name:
+        subprocess.run(('taskkill', '/F', '/T', '/PID', str(p.pid)),
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    else:
+        try:
+            os.killpg(p.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            # already finished
+            pass
+
+
+def read_pipe_bounded(pipe, max_bytes, chunk_list, b_truncated_list):
+    """
+    Read a pipe until EOF keeping at most max_bytes
+    Reading continues after the limit so that the writer does not block
+    """
+    n_bytes = 0
+
+    for chunk in iter(lambda: pipe.read1(65536), b''):
+        if (max_bytes is not None) and (max_bytes < (n_bytes + len(chunk))):
+            chunk = chunk[:(max_bytes - n_bytes)]
+            b_truncated_list.append(True)
+
+        if chunk:
+            chunk_list.append(chunk)
+            n_bytes += len(chunk)
+
+    pipe.close()
+
+
+def write_pipe(pipe, data):
+    try:
+        if data:
+            pipe.write(data)
+        pipe.close()
+    except (BrokenPipeError, OSError):
+        # the command did not read all of its input
+        pass
+
+
+def decode_output(data, b_truncated=False):
+    """
+    bytes -> str as text mode Popen() would, with universal new lines
+    A byte limit may cut a multi-byte character
+    """
+    txt = data.decode('utf-8', errors=('replace' if b_truncated else 'strict'))
+    return txt.replace('\r\n', '\n').replace('\r', '\n')
+
+
+# seconds to wait for the pipes after the process ended
+pipe_grace_sec = 2.0
+
+
+def join_pipe_threads(thread_list, timeout_sec):
+    """
+    Join threads of the pipes within timeout_sec in total
+    """
+    deadline = time.time() + timeout_sec
+
+    for thread in thread_list:
+        thread.join(max(0.0, deadline - time.time()))
+
+
+def communicate_bounded(p, in_bytes=None, timeout_sec=None, max_output_bytes=None):
+    """
+    Popen.communicate() with a wall clock time limit and byte limits on the outputs
+
+    :param subprocess.Popen p: started with stdin, stdout, and stderr pipes in binary mode
+    :param bytes in_bytes: standard input
+    :param float timeout_sec: kill the process group after this
+    :param int max_output_bytes: keep at most this many bytes of stdout and of stderr
+    :return: CommandResult
+    """
+    stdout_list, stderr_list, b_truncated_list = [], [], []
+
+    thread_list = [
+        threading.Thread(target=read_pipe_bounded, args=(
+            p.stdout, max_output_bytes, stdout_list, b_truncated_list)),
+        threading.Thread(target=read_pipe_bounded, args=(
+            p.stderr, max_output_bytes, stderr_list, b_truncated_list)),
+        threading.Thread(target=write_pipe, args=(p.stdin, in_bytes)),
+    ]
+
+    for thread in thread_list:
+        thread.daemon = True
+        thread.start()
+
+    try:
+        p.wait(timeout=timeout_sec)
+        b_timeout = False
+    except subprocess.TimeoutExpired:
+        kill_process_group(p)
+        p.wait()
+        b_timeout = True
+
+    # the process ended; the rest of its output should follow soon
+    join_pipe_threads(thread_list, pipe_grace_sec)
+
+    if any(thread.is_alive() for thread in thread_list):
+        # a child process of the command still holds the pipes
+        kill_process_group(p)
+        # each thread closes its pipe at the end
+        # a process out of the group may still hold one; its daemon thread is left behind
+        join_pipe_threads(thread_list, pipe_grace_sec)
+
+    b_truncated = bool(b_truncated_list)
+
+    return CommandResult(
+        decode_output(b''.join(stdout_list), b_truncated),
+        decode_output(b''.join(stderr_list), b_truncated),
+        p.returncode, b_timeout, b_truncated,
+    )
+
+
+async def run_command_async(cmd, b_verbose=True, in_txt=None, b_show_cmd=False, cwd=None):
+    """
+    asyncio version of run_command()
+    await the command without blocking other coroutines
+
+    :param list cmd: command and arguments
+    :param bool b_verbose:
+    :param str in_txt: standard input (None by default)
+    :param str cwd: folder to run the command (current folder by default)
+    :return: messages through stdout and stderr
+
+    >>> asyncio.run(run_command_async((git_exe_path, "status")))
+    """
+
+    if b_show_cmd:
+        print(f'run_command_async({repr(cmd)})')
+
+    env = os.environ.copy()
+    env['PYTHONIOENCODING'] = 'utf-8'
+
+    assert isinstance(cmd, (tuple, list)), type(cmd)
+    for cmd_element in cmd:
+        assert isinstance(cmd_element, str), cmd
+
+    p = await asyncio.create_subprocess_exec(
+        *cmd,
         stdin=subprocess.PIPE,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
-        encoding='utf-8',
         env=env,
+        cwd=cwd,
     )
 
-    # https://stackoverflow.com/questions/163542/python-how-do-i-pass-a-string-into-subprocess-popen-using-the-stdin-argument
-    msgo, msge = p.communicate(input=in_txt)
+    if in_txt is not None:
+        in_txt = in_txt.encode('utf-8')
+
+    stdout, stderr = await p.communicate(input=in_txt)
+
+    msgo, msge = stdout.decode('utf-8'), stderr.decode('utf-8')
 
     if b_verbose:
         if msgo:
@@ -123,12 +370,43 @@ def run_command(cmd, b_verbose=True, in_txt=None, b_show_cmd=False):
         if msge:
             print(msge)
 
-    # to save memory
     del p
 
     return msgo, msge
 
 
+async def git_async(git_cmd_list, b_verbose=False, cwd=None, semaphore=None):
+    """
+    asyncio version of git_common_list()
+
+    :param list git_cmd_list: git command without git itself
+    :param bool b_verbose:
+    :param str cwd: repository folder (current folder by default)
+    :param asyncio.Semaphore semaphore: limits number of concurrent git processes
+    :return: messages through stdout and stderr
+
+    >>> asyncio.run(git_async(["status"]))
+    """
+
+    cmd_list = [git_exe_path] + list(git_cmd_list)
+
+    if semaphore is None:
+        result = await run_command_async(cmd_list, b_verbose=b_verbose, cwd=cwd)
+    else:
+        async with semaphore:
+            result = await run_command_async(cmd_list, b_verbose=b_verbose, cwd=cwd)
+
+    return result
+
+
+def get_async_semaphore(max_concurrency=64):
+    """
+    Concurrency limit of git_async() calls
+    Network bound so independent from the number of CPU cores
+    """
+    return asyncio.Semaphore(max_concurrency)
+
+
 def git_common(cmd, b_verbose=True):
     """
     execute git command & print
@@ -269,7 +547,7 @@ def log_last_commit():
     return result
 
 
-def get_last_sha(b_full=False, path='', branch=''):
+def get_last_sha(b_full=False, path='', branch='', repo_path=None):
     # sometimes full SHA is necessary
     if b_full:
         format_string = '%H'
@@ -289,7 +567,8 @@ def get_last_sha(b_full=False, path='', branch=''):
     # get the last sha from git log of the latest commit
     msgo, msge = run_command(
         tuple(command_list),
-        b_verbose=False
+        b_verbose=False,
+        cwd=repo_path,
     )
 
     # output error check
@@ -302,6 +581,105 @@ def get_last_sha(b_full=False, path='', branch=''):
     return result
 
 
+def get_last_sha_dict(b_full=False, repo_path=None, revision='HEAD'):
+    """
+    {path in the revision: sha of the last commit changing the path} from one `git log`
+    Same sha as get_last_sha(path=<path>) without one `git log` for each path
+
+    As `git log -- <path>` simplifies history, a merge having the same file as one of its parents
+    continues to the first of such parents only; side branches of an "ours" merge do not count
+
+    :param bool b_full: full sha if True
+    :param str repo_path: repository folder (current folder by default)
+    :param str revision: commit to start the log from
+    """
+    last_sha_dict = {}
+
+    # no commit yet : nothing to log
+    commit_sha = get_object_reader(repo_path).resolve(f'{revision}^{{commit}}')
+    if commit_sha is None:
+        return last_sha_dict
+
+    # {commit sha: paths whose history continues at the commit}
+    pending_dict = {commit_sha: {
+        token.decode('utf-8', errors='surrogateescape')
+        for token in iter_git_tokens(['ls-tree', '-r', '-z', '--name-only', '--full-tree', commit_sha, '--'], cwd=repo_path)
+    }}
+
+    def visit(sha_list, changed_path_set):
+        """
+        Resolve or pass to a parent the paths waiting at the commit
+        :param list sha_list: [full sha, short sha, parent full sha, ...]
+        """
+        path_set = pending_dict.pop(sha_list[0], set())
+        parent_list = sha_list[2:]
+        result_sha = sha_list[0] if b_full else sha_list[1]
+
+        if not path_set:
+            pass
+        elif not parent_list:
+            # root commit added all of them
+            changed_path_set = path_set
+        elif 1 == len(parent_list):
+            pending_dict.setdefault(parent_list[0], set()).update(path_set - changed_path_set)
+        else:
+            # `git log` without -m does not list files of a merge
+            changed_path_set = set(path_set)
+            for parent_sha in parent_list:
+                same_path_set = changed_path_set - get_changed_path_set(parent_sha, sha_list[0], repo_path)
+                pending_dict.setdefault(parent_sha, set()).update(same_path_set)
+                changed_path_set -= same_path_set
+
+        for path in path_set & changed_path_set:
+            last_sha_dict[path] = result_sha
+
+    sha_list = None
+    changed_path_set = set()
+
+    # parents after all of their children
+    token_gen = iter_git_tokens(
+        ['log', '-z', '--topo-order', '--no-renames', '--name-only', '--format=%x01%H %h %P', commit_sha, '--'],
+        cwd=repo_path)
+
+    try:
+        for token in token_gen:
+            if token.startswith(b'\x01'):
+                if sha_list is not None:
+                    visit(sha_list, changed_path_set)
+                    # all paths resolved; older commits do not matter
+                    if not pending_dict:
+                        sha_list = None
+                        break
+
+                sha_list = token[1:].decode().split()
+                changed_path_set = set()
+            else:
+                # the first path of a commit starts after a new line
+                path = token.lstrip(b'\n').decode('utf-8', errors='surrogateescape')
+
+                if path:
+                    changed_path_set.add(path)
+
+        if sha_list is not None:
+            visit(sha_list, changed_path_set)
+    finally:
+        token_gen.close()
+
+    return last_sha_dict
+
+
+def get_changed_path_set(old_revision, new_revision, repo_path=None):
+    """
+    Paths of files different between two commits
+    """
+    return {
+        token.decode('utf-8', errors='surrogateescape')
+        for token in iter_git_tokens(
+            ['diff-tree', '-r', '-z', '--no-renames', '--name-only', old_revision, new_revision, '--'], cwd=repo_path)
+        if token
+    }
+
+
 def tag(tag_string, revision=''):
 
     git_cmd = [git_exe_path, 'tag', tag_string]
@@ -314,6 +692,8 @@ def tag(tag_string, revision=''):
         b_verbose=False,
     )
 
+    invalidate_ref_snapshot()
+
     if msgo or msge:
         print('tag({tag}) failed.\nmsgo:\n{msgo}\nmsge:\n{msge}'.format(
             tag=tag_string, msgo=msgo, msge=msge))
@@ -329,6 +709,8 @@ def delete_tag(tag_string):
         b_verbose=False,
     )
 
+    invalidate_ref_snapshot()
+
     return msgo.startswith('Deleted tag') and not msge
 
 
@@ -346,44 +728,288 @@ def get_tags():
 
 def get_refs_tag_deref():
     """
-    Obtain list of (sha, tag) of the current repository
-    SHAs show up on the `git log`
+    Obtain list of (tag, sha) of the current repository
+    sha of an annotated tag is that of its commit
     """
+    return get_ref_snapshot().get_tag_sha_list()
 
-    # Obtain sha's and tags
-    # dereference may include sha's in `git log`
-    git_cmd = [git_exe_path, 'show-ref', '--tags', '--dereference']
 
-    msgo, msge = run_command(
-        git_cmd,
-        b_verbose=False,
-    )
+def for_each_ref(pattern_list=(), repo_path=None):
+    """
+    Snapshot of refs from one `git for-each-ref`
+
+    :param list pattern_list: ex) ['refs/remotes', 'refs/tags'] (all refs if empty)
+    :param str repo_path: repository folder (current folder by default)
+    :return: list of (refname, sha, commit sha, short sha)
+        commit sha : sha of the commit if an annotated tag, otherwise same as sha
+    """
+    git_cmd = [git_exe_path, 'for-each-ref',
+               '--format=%(objectname) %(*objectname) %(objectname:short) %(refname)']
+    git_cmd += list(pattern_list)
+
+    msgo, msge = run_command(git_cmd, b_verbose=False, cwd=repo_path)
 
     if msge:
         raise SystemError(msge)
 
-    # Obtain SHA's from the log
-    stdout_log, stderr_log = run_command(
-        (git_exe_path, 'log', '--pretty=%H'),
+    result_list = []
+
+    for line in msgo.splitlines():
+        sha, deref_sha, short_sha, refname = line.split(' ', 3)
+        result_list.append((refname, sha, (deref_sha or sha), short_sha))
+
+    return result_list
+
+
+def get_index_folder_dict(repo_path=None):
+    """
+    {folder in repository: [file name, ...]} of the files in the git index
+    Reads the index only; nothing from the work tree
+
+    :param str repo_path: repository folder (current folder by default)
+    """
+    return get_folder_dict(
+        token.decode('utf-8', errors='surrogateescape')
+        for token in iter_git_tokens(['ls-files', '-z'], cwd=repo_path))
+
+
+def get_commit_before(date, revision='HEAD', repo_path=None):
+    """
+    Full sha of the last commit of the revision on or before the date or None if none
+    Follows the first parents : where the branch was at the date
+
+    :param str date: such as '2019-04-01 23:59:59'
+    :param str revision: branch, tag, ...
+    :param str repo_path: repository folder (current folder by default)
+    """
+    msgo, msge = run_command(
+        (git_exe_path, 'rev-list', '-1', '--first-parent', f'--before={date}', revision, '--'),
+        b_verbose=False, cwd=repo_path)
+
+    return msgo.strip() or None
+
+
+def get_folder_dict(path_iter):
+    """
+    {folder: [file name, ...]} of paths in repository such as 'a/b/c.py'
+    Files at the top in the '.' folder
+    """
+    folder_dict = {}
+
+    for path in path_iter:
+        folder, filename = posixpath.split(path)
+        folder_dict.setdefault(folder or os.curdir, []).append(filename)
+
+    return folder_dict
+
+
+def get_tree_blob_sha_dict(revision, repo_path=None):
+    """
+    {path in repository: blob sha} of all files of the tree of a commit
+    Reads git objects only; nothing from the index or the work tree
+    Symbolic links and submodules are not included
+
+    :param str revision: commit sha, branch, tag, ...
+    :param str repo_path: repository folder (current folder by default)
+    """
+    blob_sha_dict = {}
+
+    for token in iter_git_tokens(['ls-tree', '-r', '-z', '--full-tree', revision, '--'], cwd=repo_path):
+        # <mode> SP <type> SP <sha> TAB <path>
+        info, path = token.decode('utf-8', errors='surrogateescape').split('\t', 1)
+        mode, object_type, sha = info.split(' ')
+
+        if ('blob' == object_type) and ('120000' != mode):
+            blob_sha_dict[path] = sha
+
+    return blob_sha_dict
+
+
+def write_blobs(blob_sha_dict, folder, repo_path=None):
+    """
+    Write blobs from the object store of the repository as files under the folder
+    One `git cat-file --batch` session for all blobs
+
+    :param dict blob_sha_dict: {path in repository: blob sha}
+    :param str folder: where to write; not the work tree of the repository
+    :param str repo_path: repository folder (current folder by default)
+    """
+    reader = get_object_reader(repo_path)
+
+    for path, sha in blob_sha_dict.items():
+        file_path = os.path.join(folder, *path.split('/'))
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+        data = reader.read_blob(sha)
+
+        if data is None:
+            raise FileNotFoundError(f'write_blobs() : blob {sha} of {path} missing in {repo_path}')
+
+        with open(file_path, 'wb') as f:
+            f.write(data)
+
+
+def get_tip_list(repo_path=None):
+    """
+    Sorted commit sha list of all refs and HEAD
+    Where `git log --all` would start
+
+    :param str repo_path: repository folder (current folder by default)
+    """
+    tip_set = set(commit_sha for _, _, commit_sha, _ in for_each_ref(repo_path=repo_path))
+
+    msgo, msge = run_command(
+        (git_exe_path, 'rev-parse', '--verify', '-q', 'HEAD'), b_verbose=False, cwd=repo_path)
+
+    # no HEAD commit in an empty repository
+    if msgo.strip():
+        tip_set.add(msgo.strip())
+
+    return sorted(tip_set)
+
+
+def get_clean_blob_sha_dict(repo_path=None):
+    """
+    {path in repository: blob sha} of files same as in the index
+    Modified, deleted, and unmerged files are not included
+
+    :param str repo_path: repository folder (current folder by default)
+    """
+    blob_sha_dict = {}
+
+    for token in iter_git_tokens(['ls-files', '-s', '-z'], cwd=repo_path):
+        # <mode> SP <sha> SP <stage> TAB <path>
+        info, path = token.decode('utf-8', errors='surrogateescape').split('\t', 1)
+        _, sha, stage = info.split(' ')
+
+        if '0' == stage:
+            blob_sha_dict[path] = sha
+
+    # content in the work tree may differ from the blob
+    for token in iter_git_tokens(['diff-files', '--name-only', '-z'], cwd=repo_path):
+        blob_sha_dict.pop(token.decode('utf-8', errors='surrogateescape'), None)
+
+    return blob_sha_dict
+
+
+def update_ref_stdin(instruction_list, repo_path=None):
+    """
+    Update many refs in one `git update-ref --stdin` transaction
+    Either all of them or none of them would change
+
+    :param list instruction_list: ex) ['create refs/tags/<tag> <sha>', 'delete refs/tags/<tag>']
+    :param str repo_path: repository folder (current folder by default)
+    :return: True if successful
+    """
+    if not instruction_list:
+        return True
+
+    msgo, msge = run_command(
+        (git_exe_path, 'update-ref', '--stdin'),
         b_verbose=False,
+        in_txt=''.join(instruction + '\n' for instruction in instruction_list),
+        cwd=repo_path,
     )
-    if stderr_log:
-        raise SystemError(stderr_log)
 
-    sha_tuple = tuple(stdout_log.splitlines())
+    invalidate_ref_snapshot()
 
-    # collect tags and sha's from the dereference
-    result_list = []
+    if msgo or msge:
+        print('update_ref_stdin() failed.\nmsgo:\n{msgo}\nmsge:\n{msge}'.format(
+            msgo=msgo, msge=msge))
+
+    return not (msgo or msge)
 
-    # line loop
-    for tag_line in msgo.splitlines():
-        sha, ref_tag = tag_line.split()
 
-        if sha in sha_tuple or ref_tag.endswith('^{}'):
-            tag = ref_tag.strip('^{}')[10:]
-            result_list.append((tag, sha))
+def delete_tags(tag_list, repo_path=None):
+    """
+    Delete many tags in one ref transaction instead of one `git tag --delete` each
 
-    return result_list
+    :param list tag_list: tag names without 'refs/tags/'
+    :param str repo_path: repository folder (current folder by default)
+    :return: True if successful
+    """
+    return update_ref_stdin([f'delete refs/tags/{tag}' for tag in tag_list], repo_path=repo_path)
+
+
+class RefSnapshot(object):
+    """
+    All refs of one repository from one `git for-each-ref`
+    Dictionaries instead of scanning `show-ref` and `git log` for every question
+    """
+
+    tag_prefix = 'refs/tags/'
+
+    def __init__(self, repo_path=None):
+        self.repo_path = repo_path
+        # (refname, sha, commit sha, short sha)
+        self.ref_list = for_each_ref(repo_path=repo_path)
+
+        # refname : commit sha
+        self.ref_dict = {}
+        # tag : commit sha
+        self.tag_dict = {}
+        # commit sha : [tag, ...]
+        self.sha_tags_dict = {}
+
+        for refname, _, commit_sha, _ in self.ref_list:
+            self.ref_dict[refname] = commit_sha
+
+            if refname.startswith(self.tag_prefix):
+                tag = refname[len(self.tag_prefix):]
+                self.tag_dict[tag] = commit_sha
+                self.sha_tags_dict.setdefault(commit_sha, []).append(tag)
+
+    def resolve(self, commit):
+        """
+        commit sha of a ref name such as 'origin/master' or 'refs/tags/abc'
+        Otherwise assume commit is already a sha
+        """
+        result = commit
+
+        for candidate in (commit, f'refs/{commit}', f'refs/tags/{commit}',
+                          f'refs/heads/{commit}', f'refs/remotes/{commit}'):
+            if candidate in self.ref_dict:
+                result = self.ref_dict[candidate]
+                break
+
+        return result
+
+    def has_a_tag(self, commit):
+        return self.resolve(commit) in self.sha_tags_dict
+
+    def get_tags(self, commit):
+        return list(self.sha_tags_dict.get(self.resolve(commit), []))
+
+    def get_tag_sha_list(self):
+        """
+        list of (tag, commit sha)
+        """
+        return list(self.tag_dict.items())
+
+
+# repository path : RefSnapshot
+ref_snapshot_dict = {}
+
+
+def get_ref_snapshot(repo_path=None, b_refresh=False):
+    """
+    Cached RefSnapshot of the repository (current folder by default)
+
+    :param bool b_refresh: take a new snapshot even if one is cached
+    """
+    key = os.path.abspath(repo_path or os.getcwd())
+
+    if b_refresh or (key not in ref_snapshot_dict):
+        ref_snapshot_dict[key] = RefSnapshot(key)
+
+    return ref_snapshot_dict[key]
+
+
+def invalidate_ref_snapshot():
+    """
+    Refs changed; take new snapshots next time
+    """
+    ref_snapshot_dict.clear()
 
 
 def status():
@@ -398,7 +1024,11 @@ def status():
 def pull(b_verbose=False):
     git_cmd = (git_exe_path, 'pull')
 
-    return run_command(git_cmd, b_verbose=b_verbose)
+    result = run_command(git_cmd, b_verbose=b_verbose)
+
+    invalidate_ref_snapshot()
+
+    return result
 
 
 def reset_hard_head(b_verbose=False):
@@ -426,21 +1056,173 @@ def ls_remote_tag(remote='origin', b_verbose=False):
     return result_list
 
 
-def has_a_tag(commit=None):
-    if commit is None:
-        commit = get_last_sha(b_full=True)
+def ls_remote_heads(remote='origin', repo_path=None):
+    """
+    Branches of the remote from one `git ls-remote --heads` without fetching any object
 
-    result = False
+    :return: {'refs/heads/<branch>': sha} or None if failed
+    """
+    stdout, stderr = run_command(
+        (git_exe_path, 'ls-remote', '--heads', remote), b_verbose=False, cwd=repo_path)
+
+    result = None
+
+    if not (('fatal' in stderr) or ('error' in stderr)):
+        result = parse_ls_remote(stdout)
+
+    return result
+
+
+def parse_ls_remote(stdout):
+    """
+    {ref: sha} from `git ls-remote` output
+    """
+    result = {}
 
-    # tag__sha loop
-    for _, sha in get_refs_tag_deref():
-        if sha == commit:
-            result = True
-            break
+    for line in stdout.splitlines():
+        if line.strip():
+            sha, ref = line.split()
+            result[ref] = sha
 
     return result
 
 
+def get_remote_tracking_heads(remote='origin', repo_path=None):
+    """
+    Local copy of the remote branches in the same form as ls_remote_heads()
+
+    :return: {'refs/heads/<branch>': sha}
+    """
+    prefix = f'refs/remotes/{remote}/'
+
+    result = {}
+
+    for refname, sha, _, _ in for_each_ref([prefix], repo_path=repo_path):
+        branch = refname[len(prefix):]
+        if 'HEAD' != branch:
+            result['refs/heads/' + branch] = sha
+
+    return result
+
+
+def read_local_head(repo_path):
+    """
+    (branch or None if detached, commit sha) from the files under .git without starting git
+
+    :return: (None, None) if unable to read
+    """
+    git_dir = os.path.join(repo_path, '.git')
+
+    try:
+        with open(os.path.join(git_dir, 'HEAD'), encoding='utf-8') as f:
+            head = f.read().strip()
+
+        if not head.startswith('ref: '):
+            return None, head
+
+        ref = head[len('ref: '):]
+        branch = ref[len('refs/heads/'):] if ref.startswith('refs/heads/') else None
+
+        ref_path = os.path.join(git_dir, *ref.split('/'))
+
+        if os.path.isfile(ref_path):
+            with open(ref_path, encoding='utf-8') as f:
+                return branch, f.read().strip()
+
+        # refs packed by `git gc` or `git pack-refs`
+        with open(os.path.join(git_dir, 'packed-refs'), encoding='utf-8') as f:
+            for line in f:
+                if line.rstrip('\n').endswith(' ' + ref) and not line.startswith(('#', '^')):
+                    return branch, line.split(' ', 1)[0]
+    except OSError:
+        pass
+
+    return None, None
+
+
+def is_index_clean(repo_path):
+    """
+    True if no tracked file in the work tree differs from the index; untracked and ignored files do not count
+    Compares the stat data in .git/index as `git status` would, without starting git
+    Files modified within the same time stamp as the index are compared by content
+
+    False if unable to tell : index version 4, sparse index, or unmerged entries
+    """
+    index_path = os.path.join(repo_path, '.git', 'index')
+
+    try:
+        with open(index_path, 'rb') as f:
+            data = f.read()
+        index_mtime_ns = os.stat(index_path).st_mtime_ns
+    except OSError:
+        return False
+
+    if (b'DIRC' != data[:4]) or (struct.unpack('>L', data[4:8])[0] not in (2, 3)):
+        return False
+
+    offset = 12
+
+    for _ in range(struct.unpack('>L', data[8:12])[0]):
+        # ctime sec, ctime nsec, mtime sec, mtime nsec, dev, ino, mode, uid, gid, size
+        stat_tuple = struct.unpack('>10L', data[offset:offset + 40])
+        sha = data[offset + 40:offset + 60].hex()
+        flags = struct.unpack('>H', data[offset + 60:offset + 62])[0]
+
+        # extended flags of version 3
+        name_start = offset + 62 + (2 if (flags & 0x4000) else 0)
+        name_end = data.index(b'\0', name_start)
+        # 1 to 8 NUL bytes pad the entry to a multiple of 8
+        offset += ((name_end - offset) // 8 + 1) * 8
+
+        mode, size = stat_tuple[6], stat_tuple[9]
+        mtime_ns = stat_tuple[2] * 1000000000 + stat_tuple[3]
+
+        if flags & 0x3000:
+            # merge stage other than 0
+            return False
+        if 0o160000 == mode:
+            # submodule
+            continue
+
+        path = os.path.join(repo_path, os.fsdecode(data[name_start:name_end]))
+
+        try:
+            st = os.lstat(path)
+        except OSError:
+            # deleted
+            return False
+
+        if (st.st_size & 0xFFFFFFFF) != size:
+            return False
+        if (0o100000 == (mode & 0o170000)) and (bool(st.st_mode & 0o100) != bool(mode & 0o100)):
+            # executable bit
+            return False
+
+        # nanoseconds are zero if git did not record them
+        st_mtime_ns = st.st_mtime_ns if stat_tuple[3] else (st.st_mtime_ns // 1000000000 * 1000000000)
+
+        if st_mtime_ns != mtime_ns:
+            return False
+
+        if mtime_ns >= index_mtime_ns:
+            # racy : a change within the same time stamp keeps the stat data
+            if 0o100000 != (mode & 0o170000):
+                return False
+            with open(path, 'rb') as f:
+                content = f.read()
+            if sha != hashlib.sha1(b'blob %d\0' % len(content) + content).hexdigest():
+                return False
+
+    return True
+
+
+def has_a_tag(commit=None):
+    if commit is None:
+        commit = get_last_sha(b_full=True)
+
+    return get_ref_snapshot().has_a_tag(commit)
+
+
 def clean_xdf(b_verbose=False):
     if b_verbose:
         print('clean_xdf(): cwd =', os.getcwd())
@@ -489,9 +1271,35 @@ def clone(repo_url, path="", id=""):
     # for Linux
     msg = run_command(cmd_list)
 
+    invalidate_ref_snapshot()
+
     return msg
 
 
+async def clone_async(repo_url, path="", id="", cwd=None, semaphore=None):
+    """
+    asyncio version of clone()
+
+    :param str repo_url:
+    :param str path:
+    :param str cwd: folder to run git clone
+    :return:
+    """
+    if id:
+        repo_url = set_id_to_url(repo_url, id)
+
+    cmd_list = ['clone', repo_url]
+
+    if path:
+        cmd_list.append(path)
+
+    result = await git_async(cmd_list, b_verbose=True, cwd=cwd, semaphore=semaphore)
+
+    invalidate_ref_snapshot()
+
+    return result
+
+
 def set_id_to_url(url, id):
     """
     add id to or replace in url
@@ -518,6 +1326,115 @@ def set_id_to_url(url, id):
     return new_url
 
 
+def iter_git_stdout(git_cmd_list, cwd=None, in_bytes=None):
+    """
+    stdout of a git command as a binary file while git is running
+    Closing the generator ends git
+    Resume the generator after reading to the end : CalledProcessError if git failed
+
+    :param list git_cmd_list: ex) ['log', '--numstat']
+    :param str cwd: repository folder (current folder by default)
+    :param bytes in_bytes: standard input such as revisions of `git log --stdin` (None by default)
+    :return: generates one binary file object
+    """
+    p = subprocess.Popen(
+        [git_exe_path] + list(git_cmd_list),
+        stdin=(subprocess.DEVNULL if in_bytes is None else subprocess.PIPE),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=cwd,
+    )
+
+    # keep reading stderr not to block git
+    stderr_list, b_truncated_list = [], []
+    thread_list = [threading.Thread(
+        target=read_pipe_bounded, args=(p.stderr, 65536, stderr_list, b_truncated_list))]
+
+    if in_bytes is not None:
+        # git may start writing before reading all of stdin
+        thread_list.append(threading.Thread(target=write_pipe, args=(p.stdin, in_bytes)))
+
+    for thread in thread_list:
+        thread.daemon = True
+        thread.start()
+
+    try:
+        yield p.stdout
+
+        # the caller read to the end
+        p.wait()
+        for thread in thread_list:
+            thread.join()
+
+        # a failed git command would otherwise look like an empty output
+        if p.returncode:
+            raise subprocess.CalledProcessError(
+                p.returncode, [git_exe_path] + list(git_cmd_list), stderr=b''.join(stderr_list))
+    finally:
+        # generator closed before the end
+        if p.poll() is None:
+            p.kill()
+        p.stdout.close()
+        p.wait()
+        for thread in thread_list:
+            thread.join()
+
+
+def iter_git_lines(git_cmd_list, cwd=None, in_bytes=None):
+    """
+    Lines of stdout of a git command as git writes them
+    Memory does not grow with the length of the output
+
+    :param list git_cmd_list: ex) ['log', '--numstat']
+    :param str cwd: repository folder (current folder by default)
+    :param bytes in_bytes: standard input (None by default)
+    :return: generates lines including new line characters
+    """
+    stdout_gen = iter_git_stdout(git_cmd_list, cwd=cwd, in_bytes=in_bytes)
+
+    try:
+        for line in io.TextIOWrapper(next(stdout_gen), encoding='utf-8'):
+            yield line
+
+        # return code of git
+        next(stdout_gen, None)
+    finally:
+        stdout_gen.close()
+
+
+def iter_git_tokens(git_cmd_list, cwd=None, separator=b'\0', in_bytes=None):
+    """
+    bytes between separators of stdout of a git command such as `git log -z`
+    Memory does not grow with the length of the output
+
+    :param list git_cmd_list: ex) ['log', '-z', '--numstat']
+    :param str cwd: repository folder (current folder by default)
+    :param bytes separator: NUL by default
+    :param bytes in_bytes: standard input (None by default)
+    :return: generates bytes without separators
+    """
+    stdout_gen = iter_git_stdout(git_cmd_list, cwd=cwd, in_bytes=in_bytes)
+
+    try:
+        stdout = next(stdout_gen)
+        remainder = b''
+
+        for chunk in iter(lambda: stdout.read1(65536), b''):
+            token_list = (remainder + chunk).split(separator)
+            # the last one may continue in the next chunk
+            remainder = token_list.pop()
+
+            yield from token_list
+
+        if remainder:
+            yield remainder
+
+        # return code of git
+        next(stdout_gen, None)
+    finally:
+        stdout_gen.close()
+
+
 def git_common_list(git_cmd_list, b_verbose=False):
     """
     execute git command & print
@@ -541,25 +1458,259 @@ def git_common_list(git_cmd_list, b_verbose=False):
     return run_command(cmd_list, b_verbose)
 
 
-def fetch(repo=''):
+def fetch(repo='', b_prune=False):
     """
     >>> fetch()
     or 
     >>> fetch('origin')
+
+    :param bool b_prune: remove remote branches deleted in the remote too
     """
 
     cmd_list = ['fetch']
 
+    if b_prune:
+        cmd_list.append('--prune')
+
     if repo:
         cmd_list.append(repo)
 
-    return git_common_list(['fetch', repo])
+    result = git_common_list(cmd_list)
+
+    invalidate_ref_snapshot()
+
+    return result
 
 
 def reset_hard_revision(revision):
     return git_common_list(['reset', '--hard', revision])
 
 
+# types of git objects in the header of `git cat-file --batch`
+object_type_set = frozenset((b'blob', b'tree', b'commit', b'tag'))
+
+
+class ObjectReader(object):
+    """
+    Long-lived `git cat-file --batch` and `--batch-check` sessions of one repository
+
+    Each lookup is one line written to an already running git process
+    instead of a new process per call.
+
+    >>> with ObjectReader(repo_path) as reader:
+    ...     reader.read_blob('HEAD:README.md')
+    """
+
+    def __init__(self, repo_path=False):
+        if not repo_path:
+            repo_path = os.getcwd()
+
+        self.repo_path = os.path.abspath(repo_path)
+
+        # started on first use
+        self.p_batch = None
+        self.p_check = None
+
+        # pipes inherited by a forked process must not be used or closed there
+        self.pid = os.getpid()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+    def start_process(self, option):
+        return subprocess.Popen(
+            (git_exe_path, 'cat-file', option),
+            cwd=self.repo_path,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+
+    def get_process(self, option):
+        if self.pid != os.getpid():
+            # forked : forget sessions of the parent process
+            self.p_batch = None
+            self.p_check = None
+            self.pid = os.getpid()
+
+        if '--batch' == option:
+            if self.p_batch is None:
+                self.p_batch = self.start_process(option)
+            p = self.p_batch
+        else:
+            if self.p_check is None:
+                self.p_check = self.start_process(option)
+            p = self.p_check
+
+        return p
+
+    @staticmethod
+    def request(p, revision):
+        """
+        Write one revision and read the header line
+        None if git could not find the object
+        """
+        assert '\n' not in revision, repr(revision)
+
+        p.stdin.write(revision.encode('utf-8') + b'\n')
+        p.stdin.flush()
+
+        header = p.stdout.readline()
+
+        if not header:
+            raise BrokenPipeError(f'git cat-file stopped at {revision!r}')
+
+        header = header.rstrip(b'\n')
+
+        # <object> missing
+        # <object> ambiguous
+        # <object> may contain spaces as `HEAD:a b.py`; check the end of the line
+        if header.endswith((b' missing', b' ambiguous')):
+            result = None
+        else:
+            # <sha> SP <type> SP <size>
+            header_split = header.rsplit(b' ', 2)
+
+            if (3 == len(header_split)) and (header_split[1] in object_type_set) and header_split[2].isdigit():
+                sha, object_type, size = header_split
+                result = sha.decode(), object_type.decode(), int(size)
+            else:
+                raise ValueError(f'git cat-file : unexpected header {header!r} of {revision!r}')
+
+        return result
+
+    def get_info(self, revision):
+        """
+        (sha, type, size) of an object or None if missing
+        """
+        return self.request(self.get_process('--batch-check'), revision)
+
+    def resolve(self, revision):
+        """
+        Full SHA of a ref, tag, or any revision expression or None if missing
+        """
+        info = self.get_info(revision)
+
+        if info is None:
+            result = None
+        else:
+            result = info[0]
+
+        return result
+
+    def read_object(self, revision):
+        """
+        (sha, type, content in bytes) of an object or None if missing
+        """
+        p = self.get_process('--batch')
+
+        info = self.request(p, revision)
+
+        if info is None:
+            result = None
+        else:
+            sha, object_type, size = info
+            data = p.stdout.read(size)
+            # each object ends with a new line
+            p.stdout.read(1)
+            result = sha, object_type, data
+
+        return result
+
+    def read_blob(self, revision):
+        """
+        Content of a blob in bytes or None if not a blob
+        """
+        found = self.read_object(revision)
+
+        if found is None or 'blob' != found[1]:
+            result = None
+        else:
+            result = found[2]
+
+        return result
+
+    def close(self):
+        if self.pid == os.getpid():
+            for p in (self.p_batch, self.p_check):
+                if p is not None:
+                    p.stdin.close()
+                    p.stdout.close()
+                    p.wait()
+
+        self.p_batch = None
+        self.p_check = None
+
+
+class ObjectReaderPool(object):
+    """
+    Keep at most max_sessions ObjectReaders open
+    Closes the least recently used one when a new repository needs a session
+    """
+
+    def __init__(self, max_sessions=8):
+        self.max_sessions = max_sessions
+        # repository path : ObjectReader
+        self.reader_dict = collections.OrderedDict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close_all()
+
+    def __len__(self):
+        return len(self.reader_dict)
+
+    def get(self, repo_path=False):
+        if not repo_path:
+            repo_path = os.getcwd()
+
+        key = os.path.abspath(repo_path)
+
+        if key in self.reader_dict:
+            self.reader_dict.move_to_end(key)
+        else:
+            self.reader_dict[key] = ObjectReader(key)
+
+            while self.max_sessions < len(self.reader_dict):
+                _, oldest = self.reader_dict.popitem(last=False)
+                oldest.close()
+
+        return self.reader_dict[key]
+
+    def close(self, repo_path=False):
+        if not repo_path:
+            repo_path = os.getcwd()
+
+        reader = self.reader_dict.pop(os.path.abspath(repo_path), None)
+
+        if reader is not None:
+            reader.close()
+
+    def close_all(self):
+        while self.reader_dict:
+            _, reader = self.reader_dict.popitem()
+            reader.close()
+
+
+object_reader_pool = ObjectReaderPool()
+atexit.register(object_reader_pool.close_all)
+
+
+def get_object_reader(repo_path=False):
+    """
+    Shared ObjectReader of the repository at repo_path (current folder by default)
+    """
+    return object_reader_pool.get(repo_path)
+
+
 if "__main__" == __name__:
     # check if git works fine
     git("status")
@@ -29,11 +29,21 @@ def read_b_decode(filename):
     with open(filename, 'rb') as f:
         data = f.read()
 
+    return b_decode(data)
+
+
+def b_decode(data):
+    """
+    Decode bytes read from a file
+
+    Try utf-8 and cp949 for now
+
+    """
     try:
         txt = data.decode('utf-8')
     except UnicodeDecodeError:
         txt = data.decode('cp949')
-    
+
     return txt
 
 
@@ -4,6 +4,9 @@ Progress report generator
 
 To automatically generate progress reports over multiple repositories
 
+usage : python progress.py [progress.cfg] [--resume]
+    --resume : skip repositories finished in the last run (see checkpoint.py)
+
 Author : KangWon LEE
 
 Year : 2018
@@ -12,6 +15,7 @@ Year : 2018
 
 
 import ast
+import checkpoint
 import configparser
 import itertools
 import json
@@ -21,6 +25,7 @@ import sys
 import time
 
 import dict_table
+import eval_cache
 import eval_repo
 import git
 import iter_repo
@@ -105,18 +110,15 @@ class ProgressReportBuilder(object):
             repo_url_list,
             section_folder=self.config[section]['folder'],
             b_update_repo=(
-                'True' == self.config['operation']['update_repo'].strip())
+                'True' == self.config['operation']['update_repo'].strip()),
+            max_concurrency=get_update_concurrency(self.config),
+            checkpoint=checkpoint.get_checkpoint(self.config, section, 'update'),
         )
 
         results = {}
 
         # evaluate repositories within the section
-        if 'True' == self.config[section]['count_commits']:
-            call_commit_count(self.config, section, repo_list, results)
-        if 'True' == self.config[section]['pound_count']:
-            call_pound_count(self.config, section, repo_list, results)
-        if 'True' == self.config[section]['run_all']:
-            call_run_all(self.config, section, repo_list, results)
+        call_evaluations(self.config, section, repo_list, results)
 
         return results
 
@@ -179,12 +181,27 @@ def main(argv=False):
 
 def get_config_from_argv(argv):
 
-    return get_config_from_filename(get_cfg_filename_from_argv(argv))
+    config = get_config_from_filename(get_cfg_filename_from_argv(argv))
+
+    # continue from the checkpoints of the last run
+    if is_resume(argv):
+        if not config.has_section('operation'):
+            config.add_section('operation')
+        config['operation']['resume'] = 'True'
+
+    return config
+
+
+def is_resume(argv):
+    return bool(argv) and ('--resume' in argv)
 
 
 def get_cfg_filename_from_argv(argv):
-    if argv:
-        config_filename = argv[0]
+    # options are not file names
+    arg_list = [arg for arg in (argv or []) if not arg.startswith('--')]
+
+    if arg_list:
+        config_filename = arg_list[0]
     else:
         config_filename = 'progress.cfg'
 
@@ -223,24 +240,29 @@ def process_section(config, re_git_log, section):
     repo_list = ret.clone_or_pull_repo_list(
         repo_url_list,
         section_folder=config[section]['folder'],
-        b_update_repo=('True' == config['operation']['update_repo'].strip())
+        b_update_repo=('True' == config['operation']['update_repo'].strip()),
+        max_concurrency=get_update_concurrency(config),
+        checkpoint=checkpoint.get_checkpoint(config, section, 'update'),
     )
 
     results = {}
 
     # evaluate repositories within the section
-    if 'True' == config[section]['count_commits']:
-        call_commit_count(config, section, repo_list, results)
-    if 'True' == config[section]['pound_count']:
-        call_pound_count(config, section, repo_list, results)
-    if 'True' == config[section]['run_all']:
-        call_run_all(config, section, repo_list, results)
+    call_evaluations(config, section, repo_list, results)
 
     postprocess(config, section, results)
 
     return results
 
 
+def get_update_concurrency(config):
+    """
+    Number of repositories to update at the same time with asyncio
+    0 (default) : one process per CPU core
+    """
+    return int(config['operation'].get('update_concurrency', '0'))
+
+
 def postprocess(config, section, results):
     # not to broadcast too frequently
     last_sent_filename = get_last_sent_filename(config, section)
@@ -283,8 +305,56 @@ def get_message_filename(config, section):
     return config[section]['todo_list_file']
 
 
-def call_run_all(config, section, repo_list, results):
-    run_all_dict = run_all(config, section, repo_list)
+def call_evaluations(config, section, repo_list, results):
+    """
+    All enabled evaluations of the section visiting each repository once
+    and then write tables of each evaluation
+    """
+    table_dict = evaluate_section(config, section, repo_list)
+
+    if 'count_commits' in table_dict:
+        call_commit_count(config, section, repo_list, results, table_dict['count_commits'])
+    if 'pound_count' in table_dict:
+        call_pound_count(config, section, repo_list, results, table_dict['pound_count'])
+    if 'run_all' in table_dict:
+        call_run_all(config, section, repo_list, results, table_dict['run_all'])
+
+
+@timeit.timeit
+def evaluate_section(config, section, repo_list):
+    """
+    One pool & one walk of each repository for all enabled evaluations
+
+    :return: {'count_commits' | 'pound_count' | 'run_all': RepoTable}
+    """
+    evaluator_dict = {}
+
+    if 'True' == config[section]['count_commits']:
+        evaluator_dict['count_commits'] = get_commit_counter(config, section)
+    if 'True' == config[section]['pound_count']:
+        evaluator_dict['pound_count'] = get_pound_counter(config)
+    if 'True' == config[section]['run_all']:
+        evaluator_dict['run_all'] = get_all_runner(config)
+
+    table_dict = {}
+
+    if evaluator_dict:
+        composite = eval_repo.RepoEvalComposite(evaluator_dict.values())
+        composite.revision = get_revision(config, section)
+
+        table_list = composite.eval_repo_list(
+            repo_list,
+            checkpoint=checkpoint.get_checkpoint(config, section, '+'.join(evaluator_dict)),
+        )
+        print('evaluate_section() : finished eval_repo_list()')
+
+        table_dict = dict(zip(evaluator_dict, table_list))
+
+    return table_dict
+
+
+def call_run_all(config, section, repo_list, results, all_outputs=None):
+    run_all_dict = run_all(config, section, repo_list, all_outputs)
     results.update(
         {
             'run_all': run_all_dict,
@@ -292,8 +362,8 @@ def call_run_all(config, section, repo_list, results):
     )
 
 
-def call_pound_count(config, section, repo_list, results):
-    pound_reports = pound_count(config, section, repo_list)
+def call_pound_count(config, section, repo_list, results, pound_numbers=None):
+    pound_reports = pound_count(config, section, repo_list, pound_numbers)
     results.update(
         {
             'pound_counts': pound_reports
@@ -301,7 +371,7 @@ def call_pound_count(config, section, repo_list, results):
     )
 
 
-def call_commit_count(config, section, repo_list, results):
+def call_commit_count(config, section, repo_list, results, commit_count=None):
     """
     Call count commits() and update results dict
 
@@ -309,8 +379,9 @@ def call_commit_count(config, section, repo_list, results):
     :param str section : usually '{course id}{yr}{a/b/c}', '{course id}{yr}{a/b/c}', or '{course id}{yr}{a/b/c}'
     :param list(dict) repo_list : list of repository_information_dictionary
     :param dict results: contains dictionary of results
+    :param dict_table.RepoTable commit_count: already evaluated (optional)
     """
-    count_commits_dict = count_commits(config, section, repo_list)
+    count_commits_dict = count_commits(config, section, repo_list, commit_count)
     results.update(
         {
             'count_commits': count_commits_dict,
@@ -318,11 +389,18 @@ def call_commit_count(config, section, repo_list, results):
     )
 
 
-@timeit.timeit
-def count_commits(config, section, repo_list):
+def get_revision(config, section):
     """
-    Count commits of each file fromt eh section
+    Revision of each repository to evaluate from the git objects without checking out
+    such as `master@{2019-04-01 23:59:59}` for a due date
+    None to evaluate the work trees as they are
     """
+    revision = config[section].get('revision', '').strip()
+
+    return revision or None
+
+
+def get_commit_counter(config, section):
     # git log interval settings
     after = config[section].get('after', None)
     before = config[section].get('before', None)
@@ -331,21 +409,25 @@ def count_commits(config, section, repo_list):
 
     commit_counter = eval_repo.RepoEvalCountOneCommitLog(
         after, before, exclude_email_tuple)
-    commit_count = commit_counter.eval_repo_list(repo_list)
 
-    # if the header row seems to include '\' character in the header row
-    if commit_count.is_backslash_in_header():
-        print(
-            "'\\' in column title row.\n"
-            'Could you please run following git command to change its configuration?\n'
-            '\n'
-            '    git config core.quotepath false\n'
-            '\n'
-            'or\n'
-            '\n'
-            '    git config --global core.quotepath false\n'
-            '\n'
-        )
+    # commits counted in earlier runs; empty not to keep
+    commit_counter.commit_count_cache_folder = config['operation'].get(
+        'commit_count_cache_folder', 'commit_count_cache').strip() or None
+
+    return commit_counter
+
+
+@timeit.timeit
+def count_commits(config, section, repo_list, commit_count=None):
+    """
+    Count commits of each file fromt eh section
+    If commit_count is given, just write its tables
+    """
+    if commit_count is None:
+        commit_counter = get_commit_counter(config, section)
+        commit_counter.revision = get_revision(config, section)
+        commit_count = commit_counter.eval_repo_list(
+            repo_list, checkpoint=checkpoint.get_checkpoint(config, section, 'count_commits'))
 
     # sort with total
     # TODO : more adaptive argument?
@@ -394,16 +476,49 @@ def write_tables(section, repo_list, table, filename_prefix, sorted_row=None):
     return result_dict
 
 
+def get_all_runner(config):
+    all_runner = eval_repo.RepoEvalRunEachSkipSomeLastCommit(
+        config['operation']['python_path'],
+        timeout_sec=float(config['operation'].get('run_timeout_sec', '60')),
+        max_output_bytes=int(config['operation'].get('run_max_output_bytes', '1048576')),
+        limit_dict=get_run_limit_dict(config),
+        max_concurrent_scripts=int(config['operation'].get('run_max_concurrent', '0')) or None,
+    )
+    # grammar of unchanged files from the last run
+    all_runner.eval_cache = eval_cache.get_eval_cache(config)
+    return all_runner
+
+
+def get_run_limit_dict(config):
+    """
+    Resource limits of each student script
+    An empty value means no limit
+    """
+    limit_dict = {}
+
+    for limit_name, option, default in (
+            ('cpu_sec', 'run_cpu_sec', '60'),
+            ('memory_bytes', 'run_max_memory_bytes', str(2 ** 30)),
+            ('open_files', 'run_max_open_files', '256'),
+            ('file_bytes', 'run_max_file_bytes', str(2 ** 24)),):
+        value = config['operation'].get(option, default).strip()
+        limit_dict[limit_name] = int(value) if value else None
+
+    return limit_dict
+
+
 @timeit.timeit
-def run_all(config, section, repo_list):
+def run_all(config, section, repo_list, all_outputs=None):
     """
     Run (almost) all .py files from the section
+    If all_outputs is given, just write its tables
     """
-
-    all_runner = eval_repo.RepoEvalRunEachSkipSomeLastCommit(
-        config['operation']['python_path'])
-    all_outputs = all_runner.eval_repo_list(repo_list)
-    print(f'run_all() : finished eval_repo_list()')
+    if all_outputs is None:
+        all_runner = get_all_runner(config)
+        all_runner.revision = get_revision(config, section)
+        all_outputs = all_runner.eval_repo_list(
+            repo_list, checkpoint=checkpoint.get_checkpoint(config, section, 'run_all'))
+        print(f'run_all() : finished eval_repo_list()')
 
     # repository names in order
     sorted_row = all_outputs.get_sorted_row(' total')
@@ -631,15 +746,25 @@ def write_last_sent(last_sent_file, gmtime_sec=time.time()):
     )
 
 
+def get_pound_counter(config):
+    pound_counter = eval_repo.RepoEvalPoundByteCounterExcludingRef()
+    # comments of unchanged files from the last run
+    pound_counter.eval_cache = eval_cache.get_eval_cache(config)
+    return pound_counter
+
+
 @timeit.timeit
-def pound_count(config, section, repo_list):
+def pound_count(config, section, repo_list, pound_numbers=None):
     """
     count # comments of the section
+    If pound_numbers is given, just write its tables
     """
-
-    pound_counter = eval_repo.RepoEvalPoundByteCounterExcludingRef()
-    pound_numbers = pound_counter.eval_repo_list(repo_list)
-    print('pound_count() : finished eval_repo_list()')
+    if pound_numbers is None:
+        pound_counter = get_pound_counter(config)
+        pound_counter.revision = get_revision(config, section)
+        pound_numbers = pound_counter.eval_repo_list(
+            repo_list, checkpoint=checkpoint.get_checkpoint(config, section, 'pound_count'))
+        print('pound_count() : finished eval_repo_list()')
 
     # sort with total
     # TODO : more adaptive argument?
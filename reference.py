@@ -4,6 +4,8 @@ Reference builder
 Objective : Build a set of comments that are already in the reference repositories
 
 Input : configuration file
+
+Output : comment_output_file and its hashed index (see reference_index.ReferenceIndex)
  
 """
 
@@ -13,6 +15,7 @@ import os
 import git
 import ignore
 import read_python
+import reference_index
 import regex_test as ret
 import timeit
 import unique_list
@@ -73,6 +76,9 @@ class ReferenceBuilder(object):
             for line in self.comments:
                 f_out.write(line + '\n')
 
+        # evaluators open the index instead of reading the text
+        reference_index.build_reference_index(self.config['operation']['comment_output_file'])
+
     def get_commit(self, section):
         return self.config['commits'][section]
 
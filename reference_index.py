@@ -0,0 +1,200 @@
+"""
+Hashed index of reference comments
+
+Only the standard library; evaluators open the index without the reference builder and its configuration
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+
+
+class ReferenceIndex(object):
+    """
+    Read only hash table of reference comments in a file, memory-mapped
+
+    Opening takes the same time regardless of the number of comments;
+    `comment in index` reads a few slots only.
+    Processes opening the same file share its pages.
+    A pickle has the path only; a worker process opens the file again.
+
+    File layout (little endian)
+        header : magic, number of slots (power of 2), number of comments, sha1 digest of the comments
+        slots  : (64 bit hash, offset, length in bytes) of each comment; all zero if empty
+        text   : utf-8 of the comments
+    """
+
+    magic = b'RSMREF01'
+    header_struct = struct.Struct('<8sQQ40s')
+    slot_struct = struct.Struct('<QQQ')
+
+    def __init__(self, index_path):
+        self.index_path = os.path.abspath(index_path)
+        self.pid = None
+        self.f = None
+        self.mm = None
+        self.n_slots = 0
+        self.n_comments = 0
+        self.digest = None
+
+        self.open()
+
+    def __getstate__(self):
+        return {'index_path': self.index_path}
+
+    def __setstate__(self, state):
+        self.__init__(state['index_path'])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self):
+        self.f = open(self.index_path, 'rb')
+        self.mm = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.pid = os.getpid()
+
+        magic, self.n_slots, self.n_comments, digest = self.header_struct.unpack_from(self.mm, 0)
+
+        if self.magic != magic:
+            self.close()
+            raise ValueError(f'{self.index_path} : not a reference index')
+
+        self.digest = digest.decode('ascii')
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.f.close()
+
+        self.mm = None
+        self.f = None
+
+    def __len__(self):
+        return self.n_comments
+
+    def __contains__(self, comment):
+        if self.pid != os.getpid():
+            # forked : a file of its own
+            self.open()
+
+        data = comment.encode('utf-8', errors='surrogateescape')
+        hash_value = get_comment_hash(data)
+
+        mask = self.n_slots - 1
+        i_slot = hash_value & mask
+
+        result = False
+
+        while True:
+            slot_hash, offset, length = self.slot_struct.unpack_from(
+                self.mm, self.header_struct.size + i_slot * self.slot_struct.size)
+
+            if 0 == slot_hash:
+                # empty slot : not in the table
+                break
+            elif (slot_hash == hash_value) and (self.mm[offset:offset + length] == data):
+                result = True
+                break
+
+            # linear probing
+            i_slot = (i_slot + 1) & mask
+
+        return result
+
+    def __iter__(self):
+        for i_slot in range(self.n_slots):
+            slot_hash, offset, length = self.slot_struct.unpack_from(
+                self.mm, self.header_struct.size + i_slot * self.slot_struct.size)
+
+            if slot_hash:
+                yield self.mm[offset:offset + length].decode('utf-8', errors='surrogateescape')
+
+
+def get_comment_hash(data):
+    """
+    64 bit hash of a comment in bytes, same in every process unlike hash()
+    Never 0, which marks an empty slot
+    """
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little') or 1
+
+
+def get_reference_digest(comments):
+    """
+    sha1 of the reference comments regardless of their order
+    """
+    return hashlib.sha1('\n'.join(sorted(comments)).encode('utf-8')).hexdigest()
+
+
+def get_index_path(comment_filename):
+    return comment_filename + '.index'
+
+
+def build_reference_index(comment_filename, index_path=None):
+    """
+    Write the hash table of the stripped lines of the comment file
+
+    :param str comment_filename: one reference comment in each line
+    :param str index_path: comment_filename + '.index' by default
+    :return: index_path
+    """
+    if index_path is None:
+        index_path = get_index_path(comment_filename)
+
+    with open(comment_filename, 'rt', encoding='utf-8') as f_in:
+        # same order as the file without duplicates
+        comment_list = list(dict.fromkeys(line.strip() for line in f_in))
+
+    # at most half full
+    n_slots = 8
+    while n_slots < (2 * len(comment_list)):
+        n_slots *= 2
+
+    slot_list = [(0, 0, 0)] * n_slots
+
+    text_offset = ReferenceIndex.header_struct.size + n_slots * ReferenceIndex.slot_struct.size
+    text = bytearray()
+
+    for comment in comment_list:
+        data = comment.encode('utf-8', errors='surrogateescape')
+        hash_value = get_comment_hash(data)
+
+        i_slot = hash_value & (n_slots - 1)
+        while slot_list[i_slot][0]:
+            i_slot = (i_slot + 1) & (n_slots - 1)
+
+        slot_list[i_slot] = (hash_value, text_offset + len(text), len(data))
+        text += data
+
+    # write to a temporary file first; other processes may be reading the old one
+    temp_path = f'{index_path}.{os.getpid()}.tmp'
+
+    with open(temp_path, 'wb') as f_out:
+        f_out.write(ReferenceIndex.header_struct.pack(
+            ReferenceIndex.magic, n_slots, len(comment_list),
+            get_reference_digest(comment_list).encode('ascii')))
+
+        for slot in slot_list:
+            f_out.write(ReferenceIndex.slot_struct.pack(*slot))
+
+        f_out.write(text)
+
+    os.replace(temp_path, index_path)
+
+    return index_path
+
+
+def open_reference_index(comment_filename):
+    """
+    ReferenceIndex of the comment file
+    Builds the index first if missing or older than the comment file
+    """
+    index_path = get_index_path(comment_filename)
+
+    if (not os.path.exists(index_path)) or (os.path.getmtime(index_path) < os.path.getmtime(comment_filename)):
+        build_reference_index(comment_filename, index_path)
+
+    return ReferenceIndex(index_path)
@@ -1,14 +1,17 @@
+import asyncio
 import configparser
 import itertools
 import multiprocessing as mp
 import os
 import re
 import time
+import traceback
 
 import git
 import repo_path
 import timeit
 import unique_list
+import update_manifest
 
 
 cfg_filename = 'regex_test.cfg'
@@ -147,7 +150,9 @@ def clone_or_pull_repo_list(
     repo_url_list,
     section_folder=os.path.abspath(config['repository']['path']),
     b_update_repo=True,
-    b_multiprocessing=True
+    b_multiprocessing=True,
+    max_concurrency=0,
+    checkpoint=None,
 ):
     """
     process repository list
@@ -155,6 +160,13 @@ def clone_or_pull_repo_list(
     if path does not exist, clone
     if path exists, pull
 
+    max_concurrency : if positive, one process updates this many repositories at the same time with asyncio
+
+    Repositories whose remote branches did not change since the last update
+    (according to the update manifest of the section) are not updated or tagged
+
+    checkpoint : if given, skip repositories updated in the last run & record each as it finishes
+    A repository failed to update has repo['error'] instead of stopping the others; not recorded in the checkpoint
     """
     # TODO : avoid confusion between .cfg files
 
@@ -164,42 +176,118 @@ def clone_or_pull_repo_list(
     if not os.path.exists(abs_section_folder):
         os.makedirs(abs_section_folder)
 
+    manifest = update_manifest.UpdateManifest(abs_section_folder)
+
     def gen_update_arg(repo_url_list):
         """
         generates argument for mapping clone_or_pull_repo_split()
         """
         for k, repo_url in enumerate(repo_url_list):
-            yield (k, repo_url, abs_section_folder, b_update_repo)
-
-    if b_multiprocessing:
+            yield (k, repo_url, abs_section_folder, b_update_repo, True,
+                   manifest.get_remote_refs(repo_path.get_repo_name_from_url(repo_url)))
+
+    # repo url : repo dict
+    repo_dict = {}
+
+    if checkpoint is not None:
+        for repo_url in repo_url_list:
+            if checkpoint.is_done(repo_url):
+                repo_dict[repo_url] = checkpoint.get(repo_url)
+
+    todo_url_list = [repo_url for repo_url in repo_url_list if repo_url not in repo_dict]
+
+    def add_repo(repo):
+        repo_dict[repo['url']] = repo
+        # retry failed ones in the next run
+        if checkpoint is not None and 'error' not in repo:
+            checkpoint.record(repo['url'], repo)
+
+    if max_concurrency:
+        updated_repo_list = asyncio.run(
+            clone_or_pull_repo_list_async(
+                todo_url_list, abs_section_folder, b_update_repo, max_concurrency, manifest)
+        )
+
+        # tagging is local; after all network updates are finished
+        for repo in updated_repo_list:
+            if not (repo.get('b_unchanged', False) or 'error' in repo):
+                try:
+                    tag_all_remote_branches(True, repo['path'], repo)
+                except Exception as e:
+                    print(f"clone_or_pull_repo_list() : failed to tag {repo['url']}")
+                    traceback.print_exc()
+                    repo = get_error_repo(repo['url'], abs_section_folder, e)
+            add_repo(repo)
+    elif b_multiprocessing:
         p = mp.Pool()
 
-        repo_list = tuple(p.starmap(clone_or_pull_repo_cd,
-                                    gen_update_arg(repo_url_list)))
+        # record each repository as soon as it is finished
+        for repo in p.imap_unordered(clone_or_pull_repo_cd_star, gen_update_arg(todo_url_list)):
+            add_repo(repo)
 
         # multiprocessing cleanup
         p.close()
         p.join()
     else:
-        repo_list = tuple(itertools.starmap(
-            clone_or_pull_repo_cd, gen_update_arg(repo_url_list)))
+        for repo in itertools.starmap(clone_or_pull_repo_cd, gen_update_arg(todo_url_list)):
+            add_repo(repo)
+
+    # in the order of repo_url_list
+    repo_list = tuple(repo_dict[repo_url] for repo_url in repo_url_list)
+
+    # workers return the new remote branches; only this process writes the manifest
+    manifest.update_repo_list(repo_list)
+    manifest.save()
 
     return repo_list
 
 
-def clone_or_pull_repo_cd(k, repo_url, abs_section_folder, b_update_repo, b_tag_after_update=True):
+def clone_or_pull_repo_cd_star(arg):
+    # imap_unordered() passes one argument
+    return clone_or_pull_repo_cd(*arg)
+
+
+def clone_or_pull_repo_cd(k, repo_url, abs_section_folder, b_update_repo, b_tag_after_update=True, manifest_refs=None):
     # cloning should create local repository under this folder
     org_path = repo_path.cd(abs_section_folder)
 
-    result = clone_or_pull_repo(
-        k, repo_url, b_update_repo, b_tag_after_update=b_tag_after_update)
-
-    os.chdir(org_path)
+    try:
+        result = clone_or_pull_repo(
+            k, repo_url, b_update_repo, b_tag_after_update=b_tag_after_update, manifest_refs=manifest_refs)
+    except Exception as e:
+        # not to stop updating the other repositories
+        print('clone_or_pull_repo_cd(%2d) : failed %s' % (k, repo_url))
+        traceback.print_exc()
+        result = get_error_repo(repo_url, abs_section_folder, e)
+    finally:
+        os.chdir(org_path)
 
     return result
 
 
-def clone_or_pull_repo(k, repo_url, b_updte_repo, b_tag_after_update=True):
+def get_error_repo(repo_url, abs_section_folder, e):
+    """
+    Repository failed to update; without 'remote_refs' not to change the manifest
+    """
+    name = repo_path.get_repo_name_from_url(repo_url)
+
+    return {
+        'url': repo_url,
+        'name': name,
+        'path': os.path.join(abs_section_folder, name),
+        'error': ' '.join(f'{type(e).__name__}: {e}'.split()),
+    }
+
+
+def clone_or_pull_repo(k, repo_url, b_updte_repo, b_tag_after_update=True, manifest_refs=None):
+    """
+    manifest_refs : remote branches at the last update; skip update & tagging if the remote still has them
+        and the work tree is as the last update left it
+        `git ls-remote` is the only git command for an unchanged repository
+
+    repo['remote_refs'] : remote branches after clone or update
+    repo['b_unchanged'] : True if the update was skipped
+    """
     # initialize repository info
     repo = {
         'url': repo_url,
@@ -219,14 +307,23 @@ def clone_or_pull_repo(k, repo_url, b_updte_repo, b_tag_after_update=True):
     if not os.path.exists(repo_path_in_section):
         print('clone_or_pull_repo(%2d) : clone %s' % (k, repo['url']))
         git.clone(repo['url'], id=config['Admin']['id'])
+        repo['remote_refs'] = get_remote_refs_after_update(repo['path'])
     else:
         if b_updte_repo:
-            print('clone_or_pull_repo(%2d) : pull %s' % (k, repo['url']))
-            fetch_and_reset(repo_path_in_section)
+            # one lightweight call to the remote; the local check reads the files under .git
+            if update_manifest.is_unchanged(git.ls_remote_heads(repo_path=repo['path']), manifest_refs) and \
+                    is_local_up_to_date(repo['path'], manifest_refs):
+                print('clone_or_pull_repo(%2d) : unchanged %s' % (k, repo['url']))
+                repo['b_unchanged'] = True
+            else:
+                print('clone_or_pull_repo(%2d) : pull %s' % (k, repo['url']))
+                fetch_and_reset(repo_path_in_section)
+                repo['remote_refs'] = get_remote_refs_after_update(repo['path'])
 
     # tag with time stamp after clone or pull
-    tag_all_remote_branches(
-        b_tag_after_update, os.path.abspath(repo_path_in_section), repo)
+    if not repo.get('b_unchanged', False):
+        tag_all_remote_branches(
+            b_tag_after_update, os.path.abspath(repo_path_in_section), repo)
 
     # just in case
     os.chdir(dir_backup)
@@ -234,76 +331,164 @@ def clone_or_pull_repo(k, repo_url, b_updte_repo, b_tag_after_update=True):
     return repo
 
 
-def get_timestamp_str():
-    return time.strftime('%a_%b_%d_%H_%M_%S_%Y')
+async def clone_or_pull_repo_list_async(repo_url_list, abs_section_folder, b_update_repo, max_concurrency=64, manifest=None):
+    """
+    Clone or update repositories concurrently within one process
+    Waiting for the network does not need one process per repository
+    """
+    semaphore = git.get_async_semaphore(max_concurrency)
+
+    def get_manifest_refs(repo_url):
+        result = None
+        if manifest is not None:
+            result = manifest.get_remote_refs(repo_path.get_repo_name_from_url(repo_url))
+        return result
+
+    result_list = await asyncio.gather(
+        *[
+            clone_or_pull_repo_async(
+                k, repo_url, abs_section_folder, b_update_repo, semaphore, get_manifest_refs(repo_url))
+            for k, repo_url in enumerate(repo_url_list)
+        ],
+        # not to stop updating the other repositories
+        return_exceptions=True,
+    )
+
+    repo_list = []
+
+    for repo_url, result in zip(repo_url_list, result_list):
+        if isinstance(result, Exception):
+            print(f'clone_or_pull_repo_list_async() : failed {repo_url}')
+            traceback.print_exception(type(result), result, result.__traceback__)
+            result = get_error_repo(repo_url, abs_section_folder, result)
+        repo_list.append(result)
+
+    return repo_list
 
 
-def tag_stamp(b_tag_after_update, repo_path_in_section, repo, branch='', commit=''):
+async def clone_or_pull_repo_async(k, repo_url, abs_section_folder, b_update_repo, semaphore, manifest_refs=None):
     """
-    Tag with time stamp after clone or pull
+    asyncio version of clone_or_pull_repo() without tagging
+    Runs git within the folders instead of changing the current folder
     """
-    if b_tag_after_update:
-        # store current path
-        cwd = os.getcwd()
+    # initialize repository info
+    repo = {
+        'url': repo_url,
+        'name': repo_path.get_repo_name_from_url(repo_url),  # repository name
+    }
 
-        # move to the repository path
-        os.chdir(repo_path_in_section)
+    repo['path'] = os.path.join(abs_section_folder, repo['name'])
+
+    # one repository at a time holds the semaphore until its update is finished
+    async with semaphore:
+        if not os.path.exists(repo['path']):
+            print('clone_or_pull_repo_async(%2d) : clone %s' % (k, repo['url']))
+            await git.clone_async(repo['url'], id=config['Admin']['id'], cwd=abs_section_folder)
+            repo['remote_refs'] = get_remote_refs_after_update(repo['path'])
+        elif b_update_repo:
+            stdout, stderr = await git.git_async(['ls-remote', '--heads', 'origin'], cwd=repo['path'])
+            remote_refs = None if is_update_error(stdout, stderr) else git.parse_ls_remote(stdout)
+
+            b_unchanged = update_manifest.is_unchanged(remote_refs, manifest_refs) and \
+                is_local_up_to_date(repo['path'], manifest_refs)
+
+            if b_unchanged:
+                print('clone_or_pull_repo_async(%2d) : unchanged %s' % (k, repo['url']))
+                repo['b_unchanged'] = True
+            else:
+                print('clone_or_pull_repo_async(%2d) : pull %s' % (k, repo['url']))
+                await fetch_and_reset_async(repo['path'])
+                repo['remote_refs'] = get_remote_refs_after_update(repo['path'])
 
-        # get latest hash value
-        last_sha = git.get_last_sha(branch=branch)
+    return repo
 
-        # decide tag string
-        if branch:
-            if '/' in branch:
-                branch = branch[(branch.index('/')+1):]
 
-            # add branch name
-            tag_string = f'{get_timestamp_str()}__{branch}__{last_sha}'
-        else:
-            # just time stamp
-            tag_string = f'{get_timestamp_str()}__{last_sha}'
+def is_local_up_to_date(repo_abs_path, manifest_refs, branch='master'):
+    """
+    True if the repository is as fetch_and_reset() would leave it :
+    on the branch at its remote commit in the manifest; no tracked file modified
+    Untracked and ignored files such as outputs or __pycache__ do not count
+    Reads the files under .git instead of starting git
+
+    :param dict manifest_refs: {'refs/heads/<branch>': sha} or None if unknown
+    """
+    result = False
+
+    if manifest_refs is not None:
+        head, oid = git.read_local_head(repo_abs_path)
+        result = (branch == head) and (oid == manifest_refs.get(f'refs/heads/{branch}', None)) and \
+            git.is_index_clean(repo_abs_path)
+
+    return result
+
+
+def get_remote_refs_after_update(repo_abs_path):
+    """
+    Remote branches to record in the update manifest; None if clone failed
+    """
+    result = None
+
+    if os.path.isdir(repo_abs_path):
+        result = git.get_remote_tracking_heads(repo_path=repo_abs_path)
+
+    return result
 
-        # Tag if the latest commit does not already have a tag
-        if not git.has_a_tag(commit=commit):
-            if not git.tag(tag_string, revision=commit):
-                raise IOError('Unable to tag {name} {tag}'.format(
-                    tag=tag_string, name=repo['name']))
 
-        # return to the stored path
-        os.chdir(cwd)
+def get_timestamp_str():
+    return time.strftime('%a_%b_%d_%H_%M_%S_%Y')
 
 
 def tag_all_remote_branches(b_tag_after_update, repo_abs_path, repo):
     """
     Tag all remote branches with timestamps and branch names
-    """
-    # preserve current status
-    # current_section_branch = git.get_current_branch()
-    # probably section path
-    section_path = os.getcwd()
 
+    One ref snapshot and one `update-ref --stdin` transaction
+    per repository regardless of the number of branches
+    """
     if b_tag_after_update:
-        # need to obtain the branch list in the repository
-        os.chdir(repo_abs_path)
+        # refs may have changed since the last snapshot
+        ref_snapshot = git.get_ref_snapshot(repo_abs_path, b_refresh=True)
+
+        instruction_list = get_tag_instruction_list(
+            ref_snapshot.ref_list, get_timestamp_str())
+
+        if not git.update_ref_stdin(instruction_list, repo_path=repo_abs_path):
+            raise IOError('Unable to tag {name} {tags}'.format(
+                tags=instruction_list, name=repo['name']))
 
-        # preserve repository status
-        current_repo_branch = git.get_current_branch()
 
-        # branch name loop
-        for repo_branch in git.get_remote_branch_list():
-            # A remote branch would be like : remote_name/branch_name/##
-            tag_stamp(b_tag_after_update, repo_abs_path, repo,
-                      branch=repo_branch, commit=repo_branch)
+def get_tag_instruction_list(ref_list, timestamp_str):
+    """
+    `update-ref --stdin` instructions tagging remote branch tips without a tag yet
+
+    :param list ref_list: from git.for_each_ref()
+    :param str timestamp_str: from get_timestamp_str()
+    """
+    remote_prefix = 'refs/remotes/'
+    tag_prefix = 'refs/tags/'
+
+    # commits already tagged
+    tagged_sha_set = {
+        commit_sha for refname, _, commit_sha, _ in ref_list if refname.startswith(tag_prefix)}
+
+    instruction_list = []
+
+    # branch loop
+    for refname, sha, commit_sha, short_sha in ref_list:
+        # refs/remotes/origin/HEAD points to another remote branch
+        if refname.startswith(remote_prefix) and (not refname.endswith('/HEAD')):
+            # Tag if the latest commit does not already have a tag
+            if commit_sha not in tagged_sha_set:
+                # A remote branch would be like : remote_name/branch_name/##
+                branch = refname[len(remote_prefix):]
+                branch = branch[(branch.index('/')+1):]
+
+                tag_string = f'{timestamp_str}__{branch}__{short_sha}'
 
-        # restore repository branch
-        git.checkout(current_repo_branch)
-        if 'master' != git.get_current_branch().strip():
-            print("branch = {branch}, repo path = {path}".format(
-                branch=git.get_current_branch(), path=repo_abs_path))
+                instruction_list.append(f'create {tag_prefix}{tag_string} {sha}')
+                tagged_sha_set.add(commit_sha)
 
-    # return to section path
-    os.chdir(section_path)
-    # git.checkout(current_section_branch)
+    return instruction_list
 
 
 def get_git_naver_anon(proj_id):
@@ -408,14 +593,18 @@ def clean_repo_before_update(b_verbose=False, caller_name='',):
     git.clean_xdf(b_verbose=False)
 
 
-def clean_repo_after_error(stdout, stderr, caller_name, b_verbose=False,):
-
-    # if there was an error during fetch
-    if any((
+def is_update_error(stdout, stderr):
+    return any((
         (stdout.startswith('CONFLICT')),
         ('fatal' in stderr),
         ('error' in stderr),
-    )):
+    ))
+
+
+def clean_repo_after_error(stdout, stderr, caller_name, b_verbose=False,):
+
+    # if there was an error during fetch
+    if is_update_error(stdout, stderr):
         # present error message
         print(f'{caller_name}() : Possible error while updating')
         print(os.getcwd())
@@ -449,7 +638,8 @@ def fetch_and_reset(repository_path, b_verbose=False, revision='origin/master',
 
     git.checkout('master', b_verbose=b_verbose)
 
-    stdout, stderr = git.fetch(remote)
+    # deleted remote branches would not match `git ls-remote` in the manifest
+    stdout, stderr = git.fetch(remote, b_prune=True)
 
     clean_repo_after_error(
         stdout, stderr, 'fetch_and_reset__fetch', b_verbose=b_verbose,)
@@ -462,6 +652,55 @@ def fetch_and_reset(repository_path, b_verbose=False, revision='origin/master',
     os.chdir(org_path)
 
 
+async def clean_repo_after_error_async(stdout, stderr, caller_name, repository_path, b_verbose=False,):
+    """
+    asyncio version of clean_repo_after_error() within repository_path
+    """
+
+    # if there was an error during fetch
+    if is_update_error(stdout, stderr):
+        # present error message
+        print(f'{caller_name}() : Possible error while updating')
+        print(repository_path)
+        print(f'{caller_name}() : stdout :')
+        print(stdout)
+        print(f'{caller_name}() : stderr :')
+        print(stderr)
+
+        # cleanup
+        print(f'{caller_name}() : clean -x -d -f')
+        await git.git_async(['clean', '-x', '-d', '-f'], b_verbose=True, cwd=repository_path)
+        # revert
+        print(f"{caller_name}() : reset --hard HEAD")
+        await git.git_async(['reset', '--hard', 'HEAD'], cwd=repository_path)
+    if b_verbose:
+        print(f'{caller_name}() :', stdout)
+
+
+async def fetch_and_reset_async(repository_path, b_verbose=False, revision='origin/master', remote='origin'):
+    """
+    asyncio version of fetch_and_reset()
+    git commands run within repository_path; current folder does not change
+    """
+
+    # clean repository before update
+    await git.git_async(['reset', '--hard', 'HEAD'], cwd=repository_path)
+    await git.git_async(['clean', '-x', '-d', '-f'], cwd=repository_path)
+
+    await git.git_async(['checkout', 'master'], b_verbose=b_verbose, cwd=repository_path)
+
+    # deleted remote branches would not match `git ls-remote` in the manifest
+    stdout, stderr = await git.git_async(['fetch', '--prune', remote], cwd=repository_path)
+
+    await clean_repo_after_error_async(
+        stdout, stderr, 'fetch_and_reset_async__fetch', repository_path, b_verbose=b_verbose,)
+
+    stdout, stderr = await git.git_async(['reset', '--hard', revision], cwd=repository_path)
+
+    await clean_repo_after_error_async(
+        stdout, stderr, 'fetch_and_reset_async__reset', repository_path, b_verbose=b_verbose,)
+
+
 if "__main__" == __name__:
     # read file
     found = get_proj_id_list(config['repository']['listFile'])
@@ -0,0 +1,312 @@
+"""
+Script runners of RepoEvalRunEach
+
+SubprocessRunner : start python_path for each script
+ForkServerRunner : a warm python (fork_server.py) forks a child for each script
+"""
+
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import fork_server
+import git
+
+
+class SubprocessRunner(object):
+    def __init__(self, python_path):
+        self.python_path = python_path
+
+    def run(self, argv, in_txt=None, timeout_sec=None, max_output_bytes=None, cwd=None, limit_dict=None):
+        """
+        :param list argv: [script, arg, ...]
+        :param str in_txt: standard input
+        :param float timeout_sec: kill the script and its child processes after this
+        :param int max_output_bytes: keep at most this many bytes of stdout and of stderr
+        :param str cwd: folder to run the script (current folder by default)
+        :param dict limit_dict: resource limits of the script; see fork_server.set_rlimits()
+        :return: git.CommandResult
+        """
+        preexec_fn = None
+
+        if limit_dict and (fork_server.resource is not None):
+            def preexec_fn():
+                fork_server.set_rlimits(limit_dict)
+
+        cpu_sec_before = get_children_cpu_sec()
+
+        result = git.run_command(
+            [self.python_path] + list(argv),
+            in_txt=in_txt,
+            b_verbose=False,
+            timeout_sec=timeout_sec,
+            max_output_bytes=max_output_bytes,
+            cwd=cwd,
+            preexec_fn=preexec_fn,
+        )
+
+        # one script at a time in this process
+        if cpu_sec_before is not None:
+            result.cpu_sec = get_children_cpu_sec() - cpu_sec_before
+
+        return result
+
+    def close(self):
+        pass
+
+
+class ForkServerRunner(object):
+    """
+    Same results as SubprocessRunner of this python without starting python for each script
+    The server starts at the first script; one server for each process using this runner
+    """
+
+    fork_server_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fork_server.py')
+
+    def __init__(self):
+        self.server = None
+        self.sock = None
+        # bytes received after the last line
+        self.recv_buffer = b''
+        # process of the server
+        self.pid = None
+
+    def __getstate__(self):
+        # another process would start its own server
+        return {}
+
+    def __setstate__(self, state):
+        self.__init__()
+
+    def start_server(self):
+        self.sock, server_sock = socket.socketpair()
+
+        env = os.environ.copy()
+        env['PYTHONIOENCODING'] = 'utf-8'
+
+        self.server = subprocess.Popen(
+            [sys.executable, self.fork_server_path, str(server_sock.fileno())],
+            stdin=subprocess.DEVNULL,
+            pass_fds=(server_sock.fileno(),),
+            env=env,
+        )
+
+        server_sock.close()
+        self.recv_buffer = b''
+        self.pid = os.getpid()
+
+    def is_server_running(self):
+        return (self.server is not None) and (os.getpid() == self.pid) and (self.server.poll() is None)
+
+    def run(self, argv, in_txt=None, timeout_sec=None, max_output_bytes=None, cwd=None, limit_dict=None):
+        """
+        Same as SubprocessRunner.run()
+        """
+        if not self.is_server_running():
+            self.start_server()
+
+        # pipes of the script
+        stdin_read, stdin_write = os.pipe()
+        stdout_read, stdout_write = os.pipe()
+        stderr_read, stderr_write = os.pipe()
+
+        try:
+            socket.send_fds(
+                self.sock,
+                [json.dumps({
+                    'argv': list(argv),
+                    'cwd': os.path.abspath(cwd or os.getcwd()),
+                    'limits': limit_dict,
+                }).encode('utf-8')],
+                [stdin_read, stdout_write, stderr_write]
+            )
+        finally:
+            # the script has them now
+            for fd in (stdin_read, stdout_write, stderr_write):
+                os.close(fd)
+
+        pid = int(self.recv_line())
+
+        stdout_list, stderr_list, b_truncated_list = [], [], []
+
+        stdout = os.fdopen(stdout_read, 'rb')
+        stderr = os.fdopen(stderr_read, 'rb')
+        stdin = os.fdopen(stdin_write, 'wb')
+
+        thread_list = [
+            threading.Thread(target=git.read_pipe_bounded, args=(
+                stdout, max_output_bytes, stdout_list, b_truncated_list)),
+            threading.Thread(target=git.read_pipe_bounded, args=(
+                stderr, max_output_bytes, stderr_list, b_truncated_list)),
+            threading.Thread(target=git.write_pipe, args=(
+                stdin, None if in_txt is None else in_txt.encode('utf-8'))),
+        ]
+
+        for thread in thread_list:
+            thread.daemon = True
+            thread.start()
+
+        try:
+            finish_line = self.recv_line(timeout_sec)
+            b_timeout = False
+        except socket.timeout:
+            kill_session(pid)
+            finish_line = self.recv_line()
+            b_timeout = True
+
+        return_code, cpu_sec = finish_line.split()
+
+        # the script ended; the rest of its output should follow soon
+        git.join_pipe_threads(thread_list, git.pipe_grace_sec)
+
+        if any(thread.is_alive() for thread in thread_list):
+            # a child process of the script still holds the pipes
+            kill_session(pid)
+            # a process out of the session may still hold one; its daemon thread is left behind
+            git.join_pipe_threads(thread_list, git.pipe_grace_sec)
+
+        b_truncated = bool(b_truncated_list)
+
+        return git.CommandResult(
+            git.decode_output(b''.join(stdout_list), b_truncated),
+            git.decode_output(b''.join(stderr_list), b_truncated),
+            int(return_code), b_timeout, b_truncated, float(cpu_sec),
+        )
+
+    def recv_line(self, timeout_sec=None):
+        """
+        One line from the server
+        socket.timeout if not within timeout_sec
+        """
+        deadline = None if timeout_sec is None else (time.time() + timeout_sec)
+
+        while b'\n' not in self.recv_buffer:
+            self.sock.settimeout(None if deadline is None else max(0.0, deadline - time.time()))
+
+            chunk = self.sock.recv(4096)
+
+            if not chunk:
+                raise ConnectionError('fork server finished')
+
+            self.recv_buffer += chunk
+
+        self.sock.settimeout(None)
+
+        line, self.recv_buffer = self.recv_buffer.split(b'\n', 1)
+
+        return line.decode()
+
+    def close(self):
+        if self.is_server_running():
+            # the server finishes at the end of the socket
+            self.sock.close()
+            self.server.wait()
+
+        self.server = None
+        self.sock = None
+
+
+def get_kill_reason(result, limit_dict=None):
+    """
+    Why the script ended early or None
+
+    :param git.CommandResult result: of a runner
+    :param dict limit_dict: resource limits of the script
+    :return: 'timeout', 'cpu time', 'memory', 'open files', 'file size', or 'signal <name>'
+    """
+    limit_dict = limit_dict or {}
+    # last line of the traceback
+    stderr_list = result.stderr.strip().splitlines()
+    last_line = stderr_list[-1] if stderr_list else ''
+
+    returncode = getattr(result, 'returncode', None)
+
+    if getattr(result, 'b_timeout', False):
+        reason = 'timeout'
+    elif (returncode is None) or (0 == returncode):
+        reason = None
+    elif ((-getattr(signal, 'SIGXCPU', -1)) == returncode) or (
+            ((-getattr(signal, 'SIGKILL', -1)) == returncode) and is_cpu_limit_reached(result, limit_dict)):
+        # SIGKILL at the hard limit if the script ignored SIGXCPU
+        reason = 'cpu time'
+    elif last_line.startswith('MemoryError') and (limit_dict.get('memory_bytes', None) is not None):
+        reason = 'memory'
+    elif ('[Errno 24]' in last_line) and (limit_dict.get('open_files', None) is not None):
+        # Too many open files
+        reason = 'open files'
+    elif ('[Errno 27]' in last_line) and (limit_dict.get('file_bytes', None) is not None):
+        # File too large
+        reason = 'file size'
+    elif 0 > returncode:
+        try:
+            reason = f'signal {signal.Signals(-returncode).name}'
+        except ValueError:
+            reason = f'signal {-returncode}'
+    else:
+        reason = None
+
+    return reason
+
+
+def is_cpu_limit_reached(result, limit_dict):
+    """
+    True if the script used up its cpu time; False if unknown
+    """
+    cpu_sec = getattr(result, 'cpu_sec', None)
+    limit_sec = limit_dict.get('cpu_sec', None)
+
+    return (cpu_sec is not None) and (limit_sec is not None) and (limit_sec <= cpu_sec)
+
+
+def get_children_cpu_sec():
+    """
+    User + system cpu time of the finished child processes of this process; None if unknown
+    """
+    if fork_server.resource is None:
+        result = None
+    else:
+        rusage = fork_server.resource.getrusage(fork_server.resource.RUSAGE_CHILDREN)
+        result = rusage.ru_utime + rusage.ru_stime
+
+    return result
+
+
+def kill_session(pid):
+    """
+    Kill a script of the fork server and its child processes
+    """
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        try:
+            # before os.setsid() of the script
+            os.kill(pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            # already finished
+            pass
+
+
+def is_same_interpreter(python_path):
+    return os.path.realpath(shutil.which(python_path) or python_path) == os.path.realpath(sys.executable)
+
+
+def is_fork_server_possible(python_path):
+    """
+    Only if scripts would run with this python and this os can fork & pass file descriptors
+    """
+    return hasattr(os, 'fork') and hasattr(socket, 'send_fds') and is_same_interpreter(python_path)
+
+
+def get_script_runner(python_path, b_fork_server=True):
+    if b_fork_server and is_fork_server_possible(python_path):
+        result = ForkServerRunner()
+    else:
+        result = SubprocessRunner(python_path)
+
+    return result
@@ -1,5 +1,7 @@
 import os
+import subprocess
 import tempfile
+import unittest
 
 
 def get_tempfile_name(suffix: str=None) -> str:
@@ -16,3 +18,65 @@ def write_to_temp_file(content: str, mode: str='wt', suffix: str='.py', encoding
     with tempfile.NamedTemporaryFile(mode='wt', suffix='.py', encoding='utf-8', delete=False) as argv_file:
         argv_file.write(content)
     return argv_file
+
+
+def run_git(cmd_list: list, cwd: str, env: dict=None, check: bool=False, user_name: str='temp') -> subprocess.CompletedProcess:
+    """
+    git with a temporary identity; no global git configuration necessary
+    """
+    return subprocess.run(
+        ['git', '-c', f'user.name={user_name}', '-c', 'user.email=temp@temp.net'] + cmd_list,
+        cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env, check=check, encoding='utf-8')
+
+
+def get_date_env(date: str=None) -> dict:
+    """
+    Environment to commit at the date; None for now
+    """
+    env = dict(os.environ)
+
+    if date:
+        env['GIT_AUTHOR_DATE'] = env['GIT_COMMITTER_DATE'] = date
+
+    return env
+
+
+def commit_files(repo_path: str, txt_dict: dict, message: str, date: str=None) -> str:
+    """
+    Write {path: text}, initialize the repository if necessary, and commit all
+    Returns the sha of the new commit
+    """
+    for path, txt in txt_dict.items():
+        os.makedirs(os.path.dirname(os.path.join(repo_path, path)), exist_ok=True)
+        with open(os.path.join(repo_path, path), 'wt', encoding='utf-8') as f:
+            f.write(txt)
+
+    if not os.path.exists(os.path.join(repo_path, '.git')):
+        run_git(['init'], repo_path)
+
+    run_git(['add', '.'], repo_path)
+    run_git(['commit', '-m', message], repo_path, env=get_date_env(date))
+
+    return run_git(['rev-parse', 'HEAD'], repo_path).stdout.strip()
+
+
+class TempRepoTestBase(unittest.TestCase):
+    """
+    An empty repository at self.repo_path in a temporary folder
+    """
+
+    def setUp(self):
+        self.temp_folder = tempfile.TemporaryDirectory()
+        self.repo_path = os.path.join(self.temp_folder.name, 'repo')
+
+        os.makedirs(self.repo_path)
+        run_git(['init'], self.repo_path)
+
+    def tearDown(self):
+        del self.temp_folder
+
+    def git(self, cmd_list: list, date: str=None) -> subprocess.CompletedProcess:
+        return run_git(cmd_list, self.repo_path, env=get_date_env(date))
+
+    def commit(self, txt_dict: dict, message: str, date: str=None) -> str:
+        return commit_files(self.repo_path, txt_dict, message, date=date)
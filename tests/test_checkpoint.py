@@ -0,0 +1,61 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+import checkpoint
+
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.temp_folder = tempfile.TemporaryDirectory()
+        self.journal_path = checkpoint.get_journal_path(self.temp_folder.name, 'a', 'run_all')
+
+    def tearDown(self):
+        del self.temp_folder
+
+    def test_resume(self):
+        journal = checkpoint.Checkpoint(self.journal_path)
+        journal.record('repo_a', {' total': 1})
+        journal.record('repo_b', {' total': 2})
+
+        resumed = checkpoint.Checkpoint(self.journal_path, b_resume=True)
+
+        self.assertEqual(2, len(resumed))
+        self.assertTrue(resumed.is_done('repo_a'))
+        self.assertEqual({' total': 2}, resumed.get('repo_b'))
+        self.assertFalse(resumed.is_done('repo_c'))
+
+    def test_new_run(self):
+        checkpoint.Checkpoint(self.journal_path).record('repo_a', {' total': 1})
+
+        # without resume, start over
+        journal = checkpoint.Checkpoint(self.journal_path)
+
+        self.assertEqual(0, len(journal))
+        self.assertFalse(os.path.exists(self.journal_path))
+
+    def test_incomplete_record(self):
+        journal = checkpoint.Checkpoint(self.journal_path)
+        journal.record('repo_a', {' total': 1})
+        journal.record('repo_b', {' total': 2})
+
+        # interrupted while writing the last record
+        size = os.path.getsize(self.journal_path)
+        with open(self.journal_path, 'r+b') as f:
+            f.truncate(size - 3)
+
+        resumed = checkpoint.Checkpoint(self.journal_path, b_resume=True)
+        self.assertEqual(['repo_a'], list(resumed.done_dict))
+
+        # new records after the last complete one
+        resumed.record('repo_c', {' total': 3})
+
+        resumed_again = checkpoint.Checkpoint(self.journal_path, b_resume=True)
+        self.assertEqual(['repo_a', 'repo_c'], list(resumed_again.done_dict))
+
+
+if "__main__" == __name__:
+    unittest.main()
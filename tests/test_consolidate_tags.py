@@ -0,0 +1,97 @@
+import os
+import subprocess
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+import consolidate_tags
+import git
+import tempf
+
+
+class TestConsolidateTags(tempf.TempRepoTestBase):
+    def setUp(self):
+        super().setUp()
+        self.repo_name = 'repo'
+
+        self.run_git(['commit', '--allow-empty', '-m', 'first commit'])
+
+        self.sha = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=self.repo_path, encoding='utf-8').strip()
+
+        self.tag_list = [
+            f'Tue_Apr_24_16_54_15_2018__master__{self.sha[:7]}',
+            f'Wed_Apr_25_16_54_15_2018__master__{self.sha[:7]}',
+            f'Thu_Apr_26_16_54_15_2018__{self.sha[:7]}',
+        ]
+
+        for tag in self.tag_list:
+            self.run_git(['tag', tag])
+
+        git.invalidate_ref_snapshot()
+
+    def tearDown(self):
+        git.invalidate_ref_snapshot()
+        super().tearDown()
+
+    def run_git(self, cmd_list):
+        tempf.run_git(cmd_list, self.repo_path, check=True)
+
+    def get_tag_set(self):
+        return set(subprocess.check_output(
+            ['git', 'tag'], cwd=self.repo_path, encoding='utf-8').split())
+
+    def test_get_delete_tag_list(self):
+        result = consolidate_tags.get_delete_tag_list(
+            [(tag, self.sha) for tag in self.tag_list])
+
+        # keep the oldest
+        self.assertEqual(self.tag_list[1:], result)
+
+    def test_process_repo_dry_run(self):
+        result = consolidate_tags.process_repo(self.temp_folder.name, self.repo_name, True)
+
+        self.assertEqual((self.repo_path, 2), result)
+        self.assertEqual(set(self.tag_list), self.get_tag_set())
+
+    def test_process_repo(self):
+        result = consolidate_tags.process_repo(self.temp_folder.name, self.repo_name)
+
+        self.assertEqual((self.repo_path, 2), result)
+        self.assertEqual({self.tag_list[0]}, self.get_tag_set())
+
+    def test_process_repo_failed(self):
+        # another git process holds one of the tags
+        with open(os.path.join(self.repo_path, '.git', 'refs', 'tags', self.tag_list[1] + '.lock'), 'w'):
+            pass
+
+        result = consolidate_tags.process_repo(self.temp_folder.name, self.repo_name)
+
+        # none deleted; not 2
+        self.assertEqual((self.repo_path, 0), result)
+        self.assertEqual(set(self.tag_list), self.get_tag_set())
+
+    def test_process_repo_not_git(self):
+        cwd = os.getcwd()
+        os.mkdir(os.path.join(self.temp_folder.name, 'not_git'))
+        # even if the temporary folder is within a repository
+        os.environ['GIT_CEILING_DIRECTORIES'] = self.temp_folder.name
+
+        try:
+            result_list = [
+                consolidate_tags.process_repo(self.temp_folder.name, repo_name)
+                for repo_name in ('not_git', self.repo_name)
+            ]
+        finally:
+            del os.environ['GIT_CEILING_DIRECTORIES']
+
+        # the other repository still processed
+        self.assertEqual(
+            [(os.path.join(self.temp_folder.name, 'not_git'), 0), (self.repo_path, 2)], result_list)
+        self.assertEqual({self.tag_list[0]}, self.get_tag_set())
+        self.assertEqual(cwd, os.getcwd())
+
+
+if "__main__" == __name__:
+    unittest.main()
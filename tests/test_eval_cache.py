@@ -0,0 +1,78 @@
+import multiprocessing
+import os
+import pickle
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+import eval_cache
+
+
+def put_in_worker(cache_key):
+    cache, key = cache_key
+    cache.put(key, {'key': key})
+    return cache.get(key)
+
+
+class TestEvalCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_folder = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.temp_folder.name, 'eval_cache.sqlite3')
+
+    def tearDown(self):
+        del self.temp_folder
+
+    def test_get_put(self):
+        cache = eval_cache.EvalCache(self.db_path)
+
+        self.assertIsNone(cache.get('a'))
+
+        cache.put('a', {'grammar pass': True})
+        cache.close()
+
+        # another run
+        self.assertEqual({'grammar pass': True}, eval_cache.EvalCache(self.db_path).get('a'))
+
+    def test_evict_least_recently_used(self):
+        cache = eval_cache.EvalCache(self.db_path, max_entries=2)
+        cache.evict_interval = 1
+
+        cache.put('a', 1)
+        cache.put('b', 2)
+        # 'a' used more recently than 'b'
+        self.assertEqual(1, cache.get('a'))
+        cache.put('c', 3)
+
+        self.assertEqual(2, len(cache))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(1, cache.get('a'))
+        self.assertEqual(3, cache.get('c'))
+
+    def test_workers(self):
+        cache = eval_cache.EvalCache(self.db_path)
+        # no connection in the pickle
+        self.assertIsNone(pickle.loads(pickle.dumps(cache)).connection)
+
+        key_list = [str(i) for i in range(16)]
+
+        with multiprocessing.Pool(4) as p:
+            result_list = p.map(put_in_worker, [(cache, key) for key in key_list])
+
+        self.assertEqual([{'key': key} for key in key_list], result_list)
+        self.assertEqual(len(key_list), len(cache))
+
+    def test_get_key(self):
+        key = eval_cache.get_key('0' * 40, 'RepoEvalRunEach.compile_file', (1, 'python'))
+
+        self.assertTrue(key.startswith('0' * 40 + ':RepoEvalRunEach.compile_file:'))
+        self.assertNotEqual(
+            key, eval_cache.get_key('0' * 40, 'RepoEvalRunEach.compile_file', (1, 'python3')))
+
+    def test_get_eval_cache_disabled(self):
+        self.assertIsNone(eval_cache.get_eval_cache({'operation': {'eval_cache_file': ''}}))
+
+
+if "__main__" == __name__:
+    unittest.main()
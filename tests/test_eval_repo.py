@@ -1,8 +1,10 @@
 import ast
 import configparser
 import datetime
+import fractions
 import glob
 import os
+import pickle
 import shutil
 import subprocess
 import sys
@@ -14,7 +16,10 @@ import unittest
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
 
 
+import checkpoint
+import eval_cache
 import eval_repo
+import git
 import tempf
 
 
@@ -431,6 +436,66 @@ class TestFromSysImportArgv(unittest.TestCase):
         self.assertTrue(result)
 
 
+class TestRepoEvalCountCommitNameStatus(unittest.TestCase):
+    def setUp(self):
+        self.temp_folder = tempfile.TemporaryDirectory()
+        self.repo = {'name': 'repo', 'path': os.path.join(self.temp_folder.name, 'repo')}
+        os.makedirs(os.path.join(self.repo['path'], 'sub'))
+
+        self.run_git(['init'])
+
+        self.write('x y.py', 'a\nb\nc\nd\n')
+        self.write('sub/ex00.py', 'print(0)\n')
+        self.commit('first')
+
+        self.run_git(['mv', 'x y.py', 'z \uc774\ub984.py'])
+        self.commit('rename')
+
+        self.write('z \uc774\ub984.py', 'e\n')
+        self.write('sub/ex00.py', 'print(1)\n')
+        self.write('q.py', 'print(2)\n')
+        self.commit('third')
+
+    def tearDown(self):
+        del self.temp_folder
+
+    def run_git(self, cmd_list):
+        tempf.run_git(cmd_list, self.repo['path'])
+
+    def write(self, filename, txt):
+        with open(os.path.join(self.repo['path'], filename), 'a', encoding='utf-8') as f:
+            f.write(txt)
+
+    def commit(self, message):
+        self.run_git(['add', '.'])
+        self.run_git(['commit', '-m', message])
+
+    def test_same_as_follow(self):
+        re_git_log = eval_repo.RepoEvalCountCommit.get_regex_parse_git_log()
+
+        expected = eval_repo.RepoEvalCountCommit(re_git_log).eval_repo_list(
+            [self.repo], b_multiprocessing=False)
+        result = eval_repo.RepoEvalCountCommitNameStatus().eval_repo_list(
+            [self.repo], b_multiprocessing=False)
+
+        self.assertEqual(expected.index, result.index)
+        self.assertEqual(3, result['repo']['./z \uc774\ub984.py'])
+        self.assertEqual(2, result['repo']['sub/ex00.py'])
+        self.assertEqual(1, result['repo']['./q.py'])
+
+    def test_count_name_status(self):
+        git_log = (
+            '\x01' + 'c' * 40 + '\0\nM\0b.py\0'
+            '\x01' + 'b' * 40 + '\0\nR090\0a.py\0b.py\0'
+            '\x01' + 'a' * 40 + '\0\nA\0a.py\0A\0b.py\0'
+        )
+
+        result = eval_repo.RepoEvalCountCommitNameStatus().count_name_status(git_log)
+
+        # the oldest b.py was a different file
+        self.assertEqual({'b.py': 3}, result)
+
+
 class TestRepoEvalCountOneCommitLog(unittest.TestCase):
     def setUp(self):
         self.e = eval_repo.RepoEvalCountOneCommitLog()
@@ -507,6 +572,168 @@ class TestRepoEvalCountOneCommitLog(unittest.TestCase):
             self.assertAlmostEqual(
                 expected_eval_dict[filename], expected_eval_dict[filename])
 
+    def test_convert_git_log_lines_to_table(self):
+        def gen_lines():
+            for k in range(3):
+                yield f'{self.e.commit_split_token}{k:040d}{self.e.field_split_token}a{self.e.field_split_token}a@b.c{self.e.field_split_token}date{self.e.field_split_token}subject\n'
+                yield f'1\t0\tex{k:02d}.py\n'
+                yield '2\t1\tcommon.py\n'
+                yield '\n'
+
+        # lines from a generator, one commit at a time
+        result_columns, result_index = self.e.convert_git_log_lines_to_table(gen_lines())
+
+        self.assertEqual(3, result_index[' total'])
+        self.assertEqual(1.5, result_index['common.py'])
+        self.assertEqual(0.5, result_index['ex01.py'])
+
+        # same as the whole text
+        self.assertEqual(
+            result_index, self.e.convert_git_log_to_table(''.join(gen_lines()))[1])
+
+    def test_gen_commits_z(self):
+        tokens = (
+            b'c' * 40 + b'\0Kang "Won" LEE\0a@b.c\0date\0subject \'quoted\'\0'
+            b'\n1\t0\t\xec\x9d\xb4\xeb\xa6\x84 with space.py\0'
+            b'0\t0\t\0old.py\0new.py\0'
+            + b'b' * 40 + b'\0a\0a@b.c\0date\0empty\0'
+            + b'a' * 40 + b'\0a\0a@b.c\0date\0first\0'
+            b'\n-\t-\tbinary.png\0'
+        ).split(b'\0')
+
+        result = list(self.e.gen_commits_z(tokens))
+
+        self.assertEqual(3, len(result))
+        self.assertEqual('Kang "Won" LEE', result[0][0]['author'])
+        self.assertEqual("subject 'quoted'", result[0][0]['subject'])
+        self.assertEqual(['\uc774\ub984 with space.py', 'new.py'], result[0][1])
+        self.assertEqual([], result[1][1])
+        self.assertEqual(['binary.png'], result[2][1])
+
+    def test_eval_repo_z(self):
+        with tempfile.TemporaryDirectory() as temp_folder:
+            def run_git(cmd_list):
+                tempf.run_git(cmd_list, temp_folder, user_name="Kang 'Won'")
+
+            run_git(['init'])
+            for filename in ('\uc774\ub984 with space.py', 'ex00.py'):
+                with open(os.path.join(temp_folder, filename), 'wt', encoding='utf-8') as f:
+                    f.write('print(1)\n')
+            run_git(['add', '.'])
+            run_git(['commit', '-m', 'first'])
+
+            with open(os.path.join(temp_folder, 'ex00.py'), 'at', encoding='utf-8') as f:
+                f.write('print(2)\n')
+            run_git(['commit', '-a', '-m', 'second'])
+
+            result = self.e.eval_repo_list(
+                [{'name': 'repo', 'path': temp_folder}], b_multiprocessing=False)
+
+        self.assertEqual(2, result['repo'][' total'])
+        self.assertEqual(0.5, result['repo']['\uc774\ub984 with space.py'])
+        self.assertEqual(1.5, result['repo']['ex00.py'])
+        self.assertFalse(result.is_backslash_in_header())
+
+    def test_eval_repo_incremental(self):
+        with tempfile.TemporaryDirectory() as temp_folder, tempfile.TemporaryDirectory() as cache_folder:
+            def run_git(cmd_list):
+                tempf.run_git(cmd_list, temp_folder)
+
+            def commit(filename_list, message):
+                for filename in filename_list:
+                    with open(os.path.join(temp_folder, filename), 'at', encoding='utf-8') as f:
+                        f.write(f'# {message}\n')
+                run_git(['add', '.'])
+                run_git(['commit', '-m', message])
+
+            def eval_row(revision=None):
+                evaluator = eval_repo.RepoEvalCountOneCommitLog()
+                evaluator.commit_count_cache_folder = cache_folder
+                evaluator.revision = revision
+                return evaluator.eval_repo_list(
+                    [{'name': 'repo', 'path': temp_folder}], b_multiprocessing=False)['repo']
+
+            def eval_repo_without_cache():
+                for filename in os.listdir(cache_folder):
+                    os.remove(os.path.join(cache_folder, filename))
+                return eval_row()
+
+            run_git(['init'])
+            commit(['ex00.py', 'ex01.py'], 'first')
+            commit(['ex00.py'], 'second')
+
+            first = eval_row()
+            self.assertEqual(1, len(os.listdir(cache_folder)))
+            self.assertEqual(2, first[' total'])
+            # nothing written into the repository
+            self.assertEqual('', tempf.run_git(['status', '--porcelain', '--ignored'], temp_folder).stdout)
+            self.assertFalse([name for name in os.listdir(os.path.join(temp_folder, '.git')) if 'pickle' in name])
+
+            # another revision does not reuse the cache of the work tree
+            self.assertEqual(1, eval_row('HEAD~1')[' total'])
+            self.assertEqual(2, len(os.listdir(cache_folder)))
+
+            # no new commit
+            self.assertEqual(first, eval_row())
+
+            # new commits only
+            commit(['ex01.py', 'ex02.py'], 'third')
+            incremental = eval_row()
+            self.assertEqual(3, incremental[' total'])
+            self.assertEqual(1, incremental['ex01.py'])
+            self.assertEqual(eval_repo_without_cache(), incremental)
+
+            # history rewritten : old tip no longer reachable
+            run_git(['reset', '--hard', 'HEAD~2'])
+            run_git(['reflog', 'expire', '--expire=now', '--all'])
+            commit(['ex03.py'], 'rewritten')
+            rewritten = eval_row()
+            self.assertEqual(2, rewritten[' total'])
+            self.assertNotIn('ex02.py', rewritten)
+            self.assertEqual(eval_repo_without_cache(), rewritten)
+
+    def test_eval_repo_failed_git_log(self):
+        class CommitLogFailing(eval_repo.RepoEvalCountOneCommitLog):
+            def get_git_cmd_z(self, *args, **kwargs):
+                return super().get_git_cmd_z(*args, **kwargs) + ['--no-such-option']
+
+        with tempfile.TemporaryDirectory() as temp_folder, tempfile.TemporaryDirectory() as cache_folder:
+            def run_git(cmd_list):
+                tempf.run_git(cmd_list, temp_folder)
+
+            def commit(message):
+                with open(os.path.join(temp_folder, 'ex00.py'), 'at', encoding='utf-8') as f:
+                    f.write(f'# {message}\n')
+                run_git(['add', '.'])
+                run_git(['commit', '-m', message])
+
+            def eval_row(evaluator):
+                evaluator.commit_count_cache_folder = cache_folder
+                return evaluator.eval_repo_list(
+                    [{'name': 'repo', 'path': temp_folder}], b_multiprocessing=False)['repo']
+
+            run_git(['init'])
+            commit('first')
+            self.assertEqual(1, eval_row(eval_repo.RepoEvalCountOneCommitLog())[' total'])
+
+            commit('second')
+            # not zero new commits
+            self.assertIn(' error', eval_row(CommitLogFailing()))
+
+            # the new commit is not lost
+            self.assertEqual(2, eval_row(eval_repo.RepoEvalCountOneCommitLog())[' total'])
+
+    def test_is_cache_usable_other_setting(self):
+        e = eval_repo.RepoEvalCountOneCommitLog(exclude_email_tuple=('temp@temp.net',))
+        e.repo_path = self.e.repo_path = os.getcwd()
+        cache = {'key': self.e.get_cache_key(), 'tip_list': [], 'count_dict': {}, 'n_commits': 0}
+
+        self.assertFalse(e.is_cache_usable(cache, []))
+
+        # same settings, another revision
+        self.e.revision = 'HEAD~1'
+        self.assertNotEqual(cache['key'], self.e.get_cache_key())
+
     def get_git_log_commit_line(self, sha, author, email, date, subject,):
         return (
             sha +
@@ -667,6 +894,28 @@ class TestRepoEvalCountOneCommitLog(unittest.TestCase):
         self.assertEqual(expected['subject'], result['subject'])
 
 
+class TestCommitCreditAccumulator(unittest.TestCase):
+    def test_same_as_fraction(self):
+        commit_list = [
+            ['a.py'], ['a.py', 'b.py'], ['a.py', 'b.py', 'c.py'],
+            ['b.py', 'c.py', 'd.py', 'e.py', 'f.py', 'g.py', 'h.py'], ['a.py', 'c.py'],
+        ]
+
+        expected = {}
+        for file_list in commit_list:
+            for filename in file_list:
+                expected[filename] = expected.get(filename, 0) + fractions.Fraction(1, len(file_list))
+
+        credit = eval_repo.CommitCreditAccumulator()
+        for file_list in commit_list:
+            credit.add_commit(file_list)
+
+        result = credit.get_credit_dict()
+
+        self.assertEqual(expected, result)
+        self.assertIsInstance(result['a.py'], fractions.Fraction)
+
+
 class TestRepoEvalCountOneCommitLogTimeSetting(unittest.TestCase):
     def setUp(self):
         # for consistency
@@ -770,6 +1019,384 @@ class TestRepoEvalPoundCounter(unittest.TestCase):
         self.assertSetEqual(expected, comments)
 
 
+class TestRepoEvalEvalCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_folder = tempfile.TemporaryDirectory()
+        self.repo_path = os.path.join(self.temp_folder.name, 'repo')
+
+        tempf.commit_files(
+            self.repo_path, {'ex00.py': '# comment\nprint(1)\n', 'ex01.py': '# one\n# two\n'}, 'first')
+
+        self.cache = eval_cache.EvalCache(os.path.join(self.temp_folder.name, 'cache.sqlite3'))
+
+    def tearDown(self):
+        self.cache.close()
+        del self.temp_folder
+
+    def eval_repo(self):
+        evaluator = eval_repo.RepoEvalPoundLineCounter()
+        evaluator.eval_cache = self.cache
+
+        counted_list = []
+        eval_python_file = evaluator.eval_python_file
+
+        def eval_python_file_counted(filename):
+            counted_list.append(os.path.basename(filename))
+            return eval_python_file(filename)
+
+        eval_python_file_counted.__name__ = 'eval_python_file'
+        evaluator.eval_python_file = eval_python_file_counted
+
+        result = evaluator.eval_repo_list([{'name': 'repo', 'path': self.repo_path}], b_multiprocessing=False)
+
+        return result['repo'], sorted(counted_list)
+
+    def test_unchanged_files_from_cache(self):
+        first, first_counted = self.eval_repo()
+        self.assertEqual(['ex00.py', 'ex01.py'], first_counted)
+        self.assertEqual(3, first[' total'])
+
+        second, second_counted = self.eval_repo()
+        self.assertEqual([], second_counted)
+        self.assertEqual(first, second)
+
+        # not committed yet
+        with open(os.path.join(self.repo_path, 'ex01.py'), 'at') as f:
+            f.write('# three\n')
+
+        third, third_counted = self.eval_repo()
+        self.assertEqual(['ex01.py'], third_counted)
+        self.assertEqual(4, third[' total'])
+
+
+class TestRepoEvalIterFolders(unittest.TestCase):
+    def setUp(self):
+        self.temp_folder = tempfile.TemporaryDirectory()
+        self.repo_path = os.path.join(self.temp_folder.name, 'repo')
+
+        for path in ('ex00.py', 'ex01/ex01.py', '.idea/idea.py', '__pycache__/cache.py'):
+            os.makedirs(os.path.dirname(os.path.join(self.repo_path, path)), exist_ok=True)
+            with open(os.path.join(self.repo_path, path), 'wt') as f:
+                f.write('# comment\n')
+
+        self.cwd_list = []
+
+    def tearDown(self):
+        del self.temp_folder
+
+    def eval_repo(self):
+        evaluator = eval_repo.RepoEvalPoundLineCounter()
+        eval_python_file = evaluator.eval_python_file
+
+        def eval_python_file_cwd(filename):
+            self.cwd_list.append(os.getcwd())
+            return eval_python_file(filename)
+
+        evaluator.eval_python_file = eval_python_file_cwd
+
+        return evaluator.eval_repo_list(
+            [{'name': 'repo', 'path': self.repo_path}], b_multiprocessing=False)['repo']
+
+    def test_git_index(self):
+        for cmd_list in (['init'], ['add', 'ex00.py', 'ex01', '.idea'], ['commit', '-m', 'first']):
+            tempf.run_git(cmd_list, self.repo_path)
+
+        result = self.eval_repo()
+
+        # untracked __pycache__ not in the index; .idea ignored
+        self.assertEqual([' total', './ex00.py', 'ex01/ex01.py'], sorted(result))
+        # no os.chdir()
+        self.assertEqual([os.getcwd()] * 2, self.cwd_list)
+
+    def test_not_git_repository(self):
+        result = self.eval_repo()
+
+        self.assertEqual([' total', './ex00.py', 'ex01/ex01.py'], sorted(result))
+        self.assertEqual([os.getcwd()] * 2, self.cwd_list)
+
+
+class TestRepoEvalPoundByteCounterExcludingRef(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.temp_folder = tempfile.TemporaryDirectory()
+        # reference.cfg in the current folder
+        os.chdir(self.temp_folder.name)
+
+        config = configparser.ConfigParser()
+        config['operation'] = {'folder': 'ref', 'comment_output_file': 'reference_comment.txt'}
+
+        with open('reference.cfg', 'wt') as f:
+            config.write(f)
+
+        with open('reference_comment.txt', 'wt', encoding='utf-8') as f:
+            f.write('# reference\n# template comment\n')
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        del self.temp_folder
+
+    def test_get_line_point(self):
+        evaluator = eval_repo.RepoEvalPoundByteCounterExcludingRef()
+
+        self.assertEqual(0, evaluator.get_line_point('# reference  '))
+        self.assertEqual(0, evaluator.get_line_point('# template comment'))
+        self.assertEqual(len('my comment'), evaluator.get_line_point('# my comment'))
+
+        # opened again in another process
+        self.assertEqual(0, pickle.loads(pickle.dumps(evaluator)).get_line_point('# reference'))
+
+        evaluator.comments_ref.close()
+
+
+class TestRepoEvalRevision(tempf.TempRepoTestBase):
+    def setUp(self):
+        super().setUp()
+
+        self.commit({'ex00.py': '# one\n', 'ex01/ex01.py': '# one\n'}, 'first')
+        self.git(['tag', 'due'])
+        self.commit({'ex00.py': '# one\n# two\n', 'ex02.py': '# one\n'}, 'second')
+
+        # not committed
+        with open(os.path.join(self.repo_path, 'ex00.py'), 'at') as f:
+            f.write('# three\n')
+
+    def eval_row(self, evaluator, revision):
+        evaluator.revision = revision
+
+        return evaluator.eval_repo_list(
+            [{'name': 'repo', 'path': self.repo_path}], b_multiprocessing=False)['repo']
+
+    def test_pound_count(self):
+        status = self.git(['status', '--porcelain']).stdout
+
+        self.assertEqual(
+            {' total': 2, './ex00.py': 1, 'ex01/ex01.py': 1},
+            self.eval_row(eval_repo.RepoEvalPoundLineCounter(), 'due'))
+        self.assertEqual(
+            {' total': 4, './ex00.py': 2, 'ex01/ex01.py': 1, './ex02.py': 1},
+            self.eval_row(eval_repo.RepoEvalPoundLineCounter(), 'master'))
+
+        # work tree as it was
+        self.assertEqual(status, self.git(['status', '--porcelain']).stdout)
+        self.assertEqual(5, self.eval_row(eval_repo.RepoEvalPoundLineCounter(), None)[' total'])
+
+    def test_composite(self):
+        pound_counter = eval_repo.RepoEvalPoundLineCounter()
+        commit_counter = eval_repo.RepoEvalCountCommitNameStatus()
+
+        composite = eval_repo.RepoEvalComposite([pound_counter, commit_counter])
+        composite.revision = 'due'
+
+        pound_row, commit_row = composite.eval_repo_list(
+            [{'name': 'repo', 'path': self.repo_path}], b_multiprocessing=False)
+
+        self.assertEqual(2, pound_row['repo'][' total'])
+        # commits until the revision only
+        self.assertEqual(1, commit_row['repo']['./ex00.py'])
+        # files of the revision removed
+        self.assertIsNone(composite.snapshot)
+        self.assertIsNone(pound_counter.snapshot)
+
+    def test_eval_cache(self):
+        evaluator = eval_repo.RepoEvalPoundLineCounter()
+        evaluator.eval_cache = eval_cache.EvalCache(os.path.join(self.temp_folder.name, 'cache.sqlite3'))
+
+        self.eval_row(evaluator, 'due')
+        # ex00.py & ex01/ex01.py of the revision are the same blob
+        self.assertEqual(1, len(evaluator.eval_cache))
+
+        evaluator.eval_cache.close()
+
+    def test_snapshot_update(self):
+        snapshot = eval_repo.RevisionSnapshot(self.repo_path, 'due')
+        folder = snapshot.get_path()
+
+        unchanged_path = os.path.join(folder, 'ex01', 'ex01.py')
+        unchanged_stat = eval_repo.get_stat(unchanged_path)
+
+        # made by an evaluation
+        with open(os.path.join(folder, 'output.txt'), 'wt') as f:
+            f.write('output\n')
+        os.makedirs(os.path.join(folder, 'made', 'sub'))
+
+        snapshot = eval_repo.RevisionSnapshot(self.repo_path, 'master', previous=snapshot)
+
+        # same folder with only the changes written
+        self.assertEqual(folder, snapshot.get_path())
+        self.assertEqual(unchanged_stat, eval_repo.get_stat(unchanged_path))
+        self.assertEqual(['ex00.py', 'ex01', 'ex02.py'], sorted(os.listdir(folder)))
+
+        with open(os.path.join(folder, 'ex00.py')) as f:
+            self.assertEqual('# one\n# two\n', f.read())
+
+        # a committed file changed by an evaluation, even of the same size
+        with open(os.path.join(folder, 'ex02.py'), 'wt') as f:
+            f.write('# two\n')
+        os.utime(os.path.join(folder, 'ex02.py'), ns=(0, 0))
+
+        snapshot = eval_repo.RevisionSnapshot(self.repo_path, 'master', previous=snapshot)
+        self.assertEqual(folder, snapshot.get_path())
+
+        with open(os.path.join(folder, 'ex02.py')) as f:
+            self.assertEqual('# one\n', f.read())
+
+        snapshot.close()
+        self.assertFalse(os.path.exists(folder))
+
+    def test_unknown_revision(self):
+        row = self.eval_row(eval_repo.RepoEvalPoundLineCounter(), 'no_such_branch')
+
+        self.assertIn(' error', row)
+
+    def test_unknown_date_revision(self):
+        # as progress.get_revision() documents; the header of git has spaces
+        revision = 'no_such_branch@{2019-04-01 23:59:59}'
+
+        with self.assertRaises(ValueError) as context:
+            eval_repo.RevisionSnapshot(self.repo_path, revision)
+
+        self.assertIn('no commit', str(context.exception))
+
+        row = self.eval_row(eval_repo.RepoEvalPoundLineCounter(), revision)
+        self.assertIn('no commit', row[' error'])
+
+
+class TestEvalRepoListCheckpoint(unittest.TestCase):
+    class PoundCounterFailing(eval_repo.RepoEvalPoundLineCounter):
+        # fails for the repositories in the list
+        fail_list = ('repo_b',)
+
+        def eval_repo(self, k_repo):
+            if k_repo[1]['name'] in self.fail_list:
+                raise ValueError('broken repository')
+            return super().eval_repo(k_repo)
+
+    class PoundCounterRowFailing(eval_repo.RepoEvalPoundLineCounter):
+        # fails outside of the exception handling of eval_repo_row()
+        def eval_repo_row(self, k_repo):
+            if 'repo_b' == k_repo[1]['name']:
+                raise ValueError('broken worker')
+            return super().eval_repo_row(k_repo)
+
+    def setUp(self):
+        self.temp_folder = tempfile.TemporaryDirectory()
+        self.repo_list = []
+
+        for name in ('repo_a', 'repo_b'):
+            path = os.path.join(self.temp_folder.name, name)
+            os.makedirs(path)
+            with open(os.path.join(path, 'ex00.py'), 'wt', encoding='utf-8') as f:
+                f.write('# one\n# two\nprint(1)\n')
+            self.repo_list.append({'name': name, 'path': path})
+
+        self.journal_path = os.path.join(self.temp_folder.name, 'a_pound_count.checkpoint')
+
+    def tearDown(self):
+        del self.temp_folder
+
+    def test_failed_row_and_resume(self):
+        cwd = os.getcwd()
+
+        result = self.PoundCounterFailing().eval_repo_list(
+            self.repo_list, b_multiprocessing=False,
+            checkpoint=checkpoint.Checkpoint(self.journal_path))
+
+        self.assertEqual(cwd, os.getcwd())
+
+        # failure recorded instead of stopping
+        self.assertEqual(2, result['repo_a'][' total'])
+        self.assertEqual(0, result['repo_b'][' total'])
+        self.assertIn('ValueError', result['repo_b'][' error'])
+
+        # resume : finished repository not evaluated again; failed one tried again
+        evaluator = self.PoundCounterFailing()
+        evaluator.fail_list = ('repo_a',)
+
+        resumed = evaluator.eval_repo_list(
+            self.repo_list, b_multiprocessing=False,
+            checkpoint=checkpoint.Checkpoint(self.journal_path, b_resume=True))
+
+        self.assertEqual(2, resumed['repo_a'][' total'])
+        self.assertEqual(2, resumed['repo_b'][' total'])
+        self.assertNotIn(' error', resumed['repo_b'])
+
+    def test_worker_exception(self):
+        evaluator = self.PoundCounterRowFailing()
+
+        result = evaluator.eval_repo_list(
+            self.repo_list, b_multiprocessing=True,
+            checkpoint=checkpoint.Checkpoint(self.journal_path))
+
+        # the other repository still evaluated
+        self.assertEqual(2, result['repo_a'][' total'])
+        self.assertIn('ValueError', result['repo_b'][' error'])
+
+        resumed = checkpoint.Checkpoint(self.journal_path, b_resume=True)
+        self.assertTrue(resumed.is_done('repo_a'))
+        self.assertFalse(resumed.is_done('repo_b'))
+
+
+class TestRepoEvalComposite(unittest.TestCase):
+    def setUp(self):
+        self.temp_folder = tempfile.TemporaryDirectory()
+        self.repo_list = []
+
+        for name in ('repo_a', 'repo_b'):
+            path = os.path.join(self.temp_folder.name, name)
+            tempf.commit_files(
+                path, {'ex00.py': '# one\n# two\nprint(1)\n', 'sub/ex01.py': '# three\nprint(2)\n'}, 'first commit')
+
+            self.repo_list.append({'name': name, 'path': path})
+
+    def tearDown(self):
+        del self.temp_folder
+
+    @staticmethod
+    def get_evaluator_list():
+        return [
+            eval_repo.RepoEvalCountOneCommitLog(),
+            eval_repo.RepoEvalPoundLineCounter(),
+            eval_repo.RepoEvalRunEach(sys.executable),
+        ]
+
+    def test_same_as_separate(self):
+        cwd = os.getcwd()
+
+        composite = eval_repo.RepoEvalComposite(self.get_evaluator_list())
+        result_list = composite.eval_repo_list(self.repo_list, b_multiprocessing=False)
+
+        self.assertEqual(cwd, os.getcwd())
+
+        for evaluator, result in zip(self.get_evaluator_list(), result_list):
+            expected = evaluator.eval_repo_list(self.repo_list, b_multiprocessing=False)
+
+            self.assertEqual(expected.index, result.index, msg=evaluator.get_class_name())
+            self.assertEqual(set(expected.column), set(result.column))
+
+        self.assertEqual(3, result_list[1]['repo_a'][' total'])
+        self.assertEqual({'stdout': 1, 'stderr': 0}, result_list[2]['repo_b']['sub/ex01.py'])
+
+    def test_multiprocessing(self):
+        composite = eval_repo.RepoEvalComposite(self.get_evaluator_list())
+
+        expected_list = composite.eval_repo_list(self.repo_list, b_multiprocessing=False)
+        result_list = composite.eval_repo_list(self.repo_list, b_multiprocessing=True)
+
+        for expected, result in zip(expected_list, result_list):
+            self.assertEqual(expected.index, result.index)
+
+    def test_eval_repo_row_compact(self):
+        evaluator = eval_repo.RepoEvalPoundLineCounter()
+
+        for k_repo in enumerate(self.repo_list):
+            repo_name, row_dict = evaluator.eval_repo_row(k_repo)
+
+            self.assertEqual(k_repo[1]['name'], repo_name)
+            self.assertEqual(' total', min(row_dict))
+            # nothing accumulates in the evaluator
+            self.assertFalse(evaluator.table.index)
+
+
 class TestRepoEvalRunEachBase(unittest.TestCase):
     config_filename = 'test_run_each.cfg'
 
@@ -834,6 +1461,132 @@ class TestRepoEvalRunEach(TestRepoEvalRunEachBase):
                     self.assertTrue(msgo, msg='\n{file}\nstderr : {stderr}'.format(
                         file=py_file, stderr=msge))
 
+    def test_max_concurrent_scripts(self):
+        with tempfile.TemporaryDirectory() as temp_folder:
+            repo_list = []
+
+            for k in range(4):
+                repo_path = os.path.join(temp_folder, f'repo{k}')
+                os.mkdir(repo_path)
+
+                with open(os.path.join(repo_path, 'sleep.py'), 'wt') as f:
+                    f.write(
+                        'import os, time\n'
+                        'start = time.time()\n'
+                        'time.sleep(0.2)\n'
+                        f'open(os.path.join({temp_folder!r}, "{k}.txt"), "w").write(f"{{start}} {{time.time()}}")\n'
+                    )
+
+                repo_list.append({'name': f'repo{k}', 'path': repo_path})
+
+            evaluator = eval_repo.RepoEvalRunEach(
+                self.config['operation']['python_path'], max_concurrent_scripts=1)
+
+            result = evaluator.eval_repo_list(repo_list)
+
+            interval_list = []
+            for k in range(len(repo_list)):
+                with open(os.path.join(temp_folder, f'{k}.txt')) as f:
+                    interval_list.append(tuple(float(t) for t in f.read().split()))
+
+        self.assertEqual(len(repo_list), len(result.index))
+
+        # one script at a time
+        interval_list.sort()
+        for before, after in zip(interval_list[:-1], interval_list[1:]):
+            self.assertLessEqual(before[1], after[0])
+
+    def test_run_script_killed(self):
+        with tempfile.TemporaryDirectory() as temp_folder:
+            with open(os.path.join(temp_folder, 'spin.py'), 'wt') as f:
+                f.write('while True:\n    pass\n')
+
+            evaluator = eval_repo.RepoEvalRunEach(
+                self.config['operation']['python_path'], timeout_sec=10, limit_dict={'cpu_sec': 1})
+
+            cwd = os.getcwd()
+            os.chdir(temp_folder)
+            try:
+                result = evaluator.run_script('spin.py')
+            finally:
+                os.chdir(cwd)
+
+        self.assertEqual('cpu time', result['killed'])
+        self.assertNotIn('timeout', result)
+
+    def test_compile_file_in_process(self):
+        with tempfile.TemporaryDirectory() as temp_folder:
+            case_dict = {
+                'pass.py': 'print(1)\n'.encode('utf-8'),
+                'syntax_error.py': 'print(1\n'.encode('utf-8'),
+                'return_outside.py': 'return 1\n'.encode('utf-8'),
+                'cp949.py': '# -*- coding: cp949 -*-\nprint("\ud55c\uae00")\n'.encode('cp949'),
+                'null.py': b'print(1)\0\n',
+            }
+
+            for filename, source in case_dict.items():
+                file_path = os.path.join(temp_folder, filename)
+
+                with open(file_path, 'wb') as f:
+                    f.write(source)
+
+                # same as `python -m py_compile`
+                self.assertEqual(
+                    self.e.compile_file_subprocess(file_path), self.e.compile_file(file_path), msg=filename)
+
+    def test_compile_file_other_interpreter(self):
+        with tempfile.TemporaryDirectory() as temp_folder:
+            # another path to python : may be another version
+            python_path = os.path.join(temp_folder, 'python_wrapper')
+            with open(python_path, 'wt') as f:
+                f.write(f'#!/bin/sh\nexec "{sys.executable}" "$@"\n')
+            os.chmod(python_path, 0o755)
+
+            file_path = os.path.join(temp_folder, 'pass.py')
+            with open(file_path, 'wt') as f:
+                f.write('print(1)\n')
+
+            evaluator = eval_repo.RepoEvalRunEach(python_path)
+            subprocess_list = []
+            compile_file_subprocess = evaluator.compile_file_subprocess
+
+            def compile_file_subprocess_counted(filename):
+                subprocess_list.append(filename)
+                return compile_file_subprocess(filename)
+
+            evaluator.compile_file_subprocess = compile_file_subprocess_counted
+
+            self.assertTrue(evaluator.compile_file(file_path)['grammar pass'])
+            self.assertEqual([file_path], subprocess_list)
+
+    def test_run_script_timeout(self):
+        e = eval_repo.RepoEvalRunEach(
+            self.config['operation']['python_path'], timeout_sec=1, max_output_bytes=100)
+
+        cwd = os.getcwd()
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            os.chdir(temp_dir)
+
+            try:
+                with open('endless.py', 'w', encoding='utf-8') as script_file:
+                    script_file.write(
+                        'while True:\n'
+                        '    print("again and again")\n'
+                    )
+
+                result = e.run_script('endless.py')
+
+                os.chdir(cwd)
+            except BaseException as exception:
+                os.chdir(cwd)
+
+                raise exception
+
+        self.assertTrue(result['timeout'])
+        self.assertTrue(result['truncated'])
+        self.assertLessEqual(result['stdout'], 100)
+
     def test_get_arguments_ex23(self):
 
         with tempfile.TemporaryDirectory(prefix='ex23') as folder_name:
@@ -1032,6 +1785,70 @@ class TestRepoEvalRunEachSkipSome(TestRepoEvalRunEachBase):
         self.assertFalse(
             result, msg='\ntoktype, tok, start, end, line = %r' % str(result))
 
+    def test_file_facts(self):
+        txt = ('import sys\n'
+               'script, first, second = sys.argv  # three\n'
+               '# while in a comment\n'
+               'print(first, second)\n')
+        filename = self.prepare_input_file(txt)
+
+        file_facts = eval_repo.FileFacts(filename)
+
+        self.assertEqual(txt, file_facts.txt)
+        self.assertEqual(eval_repo.get_argn(filename), file_facts.get_argn())
+        self.assertEqual(3, file_facts.get_argn())
+        self.assertFalse(file_facts.has_token('while'))
+        self.assertEqual('print', file_facts.has_token('print')[1])
+
+        os.remove(filename)
+
+    def test_file_facts_token_error(self):
+        filename = self.prepare_input_file('script, first = argv\nprint((first)\n')
+
+        file_facts = eval_repo.FileFacts(filename)
+
+        self.assertTrue(file_facts.b_token_error)
+        self.assertEqual(eval_repo.get_argn(filename), file_facts.get_argn())
+
+        os.remove(filename)
+
+    def test_eval_file_base_read_once(self):
+        filename = self.prepare_input_file(
+            'from sys import argv\nscript, first = argv\nprint(first)\n')
+        # eval_file_base() runs only .py files
+        os.replace(filename, filename + '.py')
+        filename += '.py'
+
+        read_list = []
+
+        def open_counted(file, *args, **kwargs):
+            read_list.append(file)
+            return open(file, *args, **kwargs)
+
+        def no_more_reading(*args):
+            raise AssertionError('already read')
+
+        # shadows the builtin open() within eval_repo only
+        eval_repo.open = open_counted
+        get_argn = eval_repo.get_argn
+        eval_repo.get_argn = no_more_reading
+        read_b_decode = eval_repo.iter_repo.read_b_decode
+        eval_repo.iter_repo.read_b_decode = no_more_reading
+        self.e.is_readable = no_more_reading
+        # the grammar check would start python otherwise
+        self.e.b_same_interpreter = True
+
+        try:
+            result = self.e.eval_file_base(filename)
+        finally:
+            del eval_repo.open
+            eval_repo.get_argn = get_argn
+            eval_repo.iter_repo.read_b_decode = read_b_decode
+            os.remove(filename)
+
+        self.assertEqual([filename], read_list)
+        self.assertEqual('argv', result['type'])
+
     def prepare_input_file(self, txt):
         # create a temporary file in a secure manner
         fd, filename = tempfile.mkstemp(text=True)
@@ -1049,7 +1866,7 @@ class TestRepoEvalRunEachSkipSome(TestRepoEvalRunEachBase):
         filename = self.prepare_input_file(txt)
 
         # function under test
-        result = self.e.is_input(filename)
+        result = eval_repo.FileFacts(filename).has_token('input')
 
         # delete temporary file after test
         os.remove(filename)
@@ -1090,6 +1907,29 @@ class TestRepoEvalRunEachSkipSomeLastCommit(TestRepoEvalRunEachBase):
             raise IOError('Unable to obtain git log\nmsgo = {log!r}\nmsge = {err!r}'.format(
                 log=msgo, err=msge))
 
+    def test_eval_repo_last_sha(self):
+        with tempfile.TemporaryDirectory() as temp_folder:
+            os.mkdir(os.path.join(temp_folder, 'ex01'))
+
+            for k, path in enumerate(('ex00.py', 'ex01/ex01.py', 'ex00.py')):
+                with open(os.path.join(temp_folder, path), 'at') as f:
+                    f.write(f'print({k})\n')
+
+                for cmd_list in (['init'], ['add', '.'], ['commit', '-m', f'commit {k}']):
+                    tempf.run_git(cmd_list, temp_folder)
+
+            result = self.e.eval_repo_list([{'name': 'repo', 'path': temp_folder}], b_multiprocessing=False)
+
+            cwd = os.getcwd()
+            os.chdir(temp_folder)
+            try:
+                expected = {path: git.get_last_sha(path=path) for path in ('ex00.py', 'ex01/ex01.py')}
+            finally:
+                os.chdir(cwd)
+
+        self.assertEqual(expected['ex00.py'], result['repo']['./ex00.py']['sha'])
+        self.assertEqual(expected['ex01/ex01.py'], result['repo']['ex01/ex01.py']['sha'])
+
 
 if "__main__" == __name__:
     unittest.main()
@@ -1,9 +1,12 @@
+import asyncio
 import os
+import pickle
 import re
 import shutil
 import subprocess
 import sys
 import tempfile
+import time
 import unittest
 
 
@@ -262,6 +265,8 @@ class TestGitCheckout(unittest.TestCase):
         self.cwd = os.getcwd()
 
         os.chdir(self.temp_folder.name)
+        # even if setUp() fails
+        self.addCleanup(os.chdir, self.cwd)
 
         if self.get_git_version_string().startswith('2.23'):
             self.git_init_2_23()
@@ -495,6 +500,8 @@ class TestGitCheckoutDate(unittest.TestCase):
         self.cwd = os.getcwd()
 
         os.chdir(self.temp_folder.name)
+        # even if setUp() fails
+        self.addCleanup(os.chdir, self.cwd)
 
         subprocess.run(['git', 'init'], cwd=self.temp_folder.name)
         subprocess.run(['git', 'config', 'user.name', 'temp'],
@@ -551,5 +558,375 @@ class TestGitCheckoutDate(unittest.TestCase):
                          msg=f"stdout:\n{r.stdout}\nstderr:\n{r.stderr}")
 
 
+class TestObjectReader(unittest.TestCase):
+    def setUp(self):
+        self.temp_folder = tempfile.TemporaryDirectory()
+
+        subprocess.run(['git', 'init'], cwd=self.temp_folder.name)
+        subprocess.run(['git', 'config', 'user.name', 'temp'],
+                       cwd=self.temp_folder.name)
+        subprocess.run(['git', 'config', 'user.email',
+                        'temp@temp.net'], cwd=self.temp_folder.name)
+
+        self.temp_file_local_name = 'temp.txt'
+        self.content = 'tempfile\n두번째 줄\n'.encode('utf-8')
+
+        with open(os.path.join(self.temp_folder.name, self.temp_file_local_name), 'wb') as f:
+            f.write(self.content)
+
+        subprocess.run(['git', 'add', self.temp_file_local_name],
+                       cwd=self.temp_folder.name)
+        subprocess.run(['git', 'commit', '-m', 'first commit'],
+                       cwd=self.temp_folder.name)
+
+        self.head_sha = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=self.temp_folder.name, encoding='utf-8').strip()
+
+    def tearDown(self):
+        del self.temp_folder
+
+    def test_read_blob(self):
+        with git.ObjectReader(self.temp_folder.name) as reader:
+            result = reader.read_blob(f'HEAD:{self.temp_file_local_name}')
+
+        self.assertEqual(self.content, result)
+
+    def test_resolve_and_missing(self):
+        with git.ObjectReader(self.temp_folder.name) as reader:
+            self.assertEqual(self.head_sha, reader.resolve('HEAD'))
+            self.assertIsNone(reader.resolve('HEAD:no_such_file.txt'))
+            # session still usable after a missing object
+            self.assertEqual('commit', reader.get_info('HEAD')[1])
+            self.assertIsNone(reader.read_blob('HEAD'))
+
+    def test_missing_with_spaces(self):
+        with git.ObjectReader(self.temp_folder.name) as reader:
+            # `HEAD:no file.py missing` has 3 words as `<sha> <type> <size>`
+            self.assertIsNone(reader.resolve('HEAD:no file.py'))
+            self.assertIsNone(reader.resolve('HEAD:no such file.py'))
+            self.assertIsNone(reader.read_blob('HEAD:no such file.py'))
+            self.assertIsNone(reader.read_blob('HEAD:a b'))
+            self.assertEqual(self.content, reader.read_blob(f'HEAD:{self.temp_file_local_name}'))
+
+    def test_iter_git_lines(self):
+        result = list(git.iter_git_lines(['log', '--format=%H'], cwd=self.temp_folder.name))
+
+        self.assertEqual([self.head_sha + '\n'], result)
+
+        # closing early ends git
+        line_iter = git.iter_git_lines(['rev-list', '--all'], cwd=self.temp_folder.name)
+        self.assertEqual(self.head_sha + '\n', next(line_iter))
+        line_iter.close()
+
+    def test_iter_git_tokens(self):
+        result = list(git.iter_git_tokens(
+            ['ls-files', '-z'], cwd=self.temp_folder.name))
+
+        self.assertEqual([self.temp_file_local_name.encode()], result)
+
+    def test_iter_git_failed(self):
+        # not an empty history
+        with self.assertRaises(subprocess.CalledProcessError) as context:
+            list(git.iter_git_lines(['log', 'no_such_branch', '--'], cwd=self.temp_folder.name))
+
+        self.assertIn(b'no_such_branch', context.exception.stderr)
+
+        with self.assertRaises(subprocess.CalledProcessError):
+            list(git.iter_git_tokens(['log', '-z', 'no_such_branch', '--'], cwd=self.temp_folder.name))
+
+    def test_pool_cap(self):
+        with git.ObjectReaderPool(max_sessions=1) as pool:
+            reader = pool.get(self.temp_folder.name)
+            self.assertEqual(self.head_sha, reader.resolve('HEAD'))
+
+            with tempfile.TemporaryDirectory() as other_folder:
+                subprocess.run(['git', 'init'], cwd=other_folder)
+                pool.get(other_folder)
+
+                self.assertEqual(1, len(pool))
+                # the least recently used session was closed
+                self.assertIsNone(reader.p_check)
+
+
+class TestRefSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.temp_folder = tempfile.TemporaryDirectory()
+
+        subprocess.run(['git', 'init'], cwd=self.temp_folder.name)
+        subprocess.run(['git', 'config', 'user.name', 'temp'],
+                       cwd=self.temp_folder.name)
+        subprocess.run(['git', 'config', 'user.email',
+                        'temp@temp.net'], cwd=self.temp_folder.name)
+        subprocess.run(['git', 'commit', '--allow-empty', '-m', 'first commit'],
+                       cwd=self.temp_folder.name)
+        subprocess.run(['git', 'tag', 'light'], cwd=self.temp_folder.name)
+        subprocess.run(['git', 'tag', '-a', 'annotated', '-m', 'annotated'],
+                       cwd=self.temp_folder.name)
+        subprocess.run(['git', 'commit', '--allow-empty', '-m', 'second commit'],
+                       cwd=self.temp_folder.name)
+
+        self.first_sha = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD~1'], cwd=self.temp_folder.name, encoding='utf-8').strip()
+        self.head_sha = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=self.temp_folder.name, encoding='utf-8').strip()
+
+        self.cwd_backup = os.getcwd()
+        git.invalidate_ref_snapshot()
+
+    def tearDown(self):
+        os.chdir(self.cwd_backup)
+        git.invalidate_ref_snapshot()
+        del self.temp_folder
+
+    def test_indexes(self):
+        snapshot = git.RefSnapshot(self.temp_folder.name)
+
+        # annotated tag dereferenced to its commit
+        self.assertEqual(
+            {'annotated': self.first_sha, 'light': self.first_sha},
+            snapshot.tag_dict,
+        )
+        self.assertEqual(['annotated', 'light'], sorted(snapshot.get_tags(self.first_sha)))
+
+        self.assertTrue(snapshot.has_a_tag(self.first_sha))
+        self.assertTrue(snapshot.has_a_tag('light'))
+        self.assertFalse(snapshot.has_a_tag(self.head_sha))
+        self.assertEqual(self.first_sha, snapshot.resolve('tags/annotated'))
+        # unknown names are taken as sha
+        self.assertEqual(self.head_sha, snapshot.resolve(self.head_sha))
+
+    def test_cache_invalidated_by_tag(self):
+        os.chdir(self.temp_folder.name)
+
+        snapshot = git.get_ref_snapshot()
+        self.assertIs(snapshot, git.get_ref_snapshot(self.temp_folder.name))
+        self.assertFalse(git.has_a_tag(self.head_sha))
+
+        git.tag('new_tag')
+        self.assertTrue(git.has_a_tag(self.head_sha))
+
+        git.delete_tag('new_tag')
+        self.assertFalse(git.has_a_tag(self.head_sha))
+
+    def test_get_refs_tag_deref(self):
+        os.chdir(self.temp_folder.name)
+
+        self.assertEqual(
+            [('annotated', self.first_sha), ('light', self.first_sha)],
+            sorted(git.get_refs_tag_deref()),
+        )
+
+
+class TestLastShaDict(unittest.TestCase):
+    def setUp(self):
+        self.temp_folder = tempfile.TemporaryDirectory()
+
+        for cmd_list in (['init'], ['config', 'user.name', 'temp'], ['config', 'user.email', 'temp@temp.net']):
+            subprocess.run(['git'] + cmd_list, cwd=self.temp_folder.name)
+
+        os.mkdir(os.path.join(self.temp_folder.name, 'sub folder'))
+
+        self.path_list = ['a.py', 'sub folder/b.py', 'sub folder/한글.py']
+
+        for k, path_list in enumerate((self.path_list, self.path_list[:1], self.path_list[1:2], [])):
+            for path in path_list:
+                with open(os.path.join(self.temp_folder.name, path), 'at', encoding='utf-8') as f:
+                    f.write(f'print({k})\n')
+
+            subprocess.run(['git', 'add', '.'], cwd=self.temp_folder.name)
+            subprocess.run(['git', 'commit', '--allow-empty', '-m', f'commit {k}'], cwd=self.temp_folder.name)
+
+        with open(os.path.join(self.temp_folder.name, 'untracked.py'), 'wt') as f:
+            f.write('print()\n')
+
+        self.cwd_backup = os.getcwd()
+
+    def tearDown(self):
+        os.chdir(self.cwd_backup)
+        del self.temp_folder
+
+    def test_same_as_get_last_sha(self):
+        last_sha_dict = git.get_last_sha_dict(repo_path=self.temp_folder.name)
+
+        self.assertEqual(sorted(self.path_list), sorted(last_sha_dict))
+
+        os.chdir(self.temp_folder.name)
+
+        for path in self.path_list + ['untracked.py']:
+            self.assertEqual(git.get_last_sha(path=path), last_sha_dict.get(path, 'N/A'), msg=path)
+
+    def test_merge(self):
+        date_list = []
+
+        def git_cmd(*cmd_list):
+            # one commit a minute not to depend on the order of the same time
+            date_list.append(f'2019-03-01 12:{len(date_list):02d}:00')
+            env = dict(os.environ, GIT_AUTHOR_DATE=date_list[-1], GIT_COMMITTER_DATE=date_list[-1])
+            subprocess.run(['git'] + list(cmd_list), cwd=self.temp_folder.name, capture_output=True, env=env)
+
+        def commit(path, message):
+            with open(os.path.join(self.temp_folder.name, path), 'at', encoding='utf-8') as f:
+                f.write(f'# {message}\n')
+            git_cmd('add', path)
+            git_cmd('commit', '-m', message)
+
+        git_cmd('branch', '-M', 'master')
+        git_cmd('branch', 'ours_side')
+
+        # changes of the side branch of an "ours" merge are not in the merge, even if newer
+        commit('sub folder/b.py', 'master')
+        git_cmd('checkout', 'ours_side')
+        commit('sub folder/b.py', 'ours side')
+        commit('f.py', 'ours side new file')
+        git_cmd('checkout', 'master')
+        git_cmd('merge', '-s', 'ours', 'ours_side', '-m', 'ours merge')
+
+        # changes of the side branch of a usual merge are
+        git_cmd('checkout', '-b', 'side', 'HEAD~1')
+        commit('sub folder/한글.py', 'side')
+        git_cmd('checkout', 'master')
+        commit('a.py', 'master again')
+        git_cmd('merge', 'side', '-m', 'merge')
+
+        last_sha_dict = git.get_last_sha_dict(repo_path=self.temp_folder.name)
+
+        os.chdir(self.temp_folder.name)
+
+        for path in self.path_list:
+            self.assertEqual(git.get_last_sha(path=path), last_sha_dict.get(path, 'N/A'), msg=path)
+
+        # only the files of the revision
+        self.assertEqual(sorted(self.path_list), sorted(last_sha_dict))
+
+    def test_get_index_folder_dict(self):
+        result = git.get_index_folder_dict(self.temp_folder.name)
+
+        # untracked.py not in the index
+        self.assertEqual({'.': ['a.py'], 'sub folder': ['b.py', '한글.py']}, result)
+
+    def test_full(self):
+        last_sha_dict = git.get_last_sha_dict(b_full=True, repo_path=self.temp_folder.name)
+
+        os.chdir(self.temp_folder.name)
+        self.assertEqual(git.get_last_sha(b_full=True, path='a.py'), last_sha_dict['a.py'])
+
+
+class TestGitAsync(unittest.TestCase):
+    def test_git_async(self):
+        msgo, msge = asyncio.run(git.git_async(["config"]))
+        expected = "usage: git config"
+        self.assertIn(expected, msgo + msge)
+
+    def test_git_async_semaphore(self):
+        async def run_many():
+            semaphore = git.get_async_semaphore(2)
+            return await asyncio.gather(
+                *[git.git_async(['--version'], semaphore=semaphore) for _ in range(4)]
+            )
+
+        result_list = asyncio.run(run_many())
+
+        self.assertEqual(4, len(result_list))
+        for msgo, _ in result_list:
+            self.assertTrue(msgo.startswith('git version'), msg=msgo)
+
+    def test_run_command_async_cwd_input(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            msgo, msge = asyncio.run(git.run_command_async(
+                (sys.executable, '-c', 'import os; print(os.getcwd()); print(input())'),
+                b_verbose=False, in_txt='abc\n', cwd=temp_dir,
+            ))
+
+            self.assertFalse(msge, msg=msge)
+            self.assertEqual(
+                [os.path.realpath(temp_dir), 'abc'],
+                [os.path.realpath(msgo.splitlines()[0]), msgo.splitlines()[1]]
+            )
+
+
+class TestRunCommandBounded(unittest.TestCase):
+    def test_timeout_kills_process_group(self):
+        # a child process of the script would keep the pipes open if not killed
+        script = (
+            'import subprocess, sys, time\n'
+            'subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])\n'
+            'print("started", flush=True)\n'
+            'time.sleep(30)\n'
+        )
+
+        start_sec = time.time()
+        result = git.run_command(
+            (sys.executable, '-c', script), b_verbose=False, timeout_sec=1)
+        elapsed_sec = time.time() - start_sec
+
+        self.assertTrue(result.b_timeout)
+        self.assertLess(elapsed_sec, 20)
+        self.assertIn('started', result.stdout)
+        self.assertNotEqual(0, result.returncode)
+
+    def test_child_holds_pipes_without_timeout(self):
+        # the command ends but its child process keeps stdout open
+        script = (
+            'import subprocess, sys\n'
+            'subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])\n'
+            'print("parent", flush=True)\n'
+        )
+
+        start_sec = time.time()
+        result = git.run_command(
+            (sys.executable, '-c', script), b_verbose=False, max_output_bytes=1000)
+
+        self.assertLess(time.time() - start_sec, 20)
+        self.assertEqual('parent\n', result.stdout)
+        self.assertEqual(0, result.returncode)
+
+    @unittest.skipIf('nt' == os.name, 'no os.setsid()')
+    def test_child_out_of_process_group(self):
+        # not killed with the process group; the caller still returns
+        script = (
+            'import os, subprocess, sys\n'
+            'subprocess.Popen([sys.executable, "-c", "import time; time.sleep(10)"], preexec_fn=os.setsid)\n'
+            'print("parent", flush=True)\n'
+        )
+
+        start_sec = time.time()
+        result = git.run_command(
+            (sys.executable, '-c', script), b_verbose=False, max_output_bytes=1000)
+
+        self.assertLess(time.time() - start_sec, 9)
+        self.assertEqual('parent\n', result.stdout)
+
+    def test_output_cap(self):
+        script = 'import sys\nfor i in range(100000):\n    print("0123456789")\nsys.exit(3)\n'
+
+        msgo, msge = result = git.run_command(
+            (sys.executable, '-c', script), b_verbose=False, max_output_bytes=1000)
+
+        self.assertTrue(result.b_truncated)
+        self.assertFalse(result.b_timeout)
+        self.assertEqual(1000, len(msgo.encode('utf-8')))
+        self.assertFalse(msge)
+        self.assertEqual(3, result.returncode)
+
+    def test_input_and_newline(self):
+        script = 'import sys\nsys.stdout.buffer.write(input().encode() + b"\\r\\n")\n'
+
+        result = git.run_command(
+            (sys.executable, '-c', script), b_verbose=False, in_txt='abc\n', timeout_sec=30)
+
+        self.assertEqual('abc\n', result.stdout)
+        self.assertEqual(0, result.returncode)
+        self.assertFalse(result.b_truncated)
+
+    def test_result_pickle(self):
+        result = git.CommandResult('out', 'err', -9, True, False)
+
+        loaded = pickle.loads(pickle.dumps(result))
+
+        self.assertEqual(('out', 'err'), tuple(loaded))
+        self.assertEqual(-9, loaded.returncode)
+        self.assertTrue(loaded.b_timeout)
+
+
 if "__main__" == __name__:
     unittest.main()
@@ -44,6 +44,17 @@ class TestGettingConfigFilename(unittest.TestCase):
         self.assertEqual(expected, result)
 
 
+    def test_get_cfg_filename_from_argv_resume(self):
+        input_list = ['--resume', 'this']
+
+        # function under test
+        result = progress.get_cfg_filename_from_argv(input_list)
+
+        self.assertEqual('this', result)
+        self.assertTrue(progress.is_resume(input_list))
+        self.assertFalse(progress.is_resume(['this']))
+
+
 class TestGettingConfig(unittest.TestCase):
     def setUp(self):
         self.config_filename = tempf.get_tempfile_name('.cfg')
@@ -72,6 +83,13 @@ class TestGettingConfig(unittest.TestCase):
         self.assertIn('config', result)
         self.assertIn('sample', result['config'])
 
+    def test_get_config_from_argv_resume(self):
+        input_list = [self.config_filename, '--resume']
+        result = progress.get_config_from_argv(input_list)
+
+        self.assertIn('sample', result['config'])
+        self.assertEqual('True', result['operation']['resume'])
+
 
 if "__main__" == __name__:
     unittest.main()
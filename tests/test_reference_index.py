@@ -0,0 +1,107 @@
+import hashlib
+import multiprocessing
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+import reference_index
+
+
+def is_in_worker(index_comment):
+    index, comment = index_comment
+    return comment in index
+
+
+class TestReferenceIndex(unittest.TestCase):
+    def setUp(self):
+        self.temp_folder = tempfile.TemporaryDirectory()
+        self.comment_filename = os.path.join(self.temp_folder.name, 'reference_comment.txt')
+
+        self.comment_list = ['# comment %04d' % i for i in range(1000)] + ['# 한글 주석', '#']
+
+        self.write_comments(self.comment_list + ['  # comment 0000  '])
+
+    def tearDown(self):
+        del self.temp_folder
+
+    def write_comments(self, comment_list):
+        with open(self.comment_filename, 'wt', encoding='utf-8') as f:
+            for comment in comment_list:
+                f.write(comment + '\n')
+
+    def test_contains(self):
+        with reference_index.open_reference_index(self.comment_filename) as index:
+            self.assertEqual(len(self.comment_list), len(index))
+
+            for comment in self.comment_list:
+                self.assertIn(comment, index)
+
+            for comment in ('# comment 1000', '# comment', '', '# 한글'):
+                self.assertNotIn(comment, index)
+
+            self.assertEqual(sorted(self.comment_list), sorted(index))
+
+    def test_digest(self):
+        with reference_index.open_reference_index(self.comment_filename) as index:
+            # same as before the index
+            self.assertEqual(
+                hashlib.sha1('\n'.join(sorted(self.comment_list)).encode('utf-8')).hexdigest(),
+                index.digest)
+
+    def test_rebuild_if_older(self):
+        with reference_index.open_reference_index(self.comment_filename) as index:
+            self.assertNotIn('# new comment', index)
+
+        self.write_comments(self.comment_list + ['# new comment'])
+        # newer than the index
+        later = time.time() + 10
+        os.utime(self.comment_filename, (later, later))
+
+        with reference_index.open_reference_index(self.comment_filename) as index:
+            self.assertIn('# new comment', index)
+
+    def test_empty(self):
+        self.write_comments([])
+
+        with reference_index.open_reference_index(self.comment_filename) as index:
+            self.assertEqual(0, len(index))
+            self.assertNotIn('', index)
+            self.assertNotIn('# comment 0000', index)
+
+    def test_workers(self):
+        index = reference_index.open_reference_index(self.comment_filename)
+
+        # path only in the pickle
+        self.assertLess(len(pickle.dumps(index)), 1000)
+
+        with multiprocessing.Pool(2) as p:
+            result_list = p.map(is_in_worker, [(index, '# comment 0001'), (index, '# comment 9999')])
+
+        self.assertEqual([True, False], result_list)
+
+        index.close()
+
+    def test_not_index(self):
+        with self.assertRaises(ValueError):
+            reference_index.ReferenceIndex(self.comment_filename)
+
+
+class TestImport(unittest.TestCase):
+    def test_eval_repo_without_config(self):
+        # no regex_test.cfg in the current folder
+        with tempfile.TemporaryDirectory() as temp_folder:
+            p = subprocess.run(
+                [sys.executable, '-c', 'import eval_repo'], cwd=temp_folder, capture_output=True, encoding='utf-8',
+                env=dict(os.environ, PYTHONPATH=os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))))
+
+        self.assertEqual(0, p.returncode, msg=p.stderr)
+
+
+if "__main__" == __name__:
+    unittest.main()
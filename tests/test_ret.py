@@ -1,3 +1,4 @@
+import asyncio
 import os
 import shutil
 import stat
@@ -16,7 +17,10 @@ sys.path.insert(
     )
 )
 
+import checkpoint
 import regex_test as ret
+import tempf
+import update_manifest
 
 
 def onerror(func, path, exc_info):
@@ -150,5 +154,318 @@ class TestFetchAndReset(unittest.TestCase):
         os.chdir(self.cwd)
 
 
+class LocalOriginTestBase(unittest.TestCase):
+    """
+    A clone of a local origin; origin is one commit ahead
+    No network necessary
+    """
+
+    def setUp(self):
+        self.temp_folder = tempfile.TemporaryDirectory()
+
+        self.origin = os.path.join(self.temp_folder.name, 'origin')
+        self.clone = os.path.join(self.temp_folder.name, 'clone')
+
+        os.makedirs(self.origin)
+        self.run_git(['init'], self.origin)
+        self.run_git(['checkout', '-b', 'master'], self.origin)
+        self.commit_file(self.origin, 'first\n', 'first commit')
+
+        self.run_git(['clone', self.origin, self.clone], self.temp_folder.name)
+
+        self.expected_sha = self.commit_file(
+            self.origin, 'second\n', 'second commit')
+
+    def tearDown(self):
+        del self.temp_folder
+
+    @staticmethod
+    def run_git(cmd_list, cwd):
+        return tempf.run_git(cmd_list, cwd)
+
+    def commit_file(self, repo, content, message):
+        with open(os.path.join(repo, 'temp.txt'), 'a') as f:
+            f.write(content)
+        self.run_git(['add', 'temp.txt'], repo)
+        self.run_git(['commit', '-m', message], repo)
+
+        return self.run_git(['rev-parse', 'HEAD'], repo).stdout.strip()
+
+
+class TestFetchAndResetAsync(LocalOriginTestBase):
+    def test_fetch_and_reset_async(self):
+        cwd = os.getcwd()
+
+        asyncio.run(ret.fetch_and_reset_async(self.clone))
+
+        # current folder unchanged
+        self.assertEqual(cwd, os.getcwd())
+
+        result_sha = self.run_git(['rev-parse', 'HEAD'], self.clone).stdout.strip()
+
+        self.assertEqual(self.expected_sha, result_sha)
+
+    def test_clone_or_pull_repo_list_async(self):
+        section_folder = os.path.join(self.temp_folder.name, 'section')
+        os.makedirs(section_folder)
+
+        # local origin does not need a github id in the url
+        admin_id = ret.config['Admin']['id']
+        ret.config['Admin']['id'] = ''
+
+        try:
+            repo_list = asyncio.run(ret.clone_or_pull_repo_list_async(
+                [self.origin], section_folder, True, max_concurrency=2))
+        finally:
+            ret.config['Admin']['id'] = admin_id
+
+        self.assertEqual(1, len(repo_list))
+        self.assertEqual('origin', repo_list[0]['name'])
+
+        # cloned under the section folder
+        result_sha = self.run_git(
+            ['rev-parse', 'HEAD'], repo_list[0]['path']).stdout.strip()
+        self.assertEqual(self.expected_sha, result_sha)
+
+
+class TestTagAllRemoteBranches(LocalOriginTestBase):
+    def setUp(self):
+        super().setUp()
+
+        # second branch at the first commit
+        self.run_git(['branch', 'feature/a', 'HEAD~1'], self.origin)
+        self.run_git(['fetch', 'origin'], self.clone)
+
+    def get_tag_list(self):
+        return self.run_git(['tag'], self.clone).stdout.split()
+
+    def test_tag_all_remote_branches(self):
+        cwd = os.getcwd()
+
+        ret.tag_all_remote_branches(True, self.clone, {'name': 'clone'})
+
+        self.assertEqual(cwd, os.getcwd())
+
+        tag_list = self.get_tag_list()
+
+        # master and feature/a; origin/HEAD is the same commit as origin/master
+        self.assertEqual(2, len(tag_list), msg=tag_list)
+        self.assertTrue(any('__feature/a__' in tag for tag in tag_list), msg=tag_list)
+        self.assertTrue(any('__master__' in tag for tag in tag_list), msg=tag_list)
+
+        # already tagged commits are not tagged again
+        ret.tag_all_remote_branches(True, self.clone, {'name': 'clone'})
+        self.assertEqual(2, len(self.get_tag_list()))
+
+    def test_get_tag_instruction_list(self):
+        ref_list = [
+            ('refs/remotes/origin/HEAD', 'a' * 40, 'a' * 40, 'aaaaaaa'),
+            ('refs/remotes/origin/master', 'a' * 40, 'a' * 40, 'aaaaaaa'),
+            ('refs/remotes/origin/tagged', 'b' * 40, 'b' * 40, 'bbbbbbb'),
+            ('refs/tags/old', 'c' * 40, 'b' * 40, 'ccccccc'),
+        ]
+
+        result = ret.get_tag_instruction_list(ref_list, 'stamp')
+
+        self.assertEqual(
+            [f"create refs/tags/stamp__master__aaaaaaa {'a' * 40}"], result)
+
+
+class TestUpdateManifest(LocalOriginTestBase):
+    def setUp(self):
+        super().setUp()
+
+        # section folder with a clone named after the origin
+        self.section_folder = os.path.join(self.temp_folder.name, 'section')
+        os.makedirs(self.section_folder)
+        self.repo_path = os.path.join(self.section_folder, 'origin')
+        self.run_git(['clone', self.origin, self.repo_path], self.temp_folder.name)
+        self.run_git(['reset', '--hard', 'HEAD~1'], self.repo_path)
+
+    def update(self):
+        return ret.clone_or_pull_repo_list(
+            [self.origin], self.section_folder, b_multiprocessing=False)
+
+    def get_head(self):
+        return self.run_git(['rev-parse', 'HEAD'], self.repo_path).stdout.strip()
+
+    def test_skip_unchanged(self):
+        cwd = os.getcwd()
+
+        # no manifest yet : full update
+        repo_list = self.update()
+        self.assertFalse(repo_list[0].get('b_unchanged', False))
+        self.assertEqual(self.expected_sha, self.get_head())
+
+        manifest = update_manifest.UpdateManifest(self.section_folder)
+        self.assertEqual(
+            {'refs/heads/master': self.expected_sha}, manifest.get_remote_refs('origin'))
+
+        # nobody pushed
+        repo_list = self.update()
+        self.assertTrue(repo_list[0]['b_unchanged'])
+
+        # a new commit in the origin
+        new_sha = self.commit_file(self.origin, 'third\n', 'third commit')
+        repo_list = self.update()
+        self.assertFalse(repo_list[0].get('b_unchanged', False))
+        self.assertEqual(new_sha, self.get_head())
+
+        self.assertEqual(cwd, os.getcwd())
+
+    def test_dirty_not_skipped(self):
+        self.update()
+
+        # nobody pushed but a tracked file changed
+        with open(os.path.join(self.repo_path, 'temp.txt'), 'a') as f:
+            f.write('local\n')
+
+        repo_list = self.update()
+        self.assertFalse(repo_list[0].get('b_unchanged', False))
+        self.assertEqual('', self.run_git(['status', '--porcelain'], self.repo_path).stdout)
+
+        repo_list = self.update()
+        self.assertTrue(repo_list[0]['b_unchanged'])
+
+    def test_untracked_skipped(self):
+        self.update()
+
+        # outputs of the scripts
+        with open(os.path.join(self.repo_path, 'untracked.txt'), 'w') as f:
+            f.write('untracked\n')
+        os.makedirs(os.path.join(self.repo_path, '__pycache__'))
+        with open(os.path.join(self.repo_path, '__pycache__', 'temp.pyc'), 'wb') as f:
+            f.write(b'\0')
+
+        git_cmd_list = []
+        run_command = ret.git.run_command
+
+        def run_command_counted(cmd, *args, **kwargs):
+            git_cmd_list.append(cmd)
+            return run_command(cmd, *args, **kwargs)
+
+        ret.git.run_command = run_command_counted
+
+        try:
+            repo_list = self.update()
+        finally:
+            ret.git.run_command = run_command
+
+        self.assertTrue(repo_list[0]['b_unchanged'])
+        # only `git ls-remote`
+        self.assertEqual(1, len(git_cmd_list), msg=git_cmd_list)
+        self.assertIn('ls-remote', git_cmd_list[0])
+
+    def test_detached_not_skipped(self):
+        self.update()
+
+        self.run_git(['checkout', '--detach', 'HEAD~1'], self.repo_path)
+
+        repo_list = self.update()
+        self.assertFalse(repo_list[0].get('b_unchanged', False))
+        self.assertEqual(self.expected_sha, self.get_head())
+        self.assertEqual(
+            'master', self.run_git(['rev-parse', '--abbrev-ref', 'HEAD'], self.repo_path).stdout.strip())
+
+    def test_deleted_branch_pruned(self):
+        self.run_git(['branch', 'feature', 'HEAD~1'], self.origin)
+        self.update()
+
+        self.run_git(['branch', '-D', 'feature'], self.origin)
+        repo_list = self.update()
+        self.assertFalse(repo_list[0].get('b_unchanged', False))
+
+        # the manifest without the deleted branch
+        manifest = update_manifest.UpdateManifest(self.section_folder)
+        self.assertEqual(
+            {'refs/heads/master': self.expected_sha}, manifest.get_remote_refs('origin'))
+
+        repo_list = self.update()
+        self.assertTrue(repo_list[0]['b_unchanged'])
+
+    def test_failed_repo_not_recorded(self):
+        journal_path = os.path.join(self.temp_folder.name, 'section_update.checkpoint')
+
+        # not a folder : git cannot run there
+        broken_url = os.path.join(self.temp_folder.name, 'broken')
+        with open(os.path.join(self.section_folder, 'broken'), 'w') as f:
+            f.write('not a repository\n')
+
+        repo_list = ret.clone_or_pull_repo_list(
+            [broken_url, self.origin], self.section_folder, b_multiprocessing=False,
+            checkpoint=checkpoint.Checkpoint(journal_path))
+
+        # the other repository still updated
+        self.assertIn('error', repo_list[0])
+        self.assertNotIn('error', repo_list[1])
+        self.assertEqual(self.expected_sha, self.get_head())
+
+        resumed = checkpoint.Checkpoint(journal_path, b_resume=True)
+        self.assertFalse(resumed.is_done(broken_url))
+        self.assertTrue(resumed.is_done(self.origin))
+
+    def test_is_local_up_to_date(self):
+        self.update()
+        refs = {'refs/heads/master': self.expected_sha}
+
+        self.assertTrue(ret.is_local_up_to_date(self.repo_path, refs))
+        self.assertFalse(ret.is_local_up_to_date(self.repo_path, None))
+        self.assertFalse(ret.is_local_up_to_date(self.repo_path, {'refs/heads/master': 'b' * 40}))
+
+        # packed refs
+        self.run_git(['pack-refs', '--all'], self.repo_path)
+        self.assertTrue(ret.is_local_up_to_date(self.repo_path, refs))
+
+        with open(os.path.join(self.repo_path, 'ignored.pyc'), 'wb') as f:
+            f.write(b'\0')
+        self.assertTrue(ret.is_local_up_to_date(self.repo_path, refs))
+
+        # same size, same time stamp as the index
+        temp_path = os.path.join(self.repo_path, 'temp.txt')
+        st = os.stat(temp_path)
+        with open(temp_path, 'rb') as f:
+            content = f.read()
+        with open(temp_path, 'wb') as f:
+            f.write(content.upper())
+        os.utime(temp_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+        index_path = os.path.join(self.repo_path, '.git', 'index')
+        os.utime(index_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+        self.assertFalse(ret.is_local_up_to_date(self.repo_path, refs))
+
+        with open(temp_path, 'wb') as f:
+            f.write(content)
+        os.utime(temp_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+        self.assertTrue(ret.is_local_up_to_date(self.repo_path, refs))
+
+        os.remove(temp_path)
+        self.assertFalse(ret.is_local_up_to_date(self.repo_path, refs))
+
+    def test_checkpoint_resume(self):
+        journal_path = os.path.join(self.temp_folder.name, 'section_update.checkpoint')
+
+        repo_list = ret.clone_or_pull_repo_list(
+            [self.origin], self.section_folder, b_multiprocessing=False,
+            checkpoint=checkpoint.Checkpoint(journal_path))
+        self.assertEqual(self.expected_sha, self.get_head())
+
+        # a new commit in the origin is not fetched when resuming
+        self.commit_file(self.origin, 'third\n', 'third commit')
+
+        resumed_list = ret.clone_or_pull_repo_list(
+            [self.origin], self.section_folder, b_multiprocessing=False,
+            checkpoint=checkpoint.Checkpoint(journal_path, b_resume=True))
+
+        self.assertEqual(repo_list, resumed_list)
+        self.assertEqual(self.expected_sha, self.get_head())
+
+    def test_is_unchanged(self):
+        refs = {'refs/heads/master': 'a' * 40}
+
+        self.assertTrue(update_manifest.is_unchanged(refs, dict(refs)))
+        self.assertFalse(update_manifest.is_unchanged(refs, None))
+        self.assertFalse(update_manifest.is_unchanged(None, refs))
+        self.assertFalse(update_manifest.is_unchanged(refs, {'refs/heads/master': 'b' * 40}))
+
+
 if "__main__" == __name__:
     unittest.main()
@@ -0,0 +1,208 @@
+import os
+import pickle
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+import script_runner
+
+
+script_dict = {
+    'argv_input.py': (
+        'import sys\n'
+        'print(sys.argv[1:])\n'
+        'print(input())\n'
+        'print(__name__)\n'
+    ),
+    'error.py': "raise ValueError('error.py')\n",
+    'syntax_error.py': 'print(1\n',
+    'exit_code.py': 'import sys\nsys.exit(3)\n',
+    'exit_message.py': "import sys\nsys.exit('message')\n",
+    'cwd.py': 'import os\nprint(os.path.basename(os.getcwd()))\nprint(open("test.txt").read())\n',
+    'korean.py': "print('한글')\n",
+}
+
+
+@unittest.skipUnless(script_runner.is_fork_server_possible(sys.executable), 'unable to fork')
+class TestForkServerRunner(unittest.TestCase):
+    def setUp(self):
+        self.temp_folder = tempfile.TemporaryDirectory()
+
+        for filename, txt in script_dict.items():
+            with open(os.path.join(self.temp_folder.name, filename), 'wt', encoding='utf-8') as f:
+                f.write(txt)
+
+        with open(os.path.join(self.temp_folder.name, 'test.txt'), 'wt') as f:
+            f.write('test.txt')
+
+        self.runner = script_runner.get_script_runner(sys.executable)
+
+    def tearDown(self):
+        self.runner.close()
+        del self.temp_folder
+
+    def test_get_script_runner(self):
+        self.assertIsInstance(self.runner, script_runner.ForkServerRunner)
+
+    def test_same_as_subprocess(self):
+        subprocess_runner = script_runner.SubprocessRunner(sys.executable)
+
+        for filename in script_dict:
+            argv = [filename, 'a', 'b']
+
+            expected = subprocess_runner.run(argv, in_txt='input\n', cwd=self.temp_folder.name)
+            result = self.runner.run(argv, in_txt='input\n', cwd=self.temp_folder.name)
+
+            self.assertEqual(tuple(expected), tuple(result), msg=filename)
+            self.assertEqual(expected.returncode, result.returncode, msg=filename)
+
+    def test_timeout(self):
+        with open(os.path.join(self.temp_folder.name, 'loop.py'), 'wt') as f:
+            f.write('while True:\n    pass\n')
+
+        result = self.runner.run(['loop.py'], cwd=self.temp_folder.name, timeout_sec=0.5)
+
+        self.assertTrue(result.b_timeout)
+
+        # server still available
+        result = self.runner.run(['korean.py'], cwd=self.temp_folder.name)
+        self.assertEqual('한글\n', result.stdout)
+
+    def test_max_output_bytes(self):
+        with open(os.path.join(self.temp_folder.name, 'talk.py'), 'wt') as f:
+            f.write('print("a" * 100000)\n')
+
+        result = self.runner.run(['talk.py'], cwd=self.temp_folder.name, max_output_bytes=1000)
+
+        self.assertTrue(result.b_truncated)
+        self.assertEqual(1000, len(result.stdout))
+
+    def test_shadow_preloaded_module(self):
+        # same name as modules the server imports before the scripts
+        with open(os.path.join(self.temp_folder.name, 'math.py'), 'wt') as f:
+            f.write('pi = 3\n')
+        os.makedirs(os.path.join(self.temp_folder.name, 'string'))
+        with open(os.path.join(self.temp_folder.name, 'string', '__init__.py'), 'wt') as f:
+            f.write('ascii_letters = "student"\n')
+        with open(os.path.join(self.temp_folder.name, 'shadow.py'), 'wt') as f:
+            f.write('import json, math, string\nprint(math.pi, string.ascii_letters, json.dumps(1))\n')
+
+        expected = script_runner.SubprocessRunner(sys.executable).run(['shadow.py'], cwd=self.temp_folder.name)
+        result = self.runner.run(['shadow.py'], cwd=self.temp_folder.name)
+
+        self.assertEqual(tuple(expected), tuple(result))
+
+        # the server keeps its modules for the next scripts
+        result = self.runner.run(['korean.py'], cwd=self.temp_folder.name)
+        self.assertEqual('한글\n', result.stdout)
+
+    def test_child_holds_pipes_without_timeout(self):
+        with open(os.path.join(self.temp_folder.name, 'spawn.py'), 'wt') as f:
+            f.write(
+                'import subprocess, sys\n'
+                'subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])\n'
+                'print("parent done")\n'
+            )
+
+        start_sec = time.time()
+        result = self.runner.run(['spawn.py'], cwd=self.temp_folder.name)
+
+        self.assertLess(time.time() - start_sec, 10)
+        self.assertEqual('parent done\n', result.stdout)
+
+    def test_pickle(self):
+        self.runner.run(['korean.py'], cwd=self.temp_folder.name)
+
+        # a worker starts its own server
+        runner = pickle.loads(pickle.dumps(self.runner))
+        self.assertIsNone(runner.server)
+
+
+limit_script_dict = {
+    'cpu time': ({'cpu_sec': 1}, 'while True:\n    pass\n'),
+    'memory': ({'memory_bytes': 2 ** 28}, 'a = bytearray(2 ** 30)\n'),
+    'open files': ({'open_files': 32}, 'f_list = [open(__file__) for _ in range(64)]\n'),
+    'file size': ({'file_bytes': 1000}, 'open("big.txt", "w").write("a" * 100000)\n'),
+}
+
+
+@unittest.skipUnless(script_runner.fork_server.resource is not None, 'no resource limits')
+class TestLimits(unittest.TestCase):
+    def setUp(self):
+        self.temp_folder = tempfile.TemporaryDirectory()
+
+        for reason, limit_dict__txt in limit_script_dict.items():
+            with open(os.path.join(self.temp_folder.name, reason.replace(' ', '_') + '.py'), 'wt') as f:
+                f.write(limit_dict__txt[1])
+
+    def tearDown(self):
+        del self.temp_folder
+
+    def check_runner(self, runner):
+        for reason, limit_dict__txt in limit_script_dict.items():
+            limit_dict = limit_dict__txt[0]
+
+            result = runner.run(
+                [reason.replace(' ', '_') + '.py'], cwd=self.temp_folder.name, timeout_sec=10, limit_dict=limit_dict)
+
+            self.assertEqual(reason, script_runner.get_kill_reason(result, limit_dict), msg=repr(result))
+
+        runner.close()
+
+    def test_subprocess_runner(self):
+        self.check_runner(script_runner.SubprocessRunner(sys.executable))
+
+    @unittest.skipUnless(script_runner.is_fork_server_possible(sys.executable), 'unable to fork')
+    def test_fork_server_runner(self):
+        self.check_runner(script_runner.ForkServerRunner())
+
+    def check_sigkill(self, runner):
+        with open(os.path.join(self.temp_folder.name, 'self_kill.py'), 'wt') as f:
+            f.write('import os, signal\nos.kill(os.getpid(), signal.SIGKILL)\n')
+        with open(os.path.join(self.temp_folder.name, 'ignore_xcpu.py'), 'wt') as f:
+            f.write('import signal\nsignal.signal(signal.SIGXCPU, signal.SIG_IGN)\nwhile True:\n    pass\n')
+
+        limit_dict = {'cpu_sec': 1}
+
+        # not for the cpu time
+        result = runner.run(['self_kill.py'], cwd=self.temp_folder.name, timeout_sec=10, limit_dict=limit_dict)
+        self.assertEqual('signal SIGKILL', script_runner.get_kill_reason(result, limit_dict), msg=repr(result))
+
+        # SIGKILL at the hard limit
+        result = runner.run(['ignore_xcpu.py'], cwd=self.temp_folder.name, timeout_sec=10, limit_dict=limit_dict)
+        self.assertEqual('cpu time', script_runner.get_kill_reason(result, limit_dict), msg=repr(result))
+
+        runner.close()
+
+    def test_sigkill_subprocess_runner(self):
+        self.check_sigkill(script_runner.SubprocessRunner(sys.executable))
+
+    @unittest.skipUnless(script_runner.is_fork_server_possible(sys.executable), 'unable to fork')
+    def test_sigkill_fork_server_runner(self):
+        self.check_sigkill(script_runner.ForkServerRunner())
+
+    def test_no_reason(self):
+        with open(os.path.join(self.temp_folder.name, 'fine.py'), 'wt') as f:
+            f.write('print(1)\n')
+
+        result = script_runner.SubprocessRunner(sys.executable).run(
+            ['fine.py'], cwd=self.temp_folder.name, limit_dict={'cpu_sec': 10})
+
+        self.assertIsNone(script_runner.get_kill_reason(result, {'cpu_sec': 10}))
+
+
+class TestGetScriptRunner(unittest.TestCase):
+    def test_other_interpreter(self):
+        self.assertIsInstance(
+            script_runner.get_script_runner('no_such_python'), script_runner.SubprocessRunner)
+
+    def test_fork_server_off(self):
+        self.assertIsInstance(
+            script_runner.get_script_runner(sys.executable, b_fork_server=False), script_runner.SubprocessRunner)
+
+
+if "__main__" == __name__:
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+import eval_repo
+import git
+import tempf
+import timeline
+
+
+class TestTimeline(tempf.TempRepoTestBase):
+    def setUp(self):
+        super().setUp()
+
+        self.commit({'ex00.py': '# one\n', 'ex01.py': '# one\n# two\n'}, '2019-03-05 12:00:00')
+        self.commit({'ex01.py': '# one\n# two\n# three\n'}, '2019-03-12 12:00:00')
+        self.commit({'ex02.py': '# one\n'}, '2019-03-19 12:00:00')
+
+        self.checkpoint_list = ['2019-03-01 23:59:59', '2019-03-08 23:59:59',
+                                '2019-03-15 23:59:59', '2019-03-22 23:59:59']
+
+    def commit(self, txt_dict, date):
+        return super().commit(txt_dict, date, date=date)
+
+    def test_get_commit_before(self):
+        self.assertIsNone(git.get_commit_before('2019-03-01', repo_path=self.repo_path))
+        self.assertEqual(
+            self.git(['rev-parse', 'HEAD~1']).stdout.strip(),
+            git.get_commit_before('2019-03-15', repo_path=self.repo_path))
+
+    def test_eval_repo_list(self):
+        evaluator = eval_repo.RepoEvalPoundLineCounter()
+
+        evaluated_list = []
+        eval_python_file = evaluator.eval_python_file
+
+        def eval_python_file_counted(filename):
+            evaluated_list.append(os.path.basename(filename))
+            return eval_python_file(filename)
+
+        evaluator.eval_python_file = eval_python_file_counted
+
+        table_list, trend_table = timeline.Timeline(evaluator, self.checkpoint_list).eval_repo_list(
+            [{'name': 'repo', 'path': self.repo_path}], b_multiprocessing=False)
+
+        # no commit yet
+        self.assertNotIn('repo', table_list[0].index)
+        self.assertEqual([3, 4, 5], [table['repo'][' total'] for table in table_list[1:]])
+
+        # each changed file once
+        self.assertEqual(['ex00.py', 'ex01.py', 'ex01.py', 'ex02.py'], sorted(evaluated_list))
+
+        self.assertEqual([None, 2, 3, 3], trend_table['repo']['./ex01.py'])
+        self.assertEqual([None, None, None, 1], trend_table['repo']['./ex02.py'])
+        self.assertEqual([None, 3, 4, 5], trend_table['repo'][' total'])
+
+    def test_composite(self):
+        table_list, trend_list = timeline.Timeline(
+            eval_repo.RepoEvalComposite([eval_repo.RepoEvalPoundLineCounter(), eval_repo.RepoEvalCountCommitNameStatus()]),
+            self.checkpoint_list[1:],
+        ).eval_repo_list([{'name': 'repo', 'path': self.repo_path}], b_multiprocessing=False)
+
+        pound_trend, commit_trend = trend_list
+
+        self.assertEqual([3, 4, 5], pound_trend['repo'][' total'])
+        self.assertEqual([1, 2, 2], commit_trend['repo']['./ex01.py'])
+
+    def test_run_each_neighbor_changed(self):
+        self.commit({
+            'ex03/helper.py': 'def f():\n    return 1\n',
+            'ex03/main.py': 'import helper\nprint(helper.f())\n',
+        }, '2019-03-19 13:00:00')
+        # main.py unchanged
+        self.commit({'ex03/helper.py': 'raise ValueError\n'}, '2019-03-26 12:00:00')
+
+        evaluator = eval_repo.RepoEvalRunEach(sys.executable, timeout_sec=10)
+
+        _, trend_table = timeline.Timeline(
+            evaluator, ['2019-03-22 23:59:59', '2019-03-29 23:59:59']).eval_repo_list(
+            [{'name': 'repo', 'path': self.repo_path}], b_multiprocessing=False)
+
+        before, after = trend_table['repo']['ex03/main.py']
+
+        # run again with the broken helper.py
+        self.assertEqual(0, before['stderr'])
+        self.assertLess(0, after['stderr'])
+
+    def test_get_date_label(self):
+        self.assertEqual('2019-03-08-23-59-59', timeline.get_date_label('2019-03-08 23:59:59'))
+
+
+if "__main__" == __name__:
+    unittest.main()
@@ -0,0 +1,237 @@
+"""
+Timeline evaluation
+
+Evaluate each repository at several checkpoints without checking out
+Evaluations depending only on files unchanged since the previous checkpoint are reused,
+and only the changed files are written for the next checkpoint
+
+usage : python timeline.py [progress.cfg]
+
+==== begin config file example ====
+[section_0]
+...
+timeline = ['2019-03-08 23:59:59', '2019-03-15 23:59:59', '2019-03-22 23:59:59']
+# branch to follow; HEAD by default
+timeline_branch = master
+...
+==== end config file example ====
+
+One table for each checkpoint and a trend table of each file
+"""
+
+import ast
+import multiprocessing
+import re
+import sys
+
+import checkpoint
+import dict_table
+import eval_repo
+import git
+import iter_repo
+import progress
+import regex_test as ret
+
+
+class Timeline(object):
+    """
+    Evaluate repositories at the commit of each checkpoint
+
+    >>> timeline = Timeline(eval_repo.RepoEvalPoundLineCounter(), ['2019-03-08', '2019-03-15'])
+    >>> table_list, trend_table = timeline.eval_repo_list(repo_list)
+    """
+
+    def __init__(self, evaluator, checkpoint_list, branch='HEAD'):
+        """
+        :param eval_repo.RepoEval evaluator: evaluation at each checkpoint
+        :param list(str) checkpoint_list: dates such as '2019-03-08 23:59:59', oldest first
+        :param str branch: where each repository was at the dates
+        """
+        self.evaluator = evaluator
+        self.checkpoint_list = list(checkpoint_list)
+        self.branch = branch
+
+    def eval_repo_list(self, repo_list, b_multiprocessing=True):
+        """
+        :param list(dict) repo_list:
+        :param bool b_multiprocessing:
+        :return: ([result of the evaluator for each checkpoint], trend result)
+        """
+        result_list = [self.evaluator.new_result() for _ in self.checkpoint_list]
+
+        if b_multiprocessing:
+            # each worker evaluates all checkpoints of one repository to reuse its memo
+            p = multiprocessing.Pool(initializer=eval_repo.init_worker, initargs=(self,))
+
+            for repo_name, row_list in p.imap_unordered(eval_repo.eval_repo_row_in_worker, enumerate(repo_list)):
+                self.add_row_list_to_result(result_list, repo_name, row_list)
+
+            p.close()
+            p.join()
+        else:
+            for k_repo in enumerate(repo_list):
+                repo_name, row_list = self.eval_repo_row(k_repo)
+                self.add_row_list_to_result(result_list, repo_name, row_list)
+
+        return result_list, self.get_trend(result_list)
+
+    def eval_repo_row(self, k_repo):
+        """
+        (repository name, [row of the repository at each checkpoint])
+        An empty row if the repository had no commit yet
+        """
+        _, repo = k_repo
+
+        # files unchanged between checkpoints evaluated once
+        self.evaluator.set_blob_memo(True)
+
+        row_list = []
+
+        try:
+            for date in self.checkpoint_list:
+                commit_sha = git.get_commit_before(date, self.branch, repo['path'])
+
+                if commit_sha is None:
+                    row = self.evaluator.pop_row(repo['name'])
+                else:
+                    self.evaluator.revision = commit_sha
+                    _, row = self.evaluator.eval_repo_row(k_repo)
+
+                row_list.append(row)
+        finally:
+            self.evaluator.set_blob_memo(False)
+            self.evaluator.revision = None
+
+        return repo['name'], row_list
+
+    def get_error_row(self, e):
+        # same error at all checkpoints
+        return [self.evaluator.get_error_row(e) for _ in self.checkpoint_list]
+
+    def add_row_list_to_result(self, result_list, repo_name, row_list):
+        for result, row in zip(result_list, row_list):
+            self.evaluator.add_row_to_result(result, repo_name, row)
+
+    def get_trend(self, result_list):
+        """
+        Trend table of the result tables; a list of them for a composite evaluator
+        """
+        if isinstance(self.evaluator, eval_repo.RepoEvalComposite):
+            result = [get_trend_table(table_list) for table_list in zip(*result_list)]
+        else:
+            result = get_trend_table(result_list)
+
+        return result
+
+
+def get_trend_table(table_list):
+    """
+    {repository: {column: [value at each checkpoint, ...]}}
+    None if the file was not there at the checkpoint
+
+    :param list(dict_table.RepoTable) table_list: one table for each checkpoint
+    :return: dict_table.RepoTable
+    """
+    trend_table = dict_table.RepoTable()
+
+    row_set = set()
+    for table in table_list:
+        row_set.update(table.index)
+
+    for row in sorted(row_set):
+        column_list = []
+
+        for table in table_list:
+            for column in table.index.get(row, {}):
+                if column not in column_list:
+                    column_list.append(column)
+
+        trend_table.set_row(row, {
+            column: [table.index.get(row, {}).get(column, None) for table in table_list]
+            for column in column_list
+        })
+
+    return trend_table
+
+
+def get_checkpoint_list(config, section):
+    """
+    Checkpoint dates of the section; [] if none
+    """
+    return list(ast.literal_eval(config[section].get('timeline', '[]')))
+
+
+def get_evaluator_dict(config, section):
+    """
+    {'count_commits' | 'pound_count' | 'run_all': evaluator} enabled in the section
+    """
+    evaluator_dict = {}
+
+    if 'True' == config[section]['count_commits']:
+        evaluator_dict['count_commits'] = progress.get_commit_counter(config, section)
+    if 'True' == config[section]['pound_count']:
+        evaluator_dict['pound_count'] = progress.get_pound_counter(config)
+    if 'True' == config[section]['run_all']:
+        evaluator_dict['run_all'] = progress.get_all_runner(config)
+
+    return evaluator_dict
+
+
+def get_date_label(date):
+    """
+    Part of a file name from a date
+    """
+    return re.sub(r'\W+', '-', date).strip('-')
+
+
+def process_section(config, section):
+    checkpoint_list = get_checkpoint_list(config, section)
+    evaluator_dict = get_evaluator_dict(config, section)
+
+    if not (checkpoint_list and evaluator_dict):
+        print(f'process_section() : nothing to evaluate in {section}')
+        return {}
+
+    repo_url_list = ret.get_github_url_list(config[section]['list'].strip())
+    print('process_section() : # repositories =', len(repo_url_list))
+
+    # fetching does not change the commits of the past checkpoints
+    repo_list = ret.clone_or_pull_repo_list(
+        repo_url_list,
+        section_folder=config[section]['folder'],
+        b_update_repo=('True' == config['operation']['update_repo'].strip()),
+        max_concurrency=progress.get_update_concurrency(config),
+        checkpoint=checkpoint.get_checkpoint(config, section, 'update'),
+    )
+
+    timeline = Timeline(
+        eval_repo.RepoEvalComposite(evaluator_dict.values()),
+        checkpoint_list,
+        branch=config[section].get('timeline_branch', 'HEAD'),
+    )
+
+    result_list, trend_list = timeline.eval_repo_list(repo_list)
+
+    results = {}
+
+    for name, trend_table, table_list in zip(evaluator_dict, trend_list, zip(*result_list)):
+        for date, table in zip(checkpoint_list, table_list):
+            progress.write_tables(
+                section, repo_list, table, filename_prefix=f'{name}_{get_date_label(date)}',
+                sorted_row=table.get_sorted_row(' total'))
+
+        progress.write_tables(section, repo_list, trend_table, filename_prefix=f'{name}_trend')
+
+        results[name] = {'tables': table_list, 'trend': trend_table}
+
+    return results
+
+
+def main(argv=False):
+    config = progress.get_config_from_argv(argv)
+
+    return tuple(process_section(config, section) for section in iter_repo.get_section_list(config))
+
+
+if "__main__" == __name__:
+    main(sys.argv[1:])
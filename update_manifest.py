@@ -0,0 +1,84 @@
+"""
+Update manifest of a section folder
+
+Remote branches and the time of the last update of each repository
+If `git ls-remote` shows the same branches, the repository does not need an update
+"""
+
+import json
+import os
+import time
+
+
+manifest_filename = '.update_manifest.json'
+
+
+class UpdateManifest(object):
+    """
+    {repo_name: {'remote_refs': {'refs/heads/<branch>': sha}, 'updated': time string}}
+    """
+
+    def __init__(self, section_folder, filename=manifest_filename):
+        self.path = os.path.join(os.path.abspath(section_folder), filename)
+        self.repo_dict = {}
+        self.load()
+
+    def load(self):
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'rt', encoding='utf-8') as f:
+                    self.repo_dict = json.load(f)
+            except ValueError:
+                # broken manifest : update all repositories once
+                print(f'UpdateManifest.load() : ignoring {self.path}')
+                self.repo_dict = {}
+
+        return self.repo_dict
+
+    def save(self):
+        # write to a temporary file first not to leave a broken manifest
+        temp_path = self.path + '.tmp'
+
+        with open(temp_path, 'wt', encoding='utf-8') as f:
+            json.dump(self.repo_dict, f, indent=4, sort_keys=True)
+
+        os.replace(temp_path, self.path)
+
+    def get_remote_refs(self, repo_name):
+        """
+        Remote branches at the last update or None if unknown
+        """
+        return self.repo_dict.get(repo_name, {}).get('remote_refs', None)
+
+    def set_remote_refs(self, repo_name, remote_refs, updated=None):
+        if updated is None:
+            updated = get_time_str()
+
+        self.repo_dict[repo_name] = {
+            'remote_refs': remote_refs,
+            'updated': updated,
+        }
+
+    def update_repo_list(self, repo_list):
+        """
+        Record repositories updated in this run
+
+        :param list repo_list: repo dictionaries with 'remote_refs' if updated
+        """
+        for repo in repo_list:
+            if repo.get('remote_refs', None) is not None:
+                self.set_remote_refs(repo['name'], repo['remote_refs'])
+
+
+def get_time_str():
+    return time.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def is_unchanged(remote_refs, manifest_refs):
+    """
+    True if nobody pushed since the last update
+
+    :param dict remote_refs: from `git ls-remote --heads` or None if failed
+    :param dict manifest_refs: from the manifest or None if unknown
+    """
+    return (remote_refs is not None) and (manifest_refs is not None) and (remote_refs == manifest_refs)